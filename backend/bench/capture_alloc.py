@@ -0,0 +1,85 @@
+"""
+Bytes allocated per captured frame: old capture path vs pooled buffers.
+
+    python -m backend.bench.capture_alloc [--width 1920 --height 1080 --frames 120]
+
+The old path copied the NDI buffer (np.copy) and let cvtColor allocate its
+output on every frame. The pooled path converts straight from the receiver
+buffer into FrameChannel's preallocated slots. The lazy path is what
+NDIProvider does now: copy the raw frame into the pool and convert only when
+a consumer asks, so with nobody watching it is just a memcpy. Allocations are
+measured with tracemalloc (NumPy and OpenCV output arrays are both traced).
+"""
+import argparse
+import time
+import tracemalloc
+import cv2
+import numpy as np
+from ..video.frames import FrameChannel
+from ..video.ndi import NDIProvider, frame_to_bgr, output_shape
+
+
+def old_path(channel: FrameChannel, buf: np.ndarray, w: int, h: int, layout: str):
+    frame = np.copy(buf)
+    if layout == "uyvy":
+        out = cv2.cvtColor(frame.reshape((h, w, 2)), cv2.COLOR_YUV2BGR_UYVY)
+    else:
+        out = cv2.cvtColor(frame.reshape((h, w, 4)), cv2.COLOR_BGRA2BGR)
+    channel.publish(out)
+
+
+def pooled_path(channel: FrameChannel, buf: np.ndarray, w: int, h: int, layout: str):
+    slot, out = channel.buffer(output_shape(layout, w, h))
+    channel.publish(frame_to_bgr(buf, w, h, layout, out=out), slot=slot)
+
+
+def lazy_idle_path(channel: FrameChannel, buf: np.ndarray, w: int, h: int, layout: str):
+    provider = _providers.setdefault(id(channel), NDIProvider("bench", "bench"))
+    provider.frames = channel
+    provider._publish_raw(buf, w, h, layout)
+
+
+_providers = {}
+
+
+def measure(fn, channel, buf, w, h, layout, frames: int):
+    for _ in range(5):  # Warm up (pool allocates its slots here)
+        fn(channel, buf, w, h, layout)
+    total = 0
+    t0 = time.perf_counter()
+    for _ in range(frames):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        fn(channel, buf, w, h, layout)
+        total += tracemalloc.get_traced_memory()[1] - before
+    elapsed = (time.perf_counter() - t0) / frames * 1000
+    return total / frames, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--frames", type=int, default=120)
+    args = parser.parse_args()
+    w, h = args.width, args.height
+
+    rng = np.random.default_rng(0)
+    buffers = {
+        "uyvy": rng.integers(0, 255, (h, w * 2), dtype=np.uint8),
+        "bgra": rng.integers(0, 255, (h, w * 4), dtype=np.uint8),
+    }
+
+    tracemalloc.start()
+    print(f"{w}x{h}, transient bytes allocated per frame (tracemalloc peak)")
+    for layout, buf in buffers.items():
+        for label, fn in [("old", old_path), ("pooled", pooled_path), ("lazy", lazy_idle_path)]:
+            channel = FrameChannel()
+            per_frame, ms = measure(fn, channel, buf, w, h, layout, args.frames)
+            print(f"  {layout.upper():<5} {label:<7} {per_frame / 1e6:8.2f} MB/frame  {ms:6.2f} ms/frame  "
+                  f"pool allocations: {channel.allocations}  conversions: {channel.conversions}")
+    tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Shared helpers for the benchmark / load-test scripts (not used by the app)."""
+import re
+import time
+import base64
+import hashlib
+import threading
+import collections
+import http.server
+import numpy as np
+from ..video.preview import FrameProvider
+from ..video.frames import FrameChannel
+from ..video.broadcaster import RenditionPool
+from ..ptz.provider import PTZProvider
+
+
+def test_pattern(width: int, height: int, i: int) -> np.ndarray:
+    """Moving gradient + bar so JPEG sizes look like real video, not a flat colour."""
+    x = np.linspace(0, 255, width, dtype=np.uint8)
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame[:, :, 0] = x
+    frame[:, :, 1] = np.roll(x, i * 8)[None, :]
+    frame[:, :, 2] = (np.arange(height, dtype=np.uint16)[:, None] * 255 // height).astype(np.uint8)
+    bar = (i * 16) % max(width - 40, 1)
+    frame[:, bar:bar + 40] = 255
+    return frame
+
+
+class SyntheticProvider(FrameProvider):
+    """NDI-like provider fed by a generated test pattern instead of a receiver."""
+    def __init__(self, id: str, width: int = 1280, height: int = 720, fps: float = 30.0):
+        self.id = id
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.running = False
+        self.thread = None
+        self.frames = FrameChannel()
+        self.renditions = RenditionPool(id, self.frames)
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.renditions.close()
+        self.frames.close()
+
+    def _capture_loop(self):
+        # Pre-render a short loop so the generator itself costs no CPU
+        patterns = [test_pattern(self.width, self.height, i) for i in range(16)]
+        i = 0
+        interval = 1.0 / self.fps
+        next_t = time.perf_counter()
+        while self.running:
+            self.frames.publish(patterns[i % len(patterns)])
+            i += 1
+            next_t += interval
+            time.sleep(max(0.0, next_t - time.perf_counter()))
+
+    def get_stream_url(self) -> str:
+        return f"/api/video/{self.id}/mjpeg"
+
+    def get_stats(self) -> dict:
+        return self.renditions.get_stats()
+
+
+class NullPTZ(PTZProvider):
+    """PTZ provider that does nothing; measures API overhead only."""
+    def connect(self) -> bool:
+        return True
+
+    def move(self, pan: float, tilt: float, zoom: float, speed: float) -> bool:
+        return True
+
+    def stop(self) -> bool:
+        return True
+
+    def get_presets(self):
+        return []
+
+    def goto_preset(self, preset_token: str) -> bool:
+        return True
+
+    def set_preset(self, preset_name: str) -> bool:
+        return True
+
+
+class FakeOnvifCamera:
+    """
+    Minimal ONVIF device/media/PTZ endpoint on localhost: answers what
+    OnvifProvider.connect() and the PTZ calls need, checks the WS-Security
+    password digest, and counts moves. camera_ms adds per-request processing
+    time, like a real camera's web server.
+    """
+    RESPONSES = {
+        "GetCapabilities": '<tds:GetCapabilitiesResponse xmlns:tds="http://www.onvif.org/ver10/device/wsdl">'
+                           '<tds:Capabilities><tt:Media><tt:XAddr>{base}/onvif/media_service</tt:XAddr>'
+                           '<tt:StreamingCapabilities/></tt:Media><tt:PTZ><tt:XAddr>{base}/onvif/ptz_service</tt:XAddr>'
+                           '</tt:PTZ></tds:Capabilities></tds:GetCapabilitiesResponse>',
+        "GetDeviceInformation": '<tds:GetDeviceInformationResponse xmlns:tds="http://www.onvif.org/ver10/device/wsdl">'
+                                '<tds:Manufacturer>Bench</tds:Manufacturer><tds:Model>FakeCam</tds:Model>'
+                                '<tds:FirmwareVersion>1.0</tds:FirmwareVersion><tds:SerialNumber>0</tds:SerialNumber>'
+                                '<tds:HardwareId>0</tds:HardwareId></tds:GetDeviceInformationResponse>',
+        "GetProfiles": '<trt:GetProfilesResponse xmlns:trt="http://www.onvif.org/ver10/media/wsdl">'
+                       '<trt:Profiles token="Profile_1" fixed="true"><tt:Name>main</tt:Name></trt:Profiles>'
+                       '</trt:GetProfilesResponse>',
+        "GetStatus": '<tptz:GetStatusResponse xmlns:tptz="http://www.onvif.org/ver20/ptz/wsdl"><tptz:PTZStatus>'
+                     '<tt:Position><tt:PanTilt x="0" y="0"/><tt:Zoom x="0"/></tt:Position>'
+                     '<tt:MoveStatus><tt:PanTilt>IDLE</tt:PanTilt><tt:Zoom>IDLE</tt:Zoom></tt:MoveStatus>'
+                     '<tt:UtcTime>2024-01-01T00:00:00Z</tt:UtcTime></tptz:PTZStatus></tptz:GetStatusResponse>',
+        "ContinuousMove": '<tptz:ContinuousMoveResponse xmlns:tptz="http://www.onvif.org/ver20/ptz/wsdl"/>',
+        "Stop": '<tptz:StopResponse xmlns:tptz="http://www.onvif.org/ver20/ptz/wsdl"/>',
+        "GetPresets": '<tptz:GetPresetsResponse xmlns:tptz="http://www.onvif.org/ver20/ptz/wsdl"/>',
+    }
+    ENVELOPE = ('<?xml version="1.0" encoding="UTF-8"?><s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope" '
+                'xmlns:tt="http://www.onvif.org/ver10/schema"><s:Body>{}</s:Body></s:Envelope>')
+    FAULT = ('<s:Fault><s:Code><s:Value>s:Sender</s:Value></s:Code><s:Reason>'
+             '<s:Text xml:lang="en">{}</s:Text></s:Reason></s:Fault>')
+
+    def __init__(self, port: int, password: str = "password", camera_ms: float = 0.0):
+        self.port = port
+        self.password = password
+        self.camera_ms = camera_ms
+        self.calls = {}
+        self.arrivals = collections.deque(maxlen=10000)  # (time.perf_counter(), action) per accepted request
+        self.last_move = None  # Body of the last ContinuousMove
+        fake = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like camera web servers
+            disable_nagle_algorithm = True  # Headers and body go out in separate writes
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+                status, reply = fake.handle(body)
+                if fake.camera_ms:
+                    time.sleep(fake.camera_ms / 1000)
+                data = fake.ENVELOPE.format(reply).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/soap+xml; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def handle(self, body: str):
+        m = re.search(r":Body><(?:\w+:)?(\w+)", body)
+        action = m.group(1) if m else ""
+        if action not in self.RESPONSES:
+            return 400, self.FAULT.format(f"Unsupported action {action}")
+        if not self.check_digest(body):
+            return 400, self.FAULT.format("Sender not authorized")
+        self.calls[action] = self.calls.get(action, 0) + 1
+        self.arrivals.append((time.perf_counter(), action))
+        if action == "ContinuousMove":
+            self.last_move = body
+        return 200, self.RESPONSES[action].format(base=f"http://127.0.0.1:{self.port}")
+
+    def check_digest(self, body: str) -> bool:
+        m = re.search(r"Password[^>]*>([^<]+)<.*?Nonce[^>]*>([^<]+)<.*?Created[^>]*>([^<]+)<", body)
+        if m is None:
+            return False
+        digest, nonce, created = m.groups()
+        expected = hashlib.sha1(base64.b64decode(nonce) + created.encode() + self.password.encode()).digest()
+        return base64.b64encode(expected).decode() == digest
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def percentile(values, p: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[k]
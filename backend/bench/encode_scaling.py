@@ -0,0 +1,111 @@
+"""
+JPEG encode throughput in-process vs. the worker process pool.
+
+    python -m backend.bench.encode_scaling [--cameras 8 --layout uyvy --seconds 5]
+
+Simulates N cameras, each with a shared-memory FrameChannel and one encoder
+thread (like an MJPEG broadcaster) encoding its latest frame in a loop.
+Runs once with everything in this process, then with the encode pool at
+1, 2, 4, ... workers up to the CPU count, and prints total frames/s.
+With the pool, throughput should grow roughly linearly with workers until
+the cores run out.
+
+Measured on a 1-CPU box (defaults: 8 x 1080p UYVY -> 960w, OpenCV encoder),
+over several runs: pool x1 0.86-1.04x, x2 0.79-0.92x of in-process. Without
+spare cores the pool is pure overhead (pickling, process switches), which is
+why encode_pool.effective_workers() caps settings.encode_workers at CPUs - 1.
+"""
+import argparse
+import os
+import time
+import threading
+import cv2
+import numpy as np
+from ..video import encode_pool
+from ..video.broadcaster import Rendition, encode_jpeg, raw_layouts
+from ..video.frames import FrameChannel
+from ..video.jpeg import get_encoder
+from ..video.ndi import frame_to_bgr, output_shape
+from .common import test_pattern
+
+
+def make_channel(width: int, height: int, layout: str, i: int) -> FrameChannel:
+    ch = FrameChannel(shared=True)
+    bgr = test_pattern(width, height, i)
+    if layout == "uyvy":
+        yuv = cv2.cvtColor(bgr, cv2.COLOR_BGR2YUV)
+        slot, raw = ch.buffer((height, width, 2))
+        raw[:, :, 1] = yuv[:, :, 0]
+        raw[:, 0::2, 0] = yuv[:, 0::2, 1]
+        raw[:, 1::2, 0] = yuv[:, 0::2, 2]
+        ch.publish(raw, slot=slot, convert=lambda r, out: frame_to_bgr(r, width, height, "uyvy", out=out),
+                   out_shape=output_shape("uyvy", width, height), raw_layout="uyvy")
+    else:
+        slot, out = ch.buffer(bgr.shape)
+        np.copyto(out, bgr)
+        ch.publish(out, slot=slot)
+    return ch
+
+
+def run(channels, rendition: Rendition, seconds: float) -> int:
+    stop = threading.Event()
+    counts = [0] * len(channels)
+
+    def encoder(i: int, ch: FrameChannel):
+        enc = get_encoder()
+        while not stop.is_set():
+            frame = ch.latest(hold=True, raw=raw_layouts(enc))
+            try:
+                if encode_jpeg(frame, rendition, enc):
+                    counts[i] += 1
+            finally:
+                ch.release(frame)
+            with ch.convert_lock:
+                ch.cache = None  # Same frame every time; don't let the conversion cache hide its cost
+
+    threads = [threading.Thread(target=encoder, args=(i, ch)) for i, ch in enumerate(channels)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return sum(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cameras", type=int, default=8)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--layout", choices=["bgr", "uyvy"], default="uyvy")
+    parser.add_argument("--out-width", type=int, default=960, help="Rendition width (0 = native)")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    channels = [make_channel(args.width, args.height, args.layout, i) for i in range(args.cameras)]
+    rendition = Rendition.normalize(args.out_width, 0, 70)
+    print(f"{args.cameras} cameras, {args.width}x{args.height} {args.layout} -> {rendition.label()}, "
+          f"{os.cpu_count()} CPUs, encoder {get_encoder().name}")
+
+    base = run(channels, rendition, args.seconds) / args.seconds
+    print(f"  in-process       {base:8.1f} frames/s")
+
+    workers = 1
+    try:
+        while workers <= args.max_workers:
+            pool = encode_pool.start_pool(workers)
+            run(channels, rendition, 1.0)  # Warm up: spawn workers, map buffers
+            fps = run(channels, rendition, args.seconds) / args.seconds
+            print(f"  pool x{workers:<3}        {fps:8.1f} frames/s  {fps / base:5.2f}x  "
+                  f"(fallbacks {pool.get_stats()['fallbacks']})")
+            workers *= 2
+    finally:
+        encode_pool.stop_pool()
+        for ch in channels:
+            ch.close()
+
+
+if __name__ == "__main__":
+    main()
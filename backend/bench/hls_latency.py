@@ -0,0 +1,199 @@
+"""
+Live latency of standard HLS vs. LL-HLS through the real server and ffmpeg.
+
+    python -m backend.bench.hls_latency [--seconds 20] [--source rtsp://127.0.0.1:8554/cam]
+
+Without --source, a second ffmpeg stands in for the camera: a 30 fps test
+pattern encoded with x264 (zerolatency, 1 s GOP) and paced in real time,
+served as FLV over local TCP once our ffmpeg connects (ffmpeg can't serve
+RTSP by itself; point --source at an RTSP server such as mediamtx for a
+true RTSP test).
+
+For each mode a client follows the playlist the way a player does (polling
+for standard HLS, blocking reload for LL-HLS) and records, for every new
+segment/part, how far behind real time its end was when it became
+available. Latency as seen in a player is that lag plus the player's hold
+back (hls.js: 3 target durations for standard HLS, PART-HOLD-BACK for LL).
+Decode and display add another frame or two. The stand-in's start time
+counts as media time 0 (with --source: when our ffmpeg starts).
+"""
+import argparse
+import http.client
+import re
+import socket
+import subprocess
+import threading
+import time
+import uvicorn
+
+from ..main import app
+from ..stream.manager import StreamManager
+from .common import percentile
+
+CAM_ID = "bench_hls"
+
+
+class StandIn:
+    """
+    Camera stand-in on a local TCP port. The encoder starts only once our
+    ffmpeg connects (like a live camera, no backlog); t0 is that moment.
+    """
+    def __init__(self, port: int):
+        self.sock = socket.create_server(("127.0.0.1", port))
+        self.t0 = None
+        self.proc = None
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        conn, _ = self.sock.accept()
+        self.t0 = time.time()
+        self.proc = subprocess.Popen([
+            "ffmpeg", "-loglevel", "error", "-re",
+            "-f", "lavfi", "-i", "testsrc2=size=1280x720:rate=30",
+            "-c:v", "libx264", "-preset", "ultrafast", "-tune", "zerolatency", "-g", "30",
+            "-f", "flv", "pipe:1"
+        ], stdin=subprocess.DEVNULL, stdout=subprocess.PIPE)
+        try:
+            for chunk in iter(lambda: self.proc.stdout.read1(65536), b""):
+                conn.sendall(chunk)
+        except OSError:
+            pass  # Our ffmpeg went away
+        conn.close()
+
+    def stop(self):
+        if self.proc is not None:
+            self.proc.kill()
+            self.proc.wait()
+        self.sock.close()
+
+
+def get(conn: http.client.HTTPConnection, path: str):
+    conn.request("GET", path)
+    resp = conn.getresponse()
+    return resp.status, resp.read().decode("utf-8", "replace")
+
+
+def follow_standard(conn, t0: float, seconds: float, poll: float):
+    """Poll the playlist like a player; returns (lags, requests)."""
+    seen, lags, requests = set(), [], 0
+    media_end = 0.0
+    end = time.time() + seconds
+    while time.time() < end:
+        status, body = get(conn, f"/hls/{CAM_ID}/stream.m3u8")
+        requests += 1
+        now = time.time()
+        if status == 200:
+            for dur, name in re.findall(r"#EXTINF:([\d.]+),\s*\n(\S+)", body):
+                if name not in seen:
+                    seen.add(name)
+                    media_end += float(dur)
+                    lags.append(now - t0 - media_end)
+        time.sleep(poll)
+    return lags, requests
+
+
+def parse_ll(body: str):
+    """[(msn, [(part name, duration)], complete)] from an LL-HLS playlist."""
+    msn = int(re.search(r"#EXT-X-MEDIA-SEQUENCE:(\d+)", body).group(1))
+    segments, parts = [], []
+    for line in body.splitlines():
+        m = re.match(r'#EXT-X-PART:DURATION=([\d.]+),URI="([^"]+)"', line)
+        if m:
+            parts.append((m.group(2), float(m.group(1))))
+        elif line and not line.startswith("#"):
+            segments.append((msn, parts, True))
+            msn, parts = msn + 1, []
+    segments.append((msn, parts, False))
+    return segments
+
+
+def follow_ll(conn, t0: float, seconds: float):
+    """Blocking playlist reload for the next part; returns (lags, requests)."""
+    seen, lags, requests = set(), [], 0
+    media_end = 0.0
+    path = f"/hls/{CAM_ID}/stream.m3u8"
+    end = time.time() + seconds
+    while time.time() < end:
+        status, body = get(conn, path)
+        requests += 1
+        now = time.time()
+        if status != 200:
+            path = f"/hls/{CAM_ID}/stream.m3u8"
+            time.sleep(0.1)
+            continue
+        segments = parse_ll(body)
+        for _, parts, _ in segments:
+            for name, dur in parts:
+                if name not in seen:
+                    seen.add(name)
+                    media_end += dur
+                    lags.append(now - t0 - media_end)
+        msn, parts, _ = segments[-1]
+        path = f"/hls/{CAM_ID}/stream.m3u8?_HLS_msn={msn}&_HLS_part={len(parts)}"
+    return lags, requests
+
+
+def run_mode(mode: str, args) -> None:
+    stand_in = None
+    source = args.source
+    if source is None:
+        stand_in = StandIn(args.source_port)
+        source = f"tcp://127.0.0.1:{args.source_port}"
+    manager = StreamManager()
+    t0 = time.time()
+    manager.start_stream(CAM_ID, source, hls_mode=mode)
+    conn = http.client.HTTPConnection("127.0.0.1", args.port, timeout=10)
+    if stand_in is not None:
+        while stand_in.t0 is None and time.time() - t0 < 5:
+            time.sleep(0.01)
+        t0 = stand_in.t0 or t0
+    try:
+        if mode == "ll":
+            lags, requests = follow_ll(conn, t0, args.seconds)
+        else:
+            lags, requests = follow_standard(conn, t0, args.seconds, args.poll)
+    finally:
+        conn.close()
+        manager.stop_stream(CAM_ID)
+        if stand_in is not None:
+            stand_in.stop()
+
+    hold_back = 3 * 1.0 if mode == "standard" else 3 * 0.2  # hls.js defaults (see docstring)
+    steady = lags[len(lags) // 4:]  # Skip start-up
+    if not steady:
+        print(f"{mode}: no media received")
+        return
+    p50 = percentile(steady, 50)
+    print(f"{mode:<9} chunks={len(lags):4d}  availability lag p50={p50:5.2f}s p95={percentile(steady, 95):5.2f}s  "
+          f"hold-back={hold_back:.1f}s  ~latency={p50 + hold_back:5.2f}s  "
+          f"playlist requests/s={requests / args.seconds:5.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--source", default=None, help="Camera URL (default: local ffmpeg stand-in)")
+    parser.add_argument("--source-port", type=int, default=8767)
+    parser.add_argument("--poll", type=float, default=0.1, help="Standard HLS playlist poll interval")
+    parser.add_argument("--port", type=int, default=8768)
+    args = parser.parse_args()
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    # After app startup, which applies config.json
+    StreamManager().configure(hls_store="memory", ingest_url=f"http://127.0.0.1:{args.port}")
+
+    try:
+        for mode in ("standard", "ll"):
+            run_mode(mode, args)
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
+
+
+if __name__ == "__main__":
+    main()
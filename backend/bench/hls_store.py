@@ -0,0 +1,150 @@
+"""
+HLS segment fetch latency: memory segment store vs. files on disk.
+
+    python -m backend.bench.hls_store [--seconds 10 --segment-kb 400 --dir /path/on/sdcard]
+
+Runs the real FastAPI app. A stand-in for ffmpeg publishes a new segment
+every --interval seconds (disk: file write + playlist rewrite + delete of
+the expired segment; memory: the same as HTTP PUT/DELETE to /hls), while a
+player fetches the playlist and its newest segment in a loop. Prints
+playlist/segment latency for both stores. Use --dir to put the disk store
+on the storage you care about (default: a temp dir).
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import uvicorn
+
+from ..main import app
+from ..stream.manager import StreamManager
+from ..stream.segments import SegmentStore
+from .common import percentile
+
+LIST_SIZE = 3
+
+
+def playlist(first: int, last: int) -> bytes:
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:1", f"#EXT-X-MEDIA-SEQUENCE:{first}"]
+    for n in range(first, last + 1):
+        lines += ["#EXTINF:1.000000,", f"stream{n}.ts"]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def publish(store: str, cam_id: str, hls_dir: str, port: int, args, stop: threading.Event):
+    """ffmpeg stand-in."""
+    data = os.urandom(args.segment_kb * 1024)
+    cam_dir = os.path.join(hls_dir, cam_id)
+    os.makedirs(cam_dir, exist_ok=True)
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    n = 0
+    while not stop.is_set():
+        first = max(0, n - LIST_SIZE + 1)
+        if store == "disk":
+            with open(os.path.join(cam_dir, f"stream{n}.ts"), "wb") as f:
+                f.write(data)
+            with open(os.path.join(cam_dir, "stream.m3u8.tmp"), "wb") as f:
+                f.write(playlist(first, n))
+            os.replace(os.path.join(cam_dir, "stream.m3u8.tmp"), os.path.join(cam_dir, "stream.m3u8"))  # Like ffmpeg
+            if n >= LIST_SIZE:
+                os.remove(os.path.join(cam_dir, f"stream{n - LIST_SIZE}.ts"))
+        else:
+            for method, name, body in (("PUT", f"stream{n}.ts", data), ("PUT", "stream.m3u8", playlist(first, n)),
+                                       ("DELETE", f"stream{n - LIST_SIZE}.ts", b"")):
+                if method == "DELETE" and n < LIST_SIZE:
+                    continue
+                conn.request(method, f"/hls/{cam_id}/{name}", body=body)
+                conn.getresponse().read()
+        n += 1
+        stop.wait(args.interval)
+    conn.close()
+
+
+def play(cam_id: str, port: int, seconds: float):
+    """Fetch playlist + newest segment in a loop; returns (playlist ms, segment ms) latencies."""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    pl_lat, seg_lat = [], []
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        t0 = time.perf_counter()
+        conn.request("GET", f"/hls/{cam_id}/stream.m3u8")
+        resp = conn.getresponse()
+        body = resp.read()
+        if resp.status != 200:
+            time.sleep(0.05)
+            continue
+        pl_lat.append((time.perf_counter() - t0) * 1000)
+        segs = [l for l in body.decode().splitlines() if l and not l.startswith("#")]
+        t0 = time.perf_counter()
+        conn.request("GET", f"/hls/{cam_id}/{segs[-1]}")
+        resp = conn.getresponse()
+        resp.read()
+        if resp.status == 200:
+            seg_lat.append((time.perf_counter() - t0) * 1000)
+    conn.close()
+    return pl_lat, seg_lat
+
+
+def run_clients(store: str, hls_dir: str, args, results):
+    cam_id = f"bench_{store}"
+    stop = threading.Event()
+    publisher = threading.Thread(target=publish, args=(store, cam_id, hls_dir, args.port, args, stop))
+    publisher.start()
+    try:
+        time.sleep(args.interval * 2)  # First segments
+        results[store] = play(cam_id, args.port, args.seconds)
+    finally:
+        stop.set()
+        publisher.join()
+
+
+def report(label: str, lat: list):
+    print(f"  {label:<16} n={len(lat):5d}  p50={percentile(lat, 50):6.2f} ms  "
+          f"p99={percentile(lat, 99):6.2f} ms  max={max(lat) if lat else 0:6.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--segment-kb", type=int, default=400, help="~1 s of 3 Mbit/s video")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between segments (-hls_time)")
+    parser.add_argument("--dir", default=None, help="Disk store location (default: temp dir)")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    tmp = None
+    hls_dir = args.dir
+    if hls_dir is None:
+        tmp = tempfile.TemporaryDirectory()
+        hls_dir = tmp.name
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    StreamManager().configure(hls_dir=hls_dir)  # After app startup, which sets the configured one
+
+    try:
+        ctx = multiprocessing.get_context("spawn")
+        results = ctx.Manager().dict()
+        for store in ("disk", "memory"):
+            clients = ctx.Process(target=run_clients, args=(store, hls_dir, args, results))
+            clients.start()
+            clients.join()
+            pl_lat, seg_lat = results[store]
+            print(f"{store} store ({args.segment_kb} KB segments every {args.interval:g}s):")
+            report("playlist", pl_lat)
+            report("segment", seg_lat)
+        print(f"Memory store: {SegmentStore().get_stats()}")
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
+        if tmp is not None:
+            tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
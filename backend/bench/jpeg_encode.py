@@ -0,0 +1,87 @@
+"""
+JPEG encode cost per backend / settings.
+
+    python -m backend.bench.jpeg_encode [--quality 70 --iterations 100]
+
+Encodes 720p and 1080p frames with every available backend (OpenCV, and
+turbojpeg if PyTurboJPEG + libturbojpeg are installed) and reports wall ms
+per frame and JPEG size. Inputs cover what the capture paths publish:
+BGR, a BGRX buffer viewed as BGR (NDI default) and raw UYVY, the latter
+either converted to BGR first or encoded straight from its YUV planes.
+"""
+import argparse
+import time
+import cv2
+import numpy as np
+from ..video.jpeg import ENCODERS, JpegOptions, scale_to_width
+from .common import test_pattern
+
+SIZES = [(1280, 720), (1920, 1080)]
+
+
+def frame_inputs(width: int, height: int):
+    bgr = test_pattern(width, height, 3)
+    # Add some noise so the entropy coder has real work, like camera video
+    noise = np.random.default_rng(0).integers(-12, 12, bgr.shape, dtype=np.int16)
+    bgr = np.clip(bgr.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+    bgrx = cv2.cvtColor(bgr, cv2.COLOR_BGR2BGRA)
+    yuv = cv2.cvtColor(bgr, cv2.COLOR_BGR2YUV)
+    uyvy = np.empty((height, width, 2), dtype=np.uint8)
+    uyvy[:, :, 1] = yuv[:, :, 0]
+    uyvy[:, 0::2, 0] = yuv[:, 0::2, 1]
+    uyvy[:, 1::2, 0] = yuv[:, 0::2, 2]
+    return {"bgr": bgr, "bgrx": bgrx[:, :, :3], "uyvy": uyvy}
+
+
+def ms_per_frame(fn, iterations: int):
+    out = fn()  # Warm up
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - t0) / iterations * 1000, len(out or b"")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quality", type=int, default=70)
+    parser.add_argument("--width", type=int, default=0, help="Output width (0 = native)")
+    parser.add_argument("--iterations", type=int, default=100)
+    args = parser.parse_args()
+
+    configs = [
+        JpegOptions(subsampling="420", fast_dct=True),
+        JpegOptions(subsampling="420", fast_dct=False),
+        JpegOptions(subsampling="422", fast_dct=True),
+        JpegOptions(subsampling="444", fast_dct=True),
+    ]
+
+    for width, height in SIZES:
+        inputs = frame_inputs(width, height)
+        print(f"\n{width}x{height} q{args.quality} -> {args.width or 'native'}w")
+        print(f"  {'backend':<10} {'subs':<5} {'dct':<5} {'input':<16} {'ms/frame':>9} {'KB':>7}")
+        for name, cls in ENCODERS.items():
+            try:
+                # OpenCV has no DCT switch; skip its duplicate rows
+                encoders = [cls(opts) for opts in configs if opts.fast_dct or name != "opencv"]
+            except (ImportError, OSError, RuntimeError) as e:
+                print(f"  {name:<10} unavailable ({e})")
+                continue
+            for enc in encoders:
+                cases = [("bgr", "bgr"), ("bgrx", "bgr"), ("uyvy->bgr", "uyvy")]
+                if "uyvy" in enc.raw_layouts:
+                    cases.append(("uyvy direct", "uyvy"))
+                for label, layout in cases:
+                    data = inputs[label.split("-")[0].split(" ")[0]]  # "uyvy->bgr" / "uyvy direct" -> "uyvy"
+                    if label == "uyvy->bgr":
+                        # Force the convert-then-encode path even if the backend could take YUV
+                        fn = lambda: enc.encode(scale_to_width(cv2.cvtColor(data, cv2.COLOR_YUV2BGR_UYVY), args.width),
+                                                args.quality)
+                    else:
+                        fn = lambda: enc.encode_frame(data, args.width, args.quality, layout)
+                    ms, size = ms_per_frame(fn, args.iterations)
+                    dct = "fast" if enc.options.fast_dct else "slow"
+                    print(f"  {enc.name:<10} {enc.options.subsampling:<5} {dct:<5} {label:<16} {ms:9.2f} {size / 1024:7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+MJPEG load test: N concurrent viewers on one camera while measuring PTZ API latency.
+
+    python -m backend.bench.mjpeg_load --viewers 300 --duration 10
+    python -m backend.bench.mjpeg_load --viewers 60 --sync   # old threadpool path, for comparison
+
+Runs the real FastAPI app against a synthetic camera and a no-op PTZ
+provider (PTZ rate limit off), so the numbers show server-side overhead only. Clients run in a
+separate process so they do not compete with the server for the GIL.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import threading
+import time
+import uvicorn
+from fastapi.responses import StreamingResponse
+
+from ..main import app
+from ..camera_manager import CameraManager
+from ..video.preview_manager import PreviewManager
+from .common import SyntheticProvider, NullPTZ, percentile
+
+CAM_ID = "bench_cam"
+
+
+async def http_request(port: int, method: str, path: str, body: bytes = b"") -> float:
+    """Single HTTP/1.1 request on a fresh connection; returns latency in ms."""
+    t0 = time.perf_counter()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    await reader.read()
+    writer.close()
+    return (time.perf_counter() - t0) * 1000
+
+
+async def viewer(port: int, path: str, stop: asyncio.Event, results: list, slow: bool):
+    frames = 0
+    tail = b""
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: bench\r\n\r\n".encode())
+        await writer.drain()
+        while not stop.is_set():
+            try:
+                data = await asyncio.wait_for(reader.read(16384 if slow else 262144), timeout=1.0)
+            except asyncio.TimeoutError:
+                continue
+            if not data:
+                break
+            chunk = tail + data
+            frames += chunk.count(b"--frame\r\n")
+            tail = chunk[-9:]
+            if slow:
+                # Simulate a tablet on bad Wi-Fi
+                await asyncio.sleep(0.1)
+        writer.close()
+    except OSError:
+        pass
+    results.append(frames)
+
+
+async def measure_ptz(port: int, seconds: float, rate: float = 20.0) -> list:
+    body = b'{"action": "move", "pan": 0.5, "tilt": 0, "speed": 0.5}'
+    latencies = []
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        latencies.append(await http_request(port, "POST", f"/api/cameras/{CAM_ID}/ptz", body))
+        await asyncio.sleep(1.0 / rate)
+    return latencies
+
+
+def report(label: str, lat: list):
+    print(f"{label:<22} n={len(lat):4d}  p50={percentile(lat, 50):7.1f} ms  "
+          f"p99={percentile(lat, 99):7.1f} ms  max={max(lat) if lat else 0:7.1f} ms")
+
+
+async def run(args):
+    path = f"/bench/sync/{CAM_ID}/mjpeg" if args.sync else f"/api/video/{CAM_ID}/mjpeg"
+
+    report("PTZ, no viewers", await measure_ptz(args.port, args.baseline))
+
+    stop = asyncio.Event()
+    results = []
+    n_slow = int(args.viewers * args.slow_fraction)
+    tasks = [asyncio.create_task(viewer(args.port, path, stop, results, i < n_slow))
+             for i in range(args.viewers)]
+    await asyncio.sleep(1.0)  # Let connections settle
+
+    report(f"PTZ, {args.viewers} viewers", await measure_ptz(args.port, args.duration))
+
+    stop.set()
+    await asyncio.gather(*tasks)
+    fast = sorted(results[n_slow:]) or [0]
+    print(f"Viewer frames (fast): min={fast[0]} median={fast[len(fast) // 2]} max={fast[-1]}")
+
+
+def run_clients(args):
+    asyncio.run(run(args))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--viewers", type=int, default=300)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--baseline", type=float, default=3.0)
+    parser.add_argument("--slow-fraction", type=float, default=0.1)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--sync", action="store_true", help="Use a sync-generator endpoint (pre-async behaviour)")
+    args = parser.parse_args()
+
+    provider = SyntheticProvider(CAM_ID, args.width, args.height, args.fps)
+    provider.start()
+    PreviewManager().providers[CAM_ID] = provider
+    cm = CameraManager()
+    cm.cameras[CAM_ID] = NullPTZ()
+    # No PTZ rate limit: measure what viewers cost the control path, not the mailbox's pacing
+    cm.config_manager.config.setdefault("settings", {})["ptz_rate_limits"] = {"default": 0}
+
+    if args.sync:
+        def sync_mjpeg(cam_id: str):
+            return StreamingResponse(provider.generate_mjpeg(),
+                                     media_type="multipart/x-mixed-replace; boundary=frame")
+        app.add_api_route("/bench/sync/{cam_id}/mjpeg", sync_mjpeg)
+        # Must sit in front of the "/" static mount
+        app.router.routes.insert(0, app.router.routes.pop())
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    try:
+        clients = multiprocessing.get_context("spawn").Process(target=run_clients, args=(args,))
+        clients.start()
+        clients.join()
+        stats = provider.get_stats()
+        print(f"Encoder: {stats['frames_encoded']} frames encoded once, "
+              f"delivered={stats['delivered']} skipped={stats['skipped']} (skips = dropped for slow sockets)")
+    finally:
+        server.should_exit = True
+        provider.stop()
+        thread.join(timeout=5)
+
+
+if __name__ == "__main__":
+    main()
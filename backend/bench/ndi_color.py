@@ -0,0 +1,57 @@
+"""
+CPU cost of the NDI capture path per receive color format.
+
+    python -m backend.bench.ndi_color [--width 1920 --height 1080 --fps 60]
+
+Replays synthetic NDI buffers through the same code the capture loop runs
+(copy out of the receiver buffer + frame_to_bgr) and reports CPU ms per
+frame and the share of one core for a single source at the given rate.
+"""
+import argparse
+import time
+import numpy as np
+from ..video.ndi import frame_to_bgr
+
+
+def cpu_ms_per_frame(fn, iterations: int) -> float:
+    fn()  # Warm up
+    t0 = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - t0) / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--fps", type=float, default=60.0)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+    w, h = args.width, args.height
+
+    rng = np.random.default_rng(0)
+    buffers = {
+        "uyvy": rng.integers(0, 255, (h, w * 2), dtype=np.uint8),
+        "bgra": rng.integers(0, 255, (h, w * 4), dtype=np.uint8),
+        "rgba": rng.integers(0, 255, (h, w * 4), dtype=np.uint8),
+    }
+    cases = [
+        ("UYVY_BGRA (old default)", "uyvy"),
+        ("BGRX_BGRA", "bgra"),
+        ("RGBX_RGBA", "rgba"),
+    ]
+
+    print(f"{w}x{h} @ {args.fps:g} fps, CPU per frame incl. copy out of the NDI buffer")
+    base = None
+    for label, layout in cases:
+        buf = buffers[layout]
+        ms = cpu_ms_per_frame(lambda: frame_to_bgr(np.copy(buf), w, h, layout), args.iterations)
+        core = ms * args.fps / 10.0  # ms/frame * frames/s -> % of one core
+        base = base if base is not None else ms
+        saved = (base - ms) * args.fps / 10.0
+        print(f"  {label:<24} {ms:6.2f} ms/frame  {core:5.1f}% core  saved vs UYVY: {saved:5.1f}% core")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+ONVIF move latency: prebuilt-envelope fast path vs. zeep.
+
+    python -m backend.bench.onvif_move [--moves 500 --camera-ms 5]
+
+Runs OnvifProvider against a local fake ONVIF camera and
+times each move() call the way the PTZ route makes it:
+  legacy  GetStatus + zeep ContinuousMove, what move() used to send
+  zeep    zeep ContinuousMove only (the fast path's fallback)
+  fast    prebuilt envelope on the keep-alive session
+  async   move_async(): prebuilt envelope on the per-camera httpx connection
+--camera-ms adds processing time per request on the fake camera; real
+cameras take a few ms to tens of ms, which the legacy path pays twice.
+"""
+import argparse
+import asyncio
+import math
+import time
+
+from ..ptz.onvif import OnvifProvider
+from .common import FakeOnvifCamera, percentile
+
+PASSWORD = "bench"
+
+
+def velocities(i: int):
+    """Joystick-like sweep so every request differs."""
+    a = i * 0.1
+    return math.cos(a), math.sin(a), 0.5 * math.sin(a / 3), 0.8
+
+
+def legacy_move(provider: OnvifProvider, pan, tilt, zoom, speed):
+    provider.ptz.GetStatus({'ProfileToken': provider.profile_token})
+    provider.ptz.ContinuousMove(provider._move_request(pan * speed, tilt * speed, zoom * speed))
+    return True
+
+
+async def run(mode: str, provider: OnvifProvider, camera: FakeOnvifCamera, moves: int):
+    provider.fast_path = mode in ("fast", "async")
+    if mode == "async":
+        move = provider.move_async
+    else:
+        sync_move = (lambda *v: legacy_move(provider, *v)) if mode == "legacy" else provider.move
+        async def move(*v):
+            return sync_move(*v)  # Called inline, like the old sync route in its worker thread
+    for i in range(20):  # Warm up (connection, zeep caches)
+        await move(*velocities(i))
+    before = sum(camera.calls.values())
+    lat = []
+    for i in range(moves):
+        t0 = time.perf_counter()
+        if not await move(*velocities(i)):
+            raise RuntimeError(f"{mode} move failed")
+        lat.append((time.perf_counter() - t0) * 1000)
+    requests = (sum(camera.calls.values()) - before) / moves
+    print(f"  {mode:<7} p50={percentile(lat, 50):6.2f} ms  p99={percentile(lat, 99):6.2f} ms  "
+          f"max={max(lat):6.2f} ms  requests/move={requests:.1f}")
+    return lat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--moves", type=int, default=500)
+    parser.add_argument("--camera-ms", type=float, default=0.0, help="Fake camera processing time per request")
+    parser.add_argument("--port", type=int, default=8780)
+    args = parser.parse_args()
+
+    camera = FakeOnvifCamera(args.port, password=PASSWORD, camera_ms=args.camera_ms)
+    try:
+        provider = OnvifProvider("127.0.0.1", args.port, "admin", PASSWORD)
+        if not provider.connect():
+            raise SystemExit("Could not connect to the fake camera")
+        print(f"{args.moves} moves, fake camera +{args.camera_ms:g} ms/request:")
+        for mode in ("legacy", "zeep", "fast", "async"):
+            asyncio.run(run(mode, provider, camera, args.moves))
+        t0 = time.perf_counter()
+        provider.stop()
+        print(f"  stop    {(time.perf_counter() - t0) * 1000:6.2f} ms  fast path still on: {provider.fast_path}")
+    finally:
+        camera.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+PTZ control latency: POST per command vs. the /ws/ptz channel, plus the dead man stop.
+
+    python -m backend.bench.ptz_ws [--commands 300 --interval 0.05 --camera-ms 5]
+
+Runs the real FastAPI app with an OnvifProvider on a local fake ONVIF
+camera (rate limit off, so every command reaches the camera). A joystick
+sends a move every --interval seconds, first as POSTs on a keep-alive
+connection, then over the WebSocket. For each command we record:
+  motion  client send -> the camera receiving the ContinuousMove
+  ack     client send -> the POST response / the WebSocket ack
+Then the dead man: a client starts a move and goes silent (or drops the
+socket), and we time how long until the camera gets a Stop.
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import threading
+import time
+import uvicorn
+import websockets
+
+from ..main import app
+from ..camera_manager import CameraManager
+from ..ptz.onvif import OnvifProvider
+from .common import FakeOnvifCamera, percentile
+
+CAM_ID = "bench_ptz"
+PASSWORD = "bench"
+
+
+def velocities(i: int):
+    return (0.5 if i % 2 else -0.5), 0.25, 0.0, 0.8  # Alternate direction so every command matters
+
+
+def motion_latency(camera: FakeOnvifCamera, sent: float) -> float:
+    """ms from sent to the first ContinuousMove that reached the camera after it."""
+    for ts, action in camera.arrivals:
+        if ts >= sent and action == "ContinuousMove":
+            return (ts - sent) * 1000
+    return float("nan")
+
+
+def run_post(args, camera: FakeOnvifCamera):
+    conn = http.client.HTTPConnection("127.0.0.1", args.port, timeout=10)
+    motion, ack = [], []
+    for i in range(args.commands):
+        pan, tilt, zoom, speed = velocities(i)
+        body = json.dumps({"action": "move", "pan": pan, "tilt": tilt, "zoom": zoom, "speed": speed})
+        camera.arrivals.clear()
+        t0 = time.perf_counter()
+        conn.request("POST", f"/api/cameras/{CAM_ID}/ptz", body=body, headers={"Content-Type": "application/json"})
+        resp = conn.getresponse()
+        resp.read()
+        ack.append((time.perf_counter() - t0) * 1000)
+        if resp.status != 200:
+            raise RuntimeError(f"POST failed: {resp.status}")
+        motion.append(motion_latency(camera, t0))
+        time.sleep(max(0.0, args.interval - (time.perf_counter() - t0)))
+    conn.request("POST", f"/api/cameras/{CAM_ID}/ptz", body='{"action": "stop"}',
+                 headers={"Content-Type": "application/json"})
+    conn.getresponse().read()
+    conn.close()
+    return motion, ack
+
+
+async def run_ws(args, camera: FakeOnvifCamera):
+    motion, ack = [], []
+    async with websockets.connect(f"ws://127.0.0.1:{args.port}/ws/ptz/{CAM_ID}") as ws:
+        for i in range(args.commands):
+            pan, tilt, zoom, speed = velocities(i)
+            camera.arrivals.clear()
+            t0 = time.perf_counter()
+            await ws.send(f"m {i + 1} {pan} {tilt} {zoom} {speed}")
+            reply = (await ws.recv()).split()
+            ack.append((time.perf_counter() - t0) * 1000)
+            if reply[:3] != ["a", str(i + 1), "1"]:
+                raise RuntimeError(f"Unexpected ack: {reply}")
+            motion.append(motion_latency(camera, t0))
+            await asyncio.sleep(max(0.0, args.interval - (time.perf_counter() - t0)))
+        await ws.send(f"s {args.commands + 1}")
+        await ws.recv()
+    return motion, ack
+
+
+async def wait_stop(camera: FakeOnvifCamera, since: float, timeout: float = 5.0) -> float:
+    """Seconds from since until the camera got a Stop."""
+    while time.perf_counter() - since < timeout:
+        for ts, action in camera.arrivals:
+            if ts >= since and action == "Stop":
+                return ts - since
+        await asyncio.sleep(0.005)
+    return float("nan")
+
+
+async def run_deadman(args, camera: FakeOnvifCamera):
+    url = f"ws://127.0.0.1:{args.port}/ws/ptz/{CAM_ID}"
+    async with websockets.connect(url) as ws:
+        await ws.send("m 1 1 0 0 1")
+        await ws.recv()
+        silent = time.perf_counter()  # Tab freezes: no heartbeats from here on
+        silence = await wait_stop(camera, silent)
+        await ws.send("s 2")
+        await ws.recv()
+    ws = await websockets.connect(url)
+    await ws.send("m 1 1 0 0 1")
+    await ws.recv()
+    ws.transport.abort()  # Network gone, no close handshake
+    dropped = time.perf_counter()
+    drop = await wait_stop(camera, dropped)
+    return silence, drop
+
+
+def report(label: str, lat: list):
+    print(f"  {label:<18} p50={percentile(lat, 50):6.2f} ms  p99={percentile(lat, 99):6.2f} ms  max={max(lat):6.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--commands", type=int, default=300)
+    parser.add_argument("--interval", type=float, default=0.05, help="Seconds between joystick updates")
+    parser.add_argument("--camera-ms", type=float, default=0.0, help="Fake camera processing time per request")
+    parser.add_argument("--port", type=int, default=8783)
+    parser.add_argument("--camera-port", type=int, default=8784)
+    args = parser.parse_args()
+
+    camera = FakeOnvifCamera(args.camera_port, password=PASSWORD, camera_ms=args.camera_ms)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    cm = CameraManager()
+    provider = OnvifProvider("127.0.0.1", args.camera_port, "admin", PASSWORD)
+    try:
+        if not provider.connect():
+            raise SystemExit("Could not connect to the fake camera")
+        cm.cameras[CAM_ID] = provider
+        cm.config_manager.config.setdefault("settings", {})["ptz_rate_limits"] = {provider.model: 0}  # No limit
+
+        print(f"{args.commands} moves every {args.interval * 1000:.0f} ms, fake camera +{args.camera_ms:g} ms/request:")
+        motion, ack = run_post(args, camera)
+        report("POST   motion", motion)
+        report("POST   response", ack)
+        motion, ack = asyncio.run(run_ws(args, camera))
+        report("WS     motion", motion)
+        report("WS     ack", ack)
+        silence, drop = asyncio.run(run_deadman(args, camera))
+        deadman = cm.config_manager.get_setting("ptz_deadman", 0.5)
+        print(f"  dead man ({deadman:g} s): stop after {silence:.2f} s of silence, {drop * 1000:.0f} ms after a dropped socket")
+    finally:
+        cm.cameras.pop(CAM_ID, None)
+        server.should_exit = True
+        thread.join(timeout=5)
+        camera.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ from typing import Dict, Optional
 from .config import ConfigManager
 from .ptz.provider import PTZProvider
 from .ptz.onvif import OnvifProvider  # We will create this next
+from .ptz.mailbox import PTZMailbox
 # from .ptz.visca import ViscaProvider # Placeholder for phase 2
 
 from datetime import datetime
@@ -13,6 +14,7 @@ class CameraManager:
         if cls._instance is None:
             cls._instance = super(CameraManager, cls).__new__(cls)
             cls._instance.cameras: Dict[str, PTZProvider] = {}
+            cls._instance.mailboxes: Dict[str, PTZMailbox] = {}  # Latest-wins move/stop per camera
             cls._instance.states: Dict[str, Dict] = {} # Runtime State
             cls._instance.config_manager = ConfigManager()
             cls._instance.load_cameras()
@@ -67,7 +69,9 @@ class CameraManager:
                     ip=cam_config["ip"],
                     port=cam_config["onvif_port"],
                     username=cam_config["username"],
-                    password=cam_config["password"]
+                    password=cam_config["password"],
+                    timeout=self.config_manager.get_setting("ptz_timeout", 2.0),
+                    connect_timeout=self.config_manager.get_setting("ptz_connect_timeout", 1.0)
                 )
             except Exception as e:
                 print(f"Failed to create ONVIF provider for {cam_id}: {e}")
@@ -97,6 +101,18 @@ class CameraManager:
     def get_camera(self, cam_id: str) -> Optional[PTZProvider]:
         return self.cameras.get(cam_id)
 
+    def get_mailbox(self, cam_id: str) -> Optional[PTZMailbox]:
+        provider = self.cameras.get(cam_id)
+        if provider is None:
+            return None
+        mailbox = self.mailboxes.get(cam_id)
+        if mailbox is None or mailbox.provider is not provider:
+            if mailbox is not None:
+                mailbox.close()
+            mailbox = PTZMailbox(cam_id, provider, self.config_manager.get_setting("ptz_rate_limits", {}))
+            self.mailboxes[cam_id] = mailbox
+        return mailbox
+
     def add_camera(self, cam_config: Dict):
         """Add to config and initialize provider."""
         self.config_manager.add_camera(cam_config)
@@ -105,7 +121,9 @@ class CameraManager:
 
     def remove_camera(self, cam_id: str):
         self.config_manager.remove_camera(cam_id)
+        if cam_id in self.mailboxes:
+            self.mailboxes.pop(cam_id).close()
         if cam_id in self.cameras:
-            del self.cameras[cam_id]
+            self.cameras.pop(cam_id).close()
         if cam_id in self.states:
             del self.states[cam_id]
@@ -9,6 +9,18 @@ class PreviewConfig(BaseModel):
     type: str = "rtsp" # ndi | rtsp
     ndi_source: Optional[str] = None
     rtsp_url: Optional[str] = None 
+    # NDI receiver tuning
+    ndi_bandwidth: str = "highest" # highest | lowest (proxy stream, enough for a preview tile)
+    ndi_color_format: str = "bgrx_bgra" # bgrx_bgra | uyvy_bgra | rgbx_rgba | uyvy_rgba | fastest | best
+    rtsp_mode: str = "hls" # hls | mjpeg (low latency, from the decoded frames) | both
+    hls_mode: str = "standard" # standard | ll (Low-Latency HLS; needs settings.hls_store "memory")
+    # RTSP: decoded frames for CV from the HLS ffmpeg process. 0 = only when something uses them
+    # (mjpeg/both mode, frame_bus, history); plain HLS previews then skip the decode
+    rtsp_frame_width: int = 0
+    rtsp_frame_fps: float = 0 # 0 = camera rate
+    warm_standby: bool = False # Keep running even without viewers (never idle-reaped)
+    frame_bus: bool = False # Publish frames to shared memory for sidecar processes (docs/PHASE2_HOOKS.md)
+    history: Optional[Dict[str, Any]] = None # Frame history ring, e.g. {"seconds": 10, "max_mb": 64, "format": "jpeg"}
 
 class CameraConfig(BaseModel):
     id: str
@@ -88,6 +100,10 @@ class ConfigManager:
         with open(CONFIG_FILE, "w") as f:
             json.dump(self.config, f, indent=4)
 
+    def get_setting(self, key: str, default: Any = None) -> Any:
+        """Global settings live under "settings" in config.json (e.g. preview_idle_timeout)."""
+        return self.config.get("settings", {}).get(key, default)
+
     def get_cameras(self) -> List[Dict[str, Any]]:
         return self.config.get("cameras", [])
 
@@ -1,5 +1,11 @@
 import os
+import re
+import math
+import time
+import struct
+import asyncio
 import uvicorn
+from typing import Optional
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -21,60 +27,145 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 HLS_DIR = os.path.join(BASE_DIR, "hls")
 FRONTEND_DIR = os.path.join(BASE_DIR, "../frontend")
 
-# Ensure HLS directory exists and mount it
+# Ensure HLS directory exists (disk store; see the /hls routes below)
 os.makedirs(HLS_DIR, exist_ok=True)
-app.mount("/hls", StaticFiles(directory=HLS_DIR), name="hls")
 
 from .logger import logger
 from .routers import cameras
 from .camera_manager import CameraManager
 from .video.preview_manager import PreviewManager
-from fastapi.responses import StreamingResponse
+from .video.broadcaster import Rendition, mjpeg_part
+from .video.multiview import parse_layout
+from .video import jpeg
+from .stream.manager import StreamManager
+from .stream.segments import SegmentStore, content_type
+from .stream import llhls
+from fastapi import Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse, Response, FileResponse
 
 # Include routers
 app.include_router(cameras.router, prefix="/api")
 
 @app.on_event("startup")
 def startup_event():
-    # Lazy load: Don't start streams here.
+    # Lazy load: Don't start streams here, except warm standby cameras.
     logger.log("INFO", "Backend started (Lazy Preview Loading enabled)", "system", "startup")
-    pass
+    cm = CameraManager()
+    pm = PreviewManager()
+    jpeg.configure(cm.config_manager.get_setting("jpeg"))
+    StreamManager().configure(
+        hls_dir=HLS_DIR,
+        hls_store=cm.config_manager.get_setting("hls_store", "disk"),
+        ingest_url=cm.config_manager.get_setting("hls_ingest_url")
+    )
+    pm.configure(
+        idle_timeout=cm.config_manager.get_setting("preview_idle_timeout"),
+        encode_workers=cm.config_manager.get_setting("encode_workers", 0)
+    )
+    for conf in cm.config_manager.get_cameras():
+        if conf.get("preview", {}).get("warm_standby"):
+            pm.create_provider(conf)
 
 @app.on_event("shutdown")
 def shutdown_event():
     PreviewManager().stop_all()
 
+def get_or_start_provider(cam_id: str):
+    """Running provider for cam_id, lazily created from config. None if not configured."""
+    pm = PreviewManager()
+    pm.touch(cam_id) # Reset idle clock so the reaper can't race this request
+    provider = pm.get_provider(cam_id)
+    if not provider:
+        conf = CameraManager().config_manager.get_camera(cam_id)
+        if not conf:
+            return None
+        print(f"Lazy loading preview for {cam_id}")
+        provider = pm.create_provider(conf)
+    return provider
+
+async def wait_running(provider, timeout: float = 3.0) -> bool:
+    """Lazy starts happen in a background thread; give the provider a moment."""
+    for _ in range(int(timeout / 0.1)):
+        if provider.is_running():
+            return True
+        await asyncio.sleep(0.1)
+    return provider.is_running()
+
+@app.get("/api/video/multiview/mjpeg")
+async def video_multiview(cams: str, layout: str = "2x2", w: int = Query(1280, ge=64, le=3840),
+                          fps: float = Query(15, gt=0, le=30), q: int = Query(70, ge=1, le=100)):
+    """
+    One composited MJPEG stream for several cameras (cams=a,b,c,d).
+    Uses a single HTTP connection instead of one per tile; the mosaic is built
+    and encoded once and shared by every viewer of the same layout/cameras.
+    (Must be registered before /api/video/{cam_id}/mjpeg.)
+    """
+    cam_ids = [c for c in cams.split(",") if c]
+    if not cam_ids or any("<" in c or "%3C" in c for c in cam_ids):
+        return Response(status_code=400, content="Invalid camera list")
+
+    try:
+        parse_layout(layout)
+    except ValueError as e:
+        return Response(status_code=400, content=str(e))
+    config = CameraManager().config_manager
+    unknown = [c for c in cam_ids if not config.get_camera(c)]
+    if unknown:
+        return Response(status_code=404, content=f"Unknown cameras: {','.join(unknown)}")
+
+    pm = PreviewManager()
+    rendition = Rendition.normalize(0, 0, q)
+
+    async def frame_wrapper():
+        # Acquired here, not in the handler: if the client is gone before the body
+        # starts, this never runs and there is nothing to release
+        mv = pm.acquire_multiview(layout, cam_ids, w, fps, config.get_camera)
+        try:
+            async for chunk in mv.renditions.stream_async(rendition):
+                yield chunk
+        finally:
+            pm.release_multiview(mv)
+
+    headers = {
+        "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
+        "Pragma": "no-cache",
+        "Expires": "0"
+    }
+    return StreamingResponse(frame_wrapper(), media_type="multipart/x-mixed-replace; boundary=frame", headers=headers)
+
 @app.get("/api/video/{cam_id}/mjpeg")
-def video_mjpeg(cam_id: str):
-    """Serve MJPEG stream for a camera."""
+async def video_mjpeg(cam_id: str, w: int = Query(0, ge=0), fps: float = Query(0, ge=0), q: int = Query(70, ge=1, le=100)):
+    """
+    Serve MJPEG stream for a camera (asyncio-native, no threadpool worker per viewer).
+    w/fps/q select a rendition (width, max frame rate, JPEG quality); clients asking
+    for the same rendition share one scaler/encoder.
+    """
     # Diagnostic
     if "<" in cam_id or "%3C" in cam_id:
         return {"error": "Invalid Camera ID"}, 400
 
     pm = PreviewManager()
-    
-    # Lazy Load Logic
-    provider = pm.get_provider(cam_id)
-    if not provider:
-        # Try to find config and start it
-        cm = CameraManager()
-        conf = cm.config_manager.get_camera(cam_id)
-        if conf:
-            # Create (or get existing if race condition handled by PM guards)
-            print(f"Lazy loading preview for {cam_id}")
-            provider = pm.create_provider(conf)
-        else:
-            return {"error": "Camera config not found"}, 404
-
-    if not provider or not hasattr(provider, 'generate_mjpeg'):
+    provider = get_or_start_provider(cam_id)
+    if provider is None and not CameraManager().config_manager.get_camera(cam_id):
+        return {"error": "Camera config not found"}, 404
+
+    if not provider or not hasattr(provider, 'generate_mjpeg_async'):
          return {"error": "Source not found or not MJPEG compatible"}, 404
+    await wait_running(provider)
     
-    def frame_wrapper():
-        # Pass through frames and update activity
-        for chunk in provider.generate_mjpeg():
-            # Update state (activity=True)
-            pm.update_state(cam_id, activity=True)
-            yield chunk
+    rendition = Rendition.normalize(w, fps, q)
+
+    async def frame_wrapper():
+        # Pass through frames and update activity.
+        # Slow sockets drop frames here: the next chunk is always the newest JPEG.
+        pm.acquire(cam_id) # Viewer refcount keeps the provider from being idle-reaped
+        try:
+            async for chunk in provider.generate_mjpeg_async(rendition):
+                # Update state (activity=True)
+                pm.update_state(cam_id, activity=True)
+                yield chunk
+        finally:
+            pm.release(cam_id)
 
     headers = {
         "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
@@ -83,6 +174,326 @@ def video_mjpeg(cam_id: str):
     }
     return StreamingResponse(frame_wrapper(), media_type="multipart/x-mixed-replace; boundary=frame", headers=headers)
 
+@app.get("/api/video/{cam_id}/replay.mjpeg")
+async def video_replay(cam_id: str, ago: float = Query(5.0, gt=0), duration: float = Query(0, ge=0),
+                       speed: float = Query(1.0, gt=0, le=8), w: int = Query(0, ge=0), q: int = Query(80, ge=1, le=100)):
+    """
+    Instant replay from the camera's frame history (preview.history must be enabled).
+    Plays from `ago` seconds back for `duration` seconds (0 = up to the time of the
+    request) at `speed`x real time with the original frame pacing, then ends.
+    """
+    pm = PreviewManager()
+    provider = pm.get_provider(cam_id)
+    history = getattr(provider, "history", None) if provider else None
+    if history is None:
+        return Response(status_code=404, content="Frame history not enabled or preview not running")
+
+    end_ts = time.time()
+    start_ts = end_ts - ago
+    if duration:
+        end_ts = min(end_ts, start_ts + duration)
+    frames = history.get_range(start_ts, end_ts)
+    if not frames:
+        return Response(status_code=404, content="No frames recorded for that time")
+
+    async def replay():
+        pm.acquire(cam_id)
+        try:
+            t0 = time.monotonic()
+            for f in frames:
+                delay = t0 + (f.ts - frames[0].ts) / speed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                jpeg = await asyncio.to_thread(f.jpeg, w, q) # Stored JPEG as is unless resized/raw
+                if jpeg:
+                    yield mjpeg_part(jpeg)
+        finally:
+            pm.release(cam_id)
+
+    headers = {
+        "Cache-Control": "no-store",
+        "X-Replay-Start": f"{frames[0].ts:.3f}",
+        "X-Replay-Frames": str(len(frames))
+    }
+    return StreamingResponse(replay(), media_type="multipart/x-mixed-replace; boundary=frame", headers=headers)
+
+# WebSocket frame header: uint64 sequence number + float64 capture time (unix seconds), little-endian
+WS_FRAME_HEADER = struct.Struct("<Qd")
+
+@app.websocket("/ws/video/{cam_id}")
+async def video_ws(websocket: WebSocket, cam_id: str, w: int = 0, fps: float = 0, q: int = 70):
+    """
+    JPEG frames as binary WebSocket messages (16-byte header + JPEG).
+    Flow control: at most one frame in flight per client. The next frame is only
+    sent after the client acks (any message) the previous one, and it is always the
+    newest frame, so a slow link skips frames instead of building up lag.
+    """
+    await websocket.accept()
+    provider = get_or_start_provider(cam_id)
+    if not provider or not hasattr(provider, "has_frames") or not await wait_running(provider):
+        await websocket.close(code=1011, reason="Preview not available")
+        return
+    if not provider.has_frames():
+        # e.g. RTSP in HLS-only mode: nothing would ever be sent
+        await websocket.close(code=1011, reason="Preview has no frames (HLS only)")
+        return
+
+    pm = PreviewManager()
+    ack = asyncio.Event()
+    disconnected = asyncio.Event()
+
+    async def read_acks():
+        while True:
+            msg = await websocket.receive()
+            if msg["type"] == "websocket.disconnect":
+                disconnected.set()
+                ack.set()
+                return
+            ack.set()
+
+    reader = asyncio.create_task(read_acks())
+    pm.acquire(cam_id)
+    frames = provider.renditions.stream_async(Rendition.normalize(w, fps, q), frames=True)
+    try:
+        async for snap in frames:
+            if disconnected.is_set():
+                break
+            ack.clear()
+            await websocket.send_bytes(WS_FRAME_HEADER.pack(snap.seq, snap.ts) + snap.jpeg)
+            pm.update_state(cam_id, activity=True)
+            await ack.wait()
+            if disconnected.is_set():
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await frames.aclose()
+        reader.cancel()
+        pm.release(cam_id)
+        if not disconnected.is_set():
+            # Stream ended server-side (preview stopped/restarted); client reconnects
+            try:
+                await websocket.close()
+            except Exception:
+                pass
+
+PTZ_DEADMAN = 0.5  # Seconds without a message from a moving joystick before we stop the camera
+
+@app.websocket("/ws/ptz/{cam_id}")
+async def ptz_ws(websocket: WebSocket, cam_id: str):
+    """
+    PTZ control channel: one socket per joystick instead of a POST per tick.
+    Client text messages (anything else is answered with "e <message>"):
+        m <seq> <pan> <tilt> <zoom> <speed>   move
+        s <seq>                               stop
+        h                                     heartbeat, while moving
+    Every command is acked once the camera has answered: "a <seq> <1|0> <ms>"
+    (ok, ms from receipt to the camera's answer). Commands go through the
+    camera's mailbox, so one replaced by a newer command is acked with the
+    result of that one. Dead man: while moving, silence for
+    settings.ptz_deadman seconds or the socket closing stops the camera.
+    """
+    await websocket.accept()
+    cm = CameraManager()
+    mailbox = cm.get_mailbox(cam_id)
+    if mailbox is None:
+        await websocket.close(code=1011, reason="Camera not found or not connected")
+        return
+    deadman = cm.config_manager.get_setting("ptz_deadman", PTZ_DEADMAN)
+    moving = False
+    last_seq = -1
+    acks = set()
+
+    async def ack(seq: int, command, t0: float):
+        ok = await command
+        try:
+            await websocket.send_text(f"a {seq} {int(ok)} {(time.perf_counter() - t0) * 1000:.1f}")
+        except Exception:
+            pass  # Socket already gone
+
+    try:
+        while True:
+            try:
+                message = await asyncio.wait_for(websocket.receive(), deadman if moving else None)
+            except asyncio.TimeoutError:
+                logger.log("WARN", f"PTZ channel silent for {deadman}s while moving, stopping", cam_id, "control.deadman")
+                moving = False
+                await mailbox.stop()
+                continue
+            if message["type"] == "websocket.disconnect":
+                break
+            t0 = time.perf_counter()
+            text = message.get("text")
+            if text is None:
+                # Binary frame: the protocol is text only
+                await websocket.send_text(f"e {(message.get('bytes') or b'')[:64].decode('utf-8', 'replace')}")
+                continue
+            fields = text.split()
+            if not fields or fields[0] == "h":
+                continue
+            try:
+                seq = int(fields[1])
+                if fields[0] == "m":
+                    pan, tilt, zoom, speed = (float(v) for v in fields[2:6])
+                    if not all(math.isfinite(v) for v in (pan, tilt, zoom, speed)):
+                        raise ValueError
+                elif fields[0] != "s":
+                    raise ValueError
+            except (IndexError, ValueError):
+                await websocket.send_text(f"e {text[:64]}")  # Not understood
+                continue
+            if seq <= last_seq:
+                continue  # Duplicate
+            last_seq = seq
+            if fields[0] == "m":
+                moving = speed != 0 and (pan != 0 or tilt != 0 or zoom != 0)
+                command = mailbox.move(pan, tilt, zoom, speed)
+            else:
+                moving = False
+                command = mailbox.stop()
+            task = asyncio.create_task(ack(seq, command, t0))
+            acks.add(task)
+            task.add_done_callback(acks.discard)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if moving:
+            logger.log("WARN", "PTZ channel closed while moving, stopping", cam_id, "control.deadman")
+            await mailbox.stop()
+
+@app.get("/api/video/{cam_id}/snapshot.jpg")
+def video_snapshot(request: Request, cam_id: str, max_age_ms: int = Query(100, ge=0),
+                   w: int = Query(0, ge=0), q: Optional[int] = Query(None, ge=1, le=100)):
+    """
+    Still JPEG for thumbnails. Served from the latest already-encoded frame when a
+    stream is running; ETag is the frame sequence so unchanged frames cost a 304.
+    max_age_ms: how much older than the newest captured frame the still may be.
+    w=0 takes whatever size a running stream encodes (native if none is running).
+    """
+    pm = PreviewManager()
+    pm.touch(cam_id)
+    provider = pm.get_provider(cam_id)
+    if not provider:
+        conf = CameraManager().config_manager.get_camera(cam_id)
+        if not conf:
+            return Response(status_code=404)
+        provider = pm.create_provider(conf)
+    if not provider or not hasattr(provider, 'snapshot'):
+        return Response(status_code=404)
+
+    if not provider.is_running():
+        # Lazy start runs in the background; give it a moment
+        for _ in range(20):
+            time.sleep(0.1)
+            if provider.is_running():
+                break
+    snap = provider.snapshot(w, q, max_age_ms / 1000.0)
+    if snap is None:
+        return Response(status_code=503, headers={"Retry-After": "1"})
+
+    etag = f'"{cam_id}-{snap.seq}-{snap.rendition.width}-{snap.rendition.quality}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "no-cache", # Always revalidate; unchanged frames are a cheap 304
+        "X-Frame-Seq": str(snap.seq),
+        "X-Capture-Ts": f"{snap.ts:.3f}"
+    }
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=snap.jpeg, media_type="image/jpeg", headers=headers)
+
+# --- HLS (memory segment store, or files on disk) ---
+
+HLS_PLAYLIST_CACHE = "no-cache"  # Live playlist: always revalidate (ETag)
+HLS_SEGMENT_CACHE = "public, max-age=60, immutable"  # Segment names never repeat (epoch_us numbering)
+
+def is_local(request: Request) -> bool:
+    return request.client is not None and request.client.host in ("127.0.0.1", "::1", "localhost")
+
+HLS_NAME = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9_.-]*$")  # Camera IDs and playlist/segment names: no separators, no dot files
+
+def hls_disk_path(cam_id: str, name: str) -> Optional[str]:
+    """File for /hls/{cam_id}/{name} in the disk store, or None if it would leave hls_dir/<cam_id>."""
+    if not HLS_NAME.match(cam_id) or not HLS_NAME.match(name):
+        return None
+    cam_dir = os.path.realpath(os.path.join(StreamManager().hls_dir, cam_id))
+    path = os.path.realpath(os.path.join(cam_dir, name))
+    if os.path.dirname(path) != cam_dir:
+        return None
+    return path
+
+async def ll_hls_file(playlist: llhls.LLPlaylist, name: str, request: Request) -> Optional[Response]:
+    """LL-HLS playlist (with blocking reload), parts and segments. None: not an LL-HLS file."""
+    hold = 3 * playlist.segment_target + 1.0
+    if name == "stream.m3u8":
+        msn = request.query_params.get("_HLS_msn")
+        if msn is not None:
+            # Blocking reload: answer once the playlist has the requested segment/part
+            try:
+                msn = int(msn)
+                part = request.query_params.get("_HLS_part")
+                part = int(part) if part is not None else None
+            except ValueError:
+                return Response(status_code=400)
+            if msn > playlist.last_msn() + 2:
+                return Response(status_code=400)  # Too far ahead (spec)
+            if not await playlist.wait(lambda: playlist.has(msn, part), hold):
+                return Response(status_code=503)
+        if not playlist.ready():
+            return Response(status_code=404)
+        return Response(content=playlist.render(), media_type=content_type(name),
+                        headers={"Cache-Control": HLS_PLAYLIST_CACHE})
+    data = playlist.get_media(name)
+    if data is None and name == playlist.next_part_name():
+        # Preload hint: hold the request until ffmpeg delivers the part
+        await playlist.wait(lambda: playlist.get_media(name) is not None, hold)
+        data = playlist.get_media(name)
+    if data is None:
+        return None
+    return Response(content=data, media_type=content_type(name), headers={"Cache-Control": HLS_SEGMENT_CACHE})
+
+@app.get("/hls/{cam_id}/{name}")
+async def hls_file(cam_id: str, name: str, request: Request):
+    # Player fetches count as activity (and lazy-start); ffmpeg's PUT/DELETE uploads don't
+    get_or_start_provider(cam_id)
+    playlist = llhls.get_playlist(cam_id)
+    if playlist is not None:
+        resp = await ll_hls_file(playlist, name, request)
+        if resp is not None:
+            return resp
+    # Playlists and the fMP4 init segment (same name after an ffmpeg restart) are revalidated
+    cache = HLS_PLAYLIST_CACHE if name.endswith((".m3u8", ".mp4")) else HLS_SEGMENT_CACHE
+    seg = SegmentStore().get(cam_id, name)
+    if seg is not None:
+        headers = {"Cache-Control": cache, "ETag": seg.etag}
+        if request.headers.get("if-none-match") == seg.etag:
+            return Response(status_code=304, headers=headers)
+        return Response(content=seg.data, media_type=seg.content_type, headers=headers)
+    # Disk store (or camera not streaming)
+    path = hls_disk_path(cam_id, name)
+    if path is None or not os.path.isfile(path):
+        return Response(status_code=404)
+    return FileResponse(path, media_type=content_type(name), headers={"Cache-Control": cache})
+
+@app.put("/hls/{cam_id}/{name}")
+async def hls_upload(cam_id: str, name: str, request: Request):
+    """ffmpeg -method PUT target for the memory store. Local only."""
+    if not is_local(request):
+        return Response(status_code=403)
+    data = await request.body()
+    SegmentStore().put(cam_id, name, data)
+    playlist = llhls.get_playlist(cam_id)
+    if playlist is not None:
+        playlist.on_upload(name, data)
+    return Response(status_code=201)
+
+@app.delete("/hls/{cam_id}/{name}")
+def hls_delete(cam_id: str, name: str, request: Request):
+    if not is_local(request):
+        return Response(status_code=403)
+    SegmentStore().delete(cam_id, name)
+    return Response(status_code=204)
+
 @app.post("/api/admin/sanitize-config")
 def admin_sanitize_config():
     """Force clean config.json (remove invalid IDs)."""
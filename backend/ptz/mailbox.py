@@ -0,0 +1,136 @@
+"""
+Latest-wins PTZ command slot per camera.
+
+Joystick moves arrive faster than a camera takes them. Instead of dropping
+moves (the final velocity could be lost), each camera has one pending
+command and a worker that sends it: a new move replaces the pending one,
+a stop replaces anything pending and skips the rate limit wait, and
+whatever was requested last is always sent. Callers whose command was
+replaced get the result of the command that replaced it.
+"""
+import time
+import asyncio
+from typing import Dict, List, NamedTuple, Optional
+
+DEFAULT_RATE = 10.0  # Commands per second when settings.ptz_rate_limits has no entry
+
+
+class Command(NamedTuple):
+    action: str  # "move" | "stop"
+    pan: float = 0.0
+    tilt: float = 0.0
+    zoom: float = 0.0
+    speed: float = 0.0
+
+
+def rate_limit(limits: Dict[str, float], manufacturer: Optional[str], model: Optional[str]) -> float:
+    """Commands/s for a camera from settings.ptz_rate_limits: model, then manufacturer, then "default"."""
+    for key in (model, manufacturer, "default"):
+        if key and key in limits:
+            return float(limits[key])
+    return DEFAULT_RATE
+
+
+class PTZMailbox:
+    def __init__(self, cam_id: str, provider, limits: Optional[Dict[str, float]] = None):
+        self.cam_id = cam_id
+        self.provider = provider
+        self.limits = limits or {}
+        self.pending: Optional[Command] = None
+        self.waiters: List[asyncio.Future] = []  # Callers of the pending command and of those it replaced
+        self.sending: List[asyncio.Future] = []  # Callers of the command being sent
+        self.last_sent = 0.0
+        self.loop = None
+        self.task = None
+        self.wakeup = None
+        self.preempt = None  # Set by stop: cut a rate limit wait short
+        self.stats = {"commands": 0, "sent": 0, "coalesced": 0, "failed": 0, "last_send_ms": None}
+
+    def min_interval(self) -> float:
+        # Looked up each time: the model is known only once the provider has connected
+        rate = rate_limit(self.limits, getattr(self.provider, "manufacturer", None),
+                          getattr(self.provider, "model", None))
+        return 1.0 / rate if rate > 0 else 0.0
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self.task is None or self.task.done() or self.loop is not loop:
+            self.loop = loop
+            self.wakeup = asyncio.Event()
+            self.preempt = asyncio.Event()
+            self.task = loop.create_task(self._run())
+
+    async def submit(self, cmd: Command) -> bool:
+        """Queue cmd (replacing any pending command) and wait until it, or its replacement, was sent."""
+        self._ensure_worker()
+        self.stats["commands"] += 1
+        if self.pending is not None:
+            self.stats["coalesced"] += 1
+        self.pending = cmd
+        fut = self.loop.create_future()
+        self.waiters.append(fut)
+        if cmd.action == "stop":
+            self.preempt.set()
+        self.wakeup.set()
+        return await asyncio.shield(fut)
+
+    async def move(self, pan: float, tilt: float, zoom: float, speed: float) -> bool:
+        return await self.submit(Command("move", pan, tilt, zoom, speed))
+
+    async def stop(self) -> bool:
+        return await self.submit(Command("stop"))
+
+    async def _run(self):
+        try:
+            await self._work()
+        finally:
+            # Cancelled (camera removed): nobody will send these
+            for w in self.waiters + self.sending:
+                if not w.done():
+                    w.set_result(False)
+
+    async def _work(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            if self.pending is None:
+                continue
+            if self.pending.action != "stop":
+                delay = self.last_sent + self.min_interval() - time.monotonic()
+                if delay > 0:
+                    # Newer moves replace the pending one meanwhile
+                    try:
+                        await asyncio.wait_for(self.preempt.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+            cmd, self.sending = self.pending, self.waiters
+            self.pending, self.waiters = None, []
+            self.preempt.clear()
+            self.last_sent = time.monotonic()
+            try:
+                if cmd.action == "stop":
+                    ok = await self.provider.stop_async()
+                else:
+                    ok = await self.provider.move_async(cmd.pan, cmd.tilt, cmd.zoom, cmd.speed)
+            except Exception as e:
+                print(f"PTZ command error {self.cam_id}: {e}")
+                ok = False
+            self.stats["sent"] += 1
+            self.stats["last_send_ms"] = round((time.monotonic() - self.last_sent) * 1000, 1)
+            if not ok:
+                self.stats["failed"] += 1
+            for w in self.sending:
+                if not w.done():
+                    w.set_result(ok)
+            self.sending = []
+
+    def close(self):
+        """Stop the worker (camera removed); callable from any thread."""
+        task, loop = self.task, self.loop
+        self.task = None
+        if task is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(task.cancel)
+
+    def get_stats(self) -> dict:
+        interval = self.min_interval()
+        return dict(self.stats, rate_limit=round(1.0 / interval, 1) if interval else None)
@@ -1,29 +1,43 @@
 import time
+import asyncio
+import httpx
 from datetime import datetime, timedelta
 from typing import List, Dict, Any
 from .provider import PTZProvider
+from . import soap
 from onvif import ONVIFCamera
+from zeep.cache import SqliteCache
+from zeep.transports import Transport
+
+PTZ_TIMEOUT = 2.0          # Seconds per request; a move that takes longer is stale anyway
+PTZ_CONNECT_TIMEOUT = 1.0
 
 class OnvifProvider(PTZProvider):
-    def __init__(self, ip, port, username, password):
+    def __init__(self, ip, port, username, password, timeout=PTZ_TIMEOUT, connect_timeout=PTZ_CONNECT_TIMEOUT):
         self.ip = ip
         self.port = port
         self.username = username
         self.password = password
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.client = None  # httpx.AsyncClient for move/stop: one keep-alive connection per camera
+        self.client_loop = None
         self.camera = None
         self.ptz = None
         self.media = None
         self.profile_token = None
+        self.envelopes = None
+        self.fast_path = True  # Prebuilt envelopes for move/stop; off if the camera rejects them
         self.capabilities = {
             "continuous_move": True, 
             "absolute_move": False,
             "relative_move": True,
             "presets": True
         }
-        
-        # Debounce / Cache
-        self.last_move = 0
-        self.move_debounce_interval = 0.1 # 100ms
+        self.manufacturer = None
+        self.model = None  # From GetDeviceInformation; picks the PTZ rate limit
+
+        # Cache
         self.presets_cache = []
         self.presets_cache_ts = 0
         self.presets_ttl = 30 # seconds
@@ -35,7 +49,8 @@ class OnvifProvider(PTZProvider):
         try:
             # ... (existing connect logic)
             self.camera = ONVIFCamera(
-                self.ip, self.port, self.username, self.password
+                self.ip, self.port, self.username, self.password,
+                transport=Transport(cache=SqliteCache(), operation_timeout=(self.connect_timeout, self.timeout))
             )
             # Create services
             self.media = self.camera.create_media_service()
@@ -48,6 +63,13 @@ class OnvifProvider(PTZProvider):
                 return False
             
             self.profile_token = profiles[0].token
+            self.envelopes = soap.PTZEnvelopes(self.profile_token)
+
+            try:
+                info = self.camera.devicemgmt.GetDeviceInformation()
+                self.manufacturer, self.model = info.Manufacturer, info.Model
+            except Exception as e:
+                print(f"GetDeviceInformation error {self.ip}: {e}")
             return True
         except Exception as e:
             print(f"Error connecting to ONVIF camera {self.ip}: {e}")
@@ -56,53 +78,121 @@ class OnvifProvider(PTZProvider):
     def move(self, pan: float, tilt: float, zoom: float, speed: float) -> bool:
         if not self.ptz or not self.profile_token:
             return False
-            
-        # Debounce
-        now = time.time()
-        if (now - self.last_move) < self.move_debounce_interval:
-            # Skip rapid moves
-            return True 
-        self.last_move = now
 
         try:
-            status = self.ptz.GetStatus({'ProfileToken': self.profile_token})
-            
-            request = self.ptz.create_type('ContinuousMove')
-            request.ProfileToken = self.profile_token
-            
-            if request.Velocity is None:
-                request.Velocity = self.ptz.create_type('PTZSpeed')
-                
-            # PanTilt
-            if pan != 0 or tilt != 0:
-                request.Velocity.PanTilt = self.ptz.create_type('Vector2D')
-                request.Velocity.PanTilt.x = pan * speed
-                request.Velocity.PanTilt.y = tilt * speed
-                request.Velocity.PanTilt.space = 'http://www.onvif.org/ver10/tptz/PanTiltSpaces/VelocityGenericSpace'
-            
-            # Zoom
-            if zoom != 0:
-                request.Velocity.Zoom = self.ptz.create_type('Vector1D')
-                request.Velocity.Zoom.x = zoom * speed
-                request.Velocity.Zoom.space = 'http://www.onvif.org/ver10/tptz/ZoomSpaces/VelocityGenericSpace'
-
-            self.ptz.ContinuousMove(request)
+            self._send("ContinuousMove", self.envelopes.continuous_move(pan * speed, tilt * speed, zoom * speed),
+                       lambda: self.ptz.ContinuousMove(self._move_request(pan * speed, tilt * speed, zoom * speed)))
             return True
         except Exception as e:
             print(f"Move error {self.ip}: {e}")
             return False
 
+    async def move_async(self, pan: float, tilt: float, zoom: float, speed: float) -> bool:
+        if not self.ptz or not self.profile_token:
+            return False
+        try:
+            await self._send_async("ContinuousMove", self.envelopes.continuous_move(pan * speed, tilt * speed, zoom * speed),
+                                   lambda: self.ptz.ContinuousMove(self._move_request(pan * speed, tilt * speed, zoom * speed)))
+            return True
+        except Exception as e:
+            print(f"Move error {self.ip}: {e!r}")
+            return False
+
+    def _move_request(self, pan: float, tilt: float, zoom: float) -> dict:
+        velocity = {}
+        if pan != 0 or tilt != 0:
+            velocity['PanTilt'] = {'x': pan, 'y': tilt, 'space': soap.PAN_TILT_SPACE}
+        if zoom != 0:
+            velocity['Zoom'] = {'x': zoom, 'space': soap.ZOOM_SPACE}
+        return {'ProfileToken': self.profile_token, 'Velocity': velocity}
+
+    def _send(self, action: str, body: str, zeep_call):
+        """
+        Fast path: POST a prebuilt envelope on zeep's keep-alive session, no
+        zeep objects and no extra round trips. If the camera faults, retry
+        through zeep once; if that works, the camera doesn't like our
+        envelope, so stay on zeep from now on.
+        """
+        if not self.fast_path:
+            return zeep_call()
+        try:
+            return self._post(action, body)
+        except soap.SoapFault as e:
+            zeep_call()
+            print(f"ONVIF fast path rejected by {self.ip} ({e}), using zeep")
+            self.fast_path = False
+
+    def _post(self, action: str, body: str):
+        resp = self.ptz.zeep_client.transport.session.post(
+            self.ptz.xaddr, data=self._envelope(body), headers={"Content-Type": soap.content_type(action)},
+            timeout=(self.connect_timeout, self.timeout)
+        )
+        self._check(resp.status_code, resp.text)
+
+    async def _send_async(self, action: str, body: str, zeep_call):
+        """_send() on the camera's async connection; the zeep fallback runs in a thread."""
+        if not self.fast_path:
+            return await asyncio.to_thread(zeep_call)
+        try:
+            return await self._post_async(action, body)
+        except soap.SoapFault as e:
+            await asyncio.to_thread(zeep_call)
+            print(f"ONVIF fast path rejected by {self.ip} ({e}), using zeep")
+            self.fast_path = False
+
+    async def _post_async(self, action: str, body: str):
+        resp = await self._client().post(
+            self.ptz.xaddr, content=self._envelope(body), headers={"Content-Type": soap.content_type(action)}
+        )
+        self._check(resp.status_code, resp.text)
+
+    def _client(self) -> httpx.AsyncClient:
+        # Created on the event loop that uses it. A single connection: requests
+        # queue for it (up to the timeout) instead of opening more to a slow camera.
+        loop = asyncio.get_running_loop()
+        if self.client is None or self.client_loop is not loop:
+            self.client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=1, max_keepalive_connections=1),
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout)
+            )
+            self.client_loop = loop
+        return self.client
+
+    def _envelope(self, body: str) -> bytes:
+        return soap.envelope(soap.security_header(self.username, self.password, self.camera.dt_diff), body)
+
+    def _check(self, status: int, text: str):
+        if status != 200:
+            raise soap.SoapFault(soap.fault_reason(text) or f"HTTP {status}")
+
+    def close(self):
+        client, loop = self.client, self.client_loop
+        self.client = None
+        if client is not None and not loop.is_closed():
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+
     def stop(self) -> bool:
         if not self.ptz or not self.profile_token:
             return False
-        # STOP always bypasses debounce
         try:
-            self.ptz.Stop({'ProfileToken': self.profile_token, 'PanTilt': True, 'Zoom': True})
+            self._send("Stop", self.envelopes.stop(),
+                       lambda: self.ptz.Stop({'ProfileToken': self.profile_token, 'PanTilt': True, 'Zoom': True}))
             return True
         except Exception as e:
             print(f"Stop error {self.ip}: {e}")
             return False
 
+    async def stop_async(self) -> bool:
+        if not self.ptz or not self.profile_token:
+            return False
+        try:
+            await self._send_async("Stop", self.envelopes.stop(),
+                                   lambda: self.ptz.Stop({'ProfileToken': self.profile_token, 'PanTilt': True, 'Zoom': True}))
+            return True
+        except Exception as e:
+            print(f"Stop error {self.ip}: {e!r}")
+            return False
+
     def get_presets(self) -> List[Dict[str, Any]]:
         if not self.ptz or not self.profile_token:
             return []
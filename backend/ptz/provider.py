@@ -1,7 +1,11 @@
+import asyncio
 from abc import ABC, abstractmethod
 from typing import List, Dict, Any
 
 class PTZProvider(ABC):
+    manufacturer = None  # Reported by the camera, if it says
+    model = None
+
     @abstractmethod
     def connect(self) -> bool:
         """Connect to the camera."""
@@ -23,6 +27,18 @@ class PTZProvider(ABC):
         """Stop all movement."""
         pass
 
+    async def move_async(self, pan: float, tilt: float, zoom: float, speed: float) -> bool:
+        """move() without blocking the event loop. Default: run move() in a thread."""
+        return await asyncio.to_thread(self.move, pan, tilt, zoom, speed)
+
+    async def stop_async(self) -> bool:
+        """stop() without blocking the event loop. Default: run stop() in a thread."""
+        return await asyncio.to_thread(self.stop)
+
+    def close(self):
+        """Release connections (camera removed)."""
+        pass
+
     @abstractmethod
     def get_presets(self) -> List[Dict[str, Any]]:
         """Return list of presets."""
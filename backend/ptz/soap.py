@@ -0,0 +1,100 @@
+"""
+Hand-built SOAP envelopes for the ONVIF calls on the joystick path.
+
+zeep builds and serializes request objects for every call, which costs
+milliseconds per move on a small box. ContinuousMove and Stop only ever
+change their velocities, so their bodies are prebuilt once per profile and
+just get numbers filled in. The WS-Security header is made fresh for each
+request (cameras reject a reused nonce).
+"""
+import os
+import re
+import base64
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+SOAP_NS = "http://www.w3.org/2003/05/soap-envelope"
+PTZ_NS = "http://www.onvif.org/ver20/ptz/wsdl"
+SCHEMA_NS = "http://www.onvif.org/ver10/schema"
+PAN_TILT_SPACE = "http://www.onvif.org/ver10/tptz/PanTiltSpaces/VelocityGenericSpace"
+ZOOM_SPACE = "http://www.onvif.org/ver10/tptz/ZoomSpaces/VelocityGenericSpace"
+WSSE_NS = "http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-wssecurity-secext-1.0.xsd"
+WSU_NS = "http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-wssecurity-utility-1.0.xsd"
+PASSWORD_DIGEST = "http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-username-token-profile-1.0#PasswordDigest"
+BASE64_BINARY = "http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-soap-message-security-1.0#Base64Binary"
+
+
+class SoapFault(Exception):
+    """The camera answered with a SOAP fault / HTTP error."""
+
+
+def _xml_escape(s: str) -> str:
+    return s.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+
+
+def security_header(username: str, password: str, dt_diff: Optional[timedelta] = None) -> str:
+    """WS-Security UsernameToken with password digest (what zeep sends for onvif)."""
+    nonce = os.urandom(16)
+    created = datetime.now(timezone.utc).replace(microsecond=0)
+    if dt_diff is not None:
+        created += dt_diff  # Camera clock offset (ONVIFCamera adjust_time)
+    created = created.isoformat()
+    digest = base64.b64encode(hashlib.sha1(nonce + created.encode() + password.encode()).digest()).decode()
+    return (
+        f'<wsse:Security xmlns:wsse="{WSSE_NS}"><wsse:UsernameToken>'
+        f"<wsse:Username>{_xml_escape(username)}</wsse:Username>"
+        f'<wsse:Password Type="{PASSWORD_DIGEST}">{digest}</wsse:Password>'
+        f'<wsse:Nonce EncodingType="{BASE64_BINARY}">{base64.b64encode(nonce).decode()}</wsse:Nonce>'
+        f'<wsu:Created xmlns:wsu="{WSU_NS}">{created}</wsu:Created>'
+        f"</wsse:UsernameToken></wsse:Security>"
+    )
+
+
+def envelope(header: str, body: str) -> bytes:
+    return (
+        f'<?xml version="1.0" encoding="utf-8"?>'
+        f'<s:Envelope xmlns:s="{SOAP_NS}"><s:Header>{header}</s:Header><s:Body>{body}</s:Body></s:Envelope>'
+    ).encode()
+
+
+def content_type(action: str) -> str:
+    return f'application/soap+xml; charset=utf-8; action="{PTZ_NS}/{action}"'
+
+
+def _velocity(v: float) -> str:
+    return f"{max(-1.0, min(1.0, v)):.4f}"  # Generic velocity spaces are -1..1
+
+
+class PTZEnvelopes:
+    """Prebuilt ContinuousMove / Stop bodies for one profile."""
+    def __init__(self, profile_token: str):
+        token = _xml_escape(profile_token)
+        self.move_prefix = (f'<tptz:ContinuousMove xmlns:tptz="{PTZ_NS}" xmlns:tt="{SCHEMA_NS}">'
+                            f"<tptz:ProfileToken>{token}</tptz:ProfileToken><tptz:Velocity>")
+        self.move_suffix = "</tptz:Velocity></tptz:ContinuousMove>"
+        self.stop_body = (f'<tptz:Stop xmlns:tptz="{PTZ_NS}"><tptz:ProfileToken>{token}</tptz:ProfileToken>'
+                          f"<tptz:PanTilt>true</tptz:PanTilt><tptz:Zoom>true</tptz:Zoom></tptz:Stop>")
+
+    def continuous_move(self, pan: float, tilt: float, zoom: float) -> str:
+        # Axes left out keep doing what they do (same as the zeep request)
+        body = self.move_prefix
+        if pan != 0 or tilt != 0:
+            body += f'<tt:PanTilt x="{_velocity(pan)}" y="{_velocity(tilt)}" space="{PAN_TILT_SPACE}"/>'
+        if zoom != 0:
+            body += f'<tt:Zoom x="{_velocity(zoom)}" space="{ZOOM_SPACE}"/>'
+        return body + self.move_suffix
+
+    def stop(self) -> str:
+        return self.stop_body
+
+
+_FAULT_REASON = re.compile(r"<(?:\w+:)?Text[^>]*>([^<]*)</(?:\w+:)?Text>")
+
+
+def fault_reason(response: str) -> Optional[str]:
+    """Reason text of a SOAP fault, or None if the response isn't one."""
+    if "Fault" not in response:
+        return None
+    m = _FAULT_REASON.search(response)
+    return m.group(1).strip() if m else "SOAP fault"
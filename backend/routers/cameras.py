@@ -3,6 +3,8 @@ from pydantic import BaseModel
 from typing import Optional, List
 from ..camera_manager import CameraManager
 from ..video.preview_manager import PreviewManager
+from ..stream.manager import StreamManager
+from ..stream.segments import SegmentStore
 from ..config import CameraConfig, PreviewConfig
 from datetime import datetime
 
@@ -37,6 +39,7 @@ def health_check():
     total = len(cams)
     p_ok = 0
     p_err = 0
+    p_idle = 0
     c_ok = 0
     c_err = 0
     
@@ -45,6 +48,7 @@ def health_check():
         # Preview
         p_status = preview_manager.check_health(cid)
         if p_status == "ok": p_ok += 1
+        elif p_status == "idle": p_idle += 1 # Stopped for lack of viewers, not a fault
         else: p_err += 1
         
         # Control
@@ -53,8 +57,13 @@ def health_check():
         if c_status == "ok": c_ok += 1
         else: c_err += 1
 
+    # ffmpeg children (RTSP previews): crashed/restarting, or not keeping up with real time
+    ffmpeg = StreamManager().get_stats()
+    ff_down = [cid for cid, s in ffmpeg.items() if not s["running"]]
+    ff_lagging = [cid for cid, s in ffmpeg.items() if s["lagging"]]
+
     status = "ok"
-    if p_err > 0 or c_err > 0:
+    if p_err > 0 or c_err > 0 or ff_down or ff_lagging:
         status = "degraded"
         
     return {
@@ -62,8 +71,19 @@ def health_check():
         "camera_count": total,
         "preview_ok": p_ok,
         "preview_error": p_err,
+        "preview_idle": p_idle,
+        "preview_lifecycle": preview_manager.get_lifecycle_stats(),
+        "ffmpeg": {
+            "streams": len(ffmpeg),
+            "restarts": sum(s["restarts"] for s in ffmpeg.values()),
+            "down": ff_down,
+            "lagging": ff_lagging,
+            "per_camera": ffmpeg,
+            "hls_store": SegmentStore().get_stats() if StreamManager().hls_store == "memory" else None
+        },
         "control_ok": c_ok,
         "control_error": c_err,
+        "ptz_coalesced": sum(m.stats["coalesced"] for m in list(camera_manager.mailboxes.values())),
         "ts": datetime.now().isoformat()
     }
 
@@ -81,7 +101,13 @@ def get_cameras():
         p_last_error = p_state.get("last_error")
 
         preview = preview_manager.get_provider(cam_id)
-        stream_url = preview.get_stream_url() if preview else ""
+        # Idle/not-yet-started previews still get a URL; opening it starts the provider
+        stream_url = preview.get_stream_url() if preview else preview_manager.stream_url_for(c)
+        # Frame delivery counters (delivered/skipped per stream)
+        preview_stats = preview.get_stats() if preview and hasattr(preview, "get_stats") else None
+        # PTZ commands sent / coalesced (replaced before sending)
+        mailbox = camera_manager.mailboxes.get(cam_id)
+        ptz_stats = mailbox.get_stats() if mailbox else None
         
         # 2. Control Status & Runtime State
         c_state = camera_manager.get_state(cam_id)
@@ -138,7 +164,12 @@ def get_cameras():
             # Or just provide `preview_last_seen_ts`.
             "preview_last_seen_ts": p_last_seen,
             
-            "preview_type": p_cfg.get("type", "rtsp")
+            "preview_type": p_cfg.get("type", "rtsp"),
+            "preview_consumers": p_state.get("consumers", 0),
+            "preview_starts": p_state.get("starts", 0),
+            "preview_stops": p_state.get("stops", 0),
+            "preview_stats": preview_stats,
+            "ptz_stats": ptz_stats
         })
         
         result.append(c_safe)
@@ -200,18 +231,20 @@ def update_camera(cam_id: str, config: CameraConfig):
     return {"status": "updated", "id": cam_id}
 
 @router.post("/cameras/{cam_id}/ptz")
-def ptz_control(cam_id: str, req: PTZRequest):
-    provider = camera_manager.get_camera(cam_id)
-    if not provider:
+async def ptz_control(cam_id: str, req: PTZRequest):
+    # Async: a camera that doesn't answer holds no threadpool worker, just this request.
+    # Goes through the camera's mailbox: rate limited, newer commands replace pending ones.
+    mailbox = camera_manager.get_mailbox(cam_id)
+    if not mailbox:
         raise HTTPException(status_code=404, detail="Camera not found or not connected")
 
     success = False
     if req.action == "move":
-        success = provider.move(req.pan, req.tilt, req.zoom, req.speed)
+        success = await mailbox.move(req.pan, req.tilt, req.zoom, req.speed)
     elif req.action == "zoom":
-         success = provider.move(0, 0, req.zoom, req.speed)
+         success = await mailbox.move(0, 0, req.zoom, req.speed)
     elif req.action == "stop":
-        success = provider.stop()
+        success = await mailbox.stop()
     else:
         raise HTTPException(status_code=400, detail="Invalid action")
 
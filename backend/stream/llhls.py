@@ -0,0 +1,280 @@
+"""
+Low-Latency HLS playlists built from ffmpeg's output.
+
+ffmpeg's hls muxer can't write LL-HLS itself, so in LL mode it writes fMP4
+"segments" of about PART_TARGET seconds, cut at any frame (split_by_time),
+into the memory segment store. We use each of those fragments as an LL-HLS
+part and group parts into full segments of at least SEGMENT_TARGET seconds,
+each one starting on a keyframe. Then we serve the playlist ourselves: it
+has EXT-X-PART, a preload hint for the next part, and blocking reload
+(_HLS_msn/_HLS_part), so players wait on the server instead of polling.
+
+All updates and waits run on the server's event loop (the upload route is
+async), so asyncio events are enough.
+"""
+import re
+import math
+import time
+import struct
+import asyncio
+from typing import Dict, List, NamedTuple, Optional
+
+PART_TARGET = 0.2     # Seconds per part (ffmpeg -hls_time in LL mode)
+PROBE_SECONDS = 0.5   # ffmpeg -analyzeduration in LL mode
+SEGMENT_TARGET = 1.0  # Minimum seconds per full segment
+MAX_SEGMENT = 4.0     # Close a segment without a keyframe after this long (long-GOP cameras)
+SEGMENTS_KEPT = 6     # Full segments in the playlist
+PART_SEGMENTS = 3     # Newest segments that also list their parts
+INIT_NAME = "init.mp4"
+SOURCE_PLAYLIST = "parts.m3u8"  # What ffmpeg uploads; players get stream.m3u8
+
+
+def _boxes(buf: bytes, start: int, end: int):
+    while start + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", buf, start)
+        if size < 8 or start + size > end:
+            return
+        yield kind, start + 8, start + size
+        start += size
+
+
+def starts_with_keyframe(data: bytes, track_id: int = 1) -> Optional[bool]:
+    """
+    True if the first sample of track_id in an fMP4 fragment is a sync sample
+    (read from the trun/tfhd sample flags). None if the track isn't there.
+    """
+    for kind, start, end in _boxes(data, 0, len(data)):
+        if kind != b"moof":
+            continue
+        for kind, tstart, tend in _boxes(data, start, end):
+            if kind != b"traf":
+                continue
+            tid, default_flags = None, None
+            for kind, b, bend in _boxes(data, tstart, tend):
+                flags = struct.unpack_from(">I", data, b)[0] & 0xFFFFFF
+                if kind == b"tfhd":
+                    tid = struct.unpack_from(">I", data, b + 4)[0]
+                    p = b + 8 + (8 if flags & 0x1 else 0) + (4 if flags & 0x2 else 0) \
+                        + (4 if flags & 0x8 else 0) + (4 if flags & 0x10 else 0)
+                    if flags & 0x20:
+                        default_flags = struct.unpack_from(">I", data, p)[0]
+                elif kind == b"trun" and tid == track_id:
+                    p = b + 8 + (4 if flags & 0x1 else 0)  # version/flags, sample_count, data_offset
+                    if flags & 0x4:
+                        sample_flags = struct.unpack_from(">I", data, p)[0]  # first_sample_flags
+                    elif flags & 0x400:
+                        p += (4 if flags & 0x100 else 0) + (4 if flags & 0x200 else 0)
+                        sample_flags = struct.unpack_from(">I", data, p)[0]
+                    else:
+                        sample_flags = default_flags
+                    if sample_flags is None:
+                        return None
+                    return not sample_flags & 0x10000  # sample_is_non_sync_sample
+    return None
+
+
+PART_NAME = re.compile(r"(.*?)(\d+)(\.m4s)$")  # ffmpeg numbers its segments: parts1234.m4s
+
+
+def part_number(name: str) -> Optional[int]:
+    m = PART_NAME.match(name)
+    return int(m.group(2)) if m else None
+
+
+class Part(NamedTuple):
+    name: str
+    duration: float
+    independent: bool
+    data: bytes
+
+
+class Segment:
+    def __init__(self, msn: int, discontinuity: bool = False):
+        self.msn = msn
+        self.parts: List[Part] = []
+        self.complete = False
+        self.discontinuity = discontinuity
+        self.data = b""  # Concatenated parts, once complete
+
+    @property
+    def duration(self) -> float:
+        return sum(p.duration for p in self.parts)
+
+    @property
+    def name(self) -> str:
+        return f"seg{self.msn}.m4s"
+
+
+class LLPlaylist:
+    """One camera's LL-HLS state. Fed with ffmpeg's uploads, see update()."""
+    def __init__(self, cam_id: str, part_target: float = PART_TARGET, segment_target: float = SEGMENT_TARGET):
+        self.cam_id = cam_id
+        self.part_target = part_target
+        self.segment_target = segment_target
+        self.max_part = part_target
+        self.segments: List[Segment] = []
+        self.next_msn = int(time.time() * 1000)  # Never reused by a later playlist: URIs stay cacheable
+        self.discontinuity_seq = 0
+        self.pending_discontinuity = False
+        self.last_part: Optional[str] = None
+        self.last_number = -1  # Number in the last part's name: newer parts have higher ones
+        self.changed = asyncio.Event()
+        self.parts_added = 0
+
+    # --- Input (upload route) ---
+
+    def on_upload(self, name: str, data: bytes):
+        if name == INIT_NAME and self.segments:
+            self.pending_discontinuity = True  # ffmpeg restarted
+        elif name == SOURCE_PLAYLIST:
+            self.update(data.decode("utf-8", "replace"))
+
+    def update(self, source_playlist: str):
+        """Take the new parts listed in ffmpeg's playlist (their data is in the segment store)."""
+        from .segments import SegmentStore
+        store = SegmentStore()
+        duration = None
+        added = False
+        for line in source_playlist.splitlines():
+            if line.startswith("#EXTINF:"):
+                duration = float(line[8:].split(",")[0])
+            elif line and not line.startswith("#"):
+                number = part_number(line)
+                if number is not None and number > self.last_number and duration is not None:
+                    seg = store.get(self.cam_id, line)
+                    if seg is not None:
+                        self._add_part(line, duration, seg.data)
+                        added = True
+                duration = None
+        if added:
+            self.changed.set()
+            self.changed = asyncio.Event()
+
+    def _add_part(self, name: str, duration: float, data: bytes):
+        self.last_number = part_number(name)
+        independent = bool(starts_with_keyframe(data))
+        current = self.segments[-1] if self.segments and not self.segments[-1].complete else None
+        if current is not None and (self.pending_discontinuity
+                                    or (independent and current.duration >= self.segment_target)
+                                    or current.duration >= MAX_SEGMENT):
+            self._close(current)
+            current = None
+        if current is None:
+            if not self.segments and not independent:
+                return  # Wait for a keyframe to start the first segment
+            current = Segment(self.next_msn, self.pending_discontinuity)
+            self.next_msn += 1
+            self.pending_discontinuity = False
+            self.segments.append(current)
+        current.parts.append(Part(name, duration, independent, data))
+        self.max_part = max(self.max_part, duration)
+        self.last_part = name
+        self.parts_added += 1
+
+    def _close(self, seg: Segment):
+        seg.complete = True
+        seg.data = b"".join(p.data for p in seg.parts)
+        complete = [s for s in self.segments if s.complete]
+        for old in complete[:max(0, len(complete) - SEGMENTS_KEPT)]:
+            self.segments.remove(old)
+            if old.discontinuity:
+                self.discontinuity_seq += 1
+
+    # --- Output (playlist / media routes) ---
+
+    def ready(self) -> bool:
+        return bool(self.segments)
+
+    def next_part_name(self) -> Optional[str]:
+        """Name ffmpeg will give the next part."""
+        m = PART_NAME.match(self.last_part or "")
+        if m is None:
+            return None
+        return f"{m.group(1)}{int(m.group(2)) + 1}{m.group(3)}"
+
+    def render(self) -> str:
+        target = max([math.ceil(s.duration) for s in self.segments if s.complete] + [1])
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:9",
+            f"#EXT-X-TARGETDURATION:{target}",
+            f"#EXT-X-SERVER-CONTROL:CAN-BLOCK-RELOAD=YES,PART-HOLD-BACK={3 * self.max_part:.3f}",
+            f"#EXT-X-PART-INF:PART-TARGET={self.max_part:.3f}",
+            f"#EXT-X-MEDIA-SEQUENCE:{self.segments[0].msn}",
+        ]
+        if self.discontinuity_seq:
+            lines.append(f"#EXT-X-DISCONTINUITY-SEQUENCE:{self.discontinuity_seq}")
+        lines.append(f'#EXT-X-MAP:URI="{INIT_NAME}"')
+        with_parts = self.segments[-PART_SEGMENTS:]
+        for seg in self.segments:
+            if seg.discontinuity:
+                lines.append("#EXT-X-DISCONTINUITY")
+            if seg in with_parts:
+                for p in seg.parts:
+                    lines.append(f'#EXT-X-PART:DURATION={p.duration:.5f},URI="{p.name}"'
+                                 + (",INDEPENDENT=YES" if p.independent else ""))
+            if seg.complete:
+                lines += [f"#EXTINF:{seg.duration:.5f},", seg.name]
+        hint = self.next_part_name()
+        if hint:
+            lines.append(f'#EXT-X-PRELOAD-HINT:TYPE=PART,URI="{hint}"')
+        return "\n".join(lines) + "\n"
+
+    def has(self, msn: int, part: Optional[int] = None) -> bool:
+        """True once the playlist contains segment msn (complete), or its part index part."""
+        if not self.segments or msn < self.segments[0].msn:
+            return bool(self.segments)
+        for seg in reversed(self.segments):
+            if seg.msn == msn:
+                return seg.complete or (part is not None and len(seg.parts) > part)
+        return False
+
+    def last_msn(self) -> int:
+        return self.segments[-1].msn if self.segments else self.next_msn
+
+    def get_media(self, name: str) -> Optional[bytes]:
+        """A part or a full segment by URI."""
+        for seg in reversed(self.segments):
+            if seg.complete and seg.name == name:
+                return seg.data
+            for p in seg.parts:
+                if p.name == name:
+                    return p.data
+        return None
+
+    async def wait(self, predicate, timeout: float) -> bool:
+        """Wait (on the event loop) until predicate() is true, or timeout."""
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self.changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                return predicate()
+        return True
+
+    def get_stats(self) -> dict:
+        return {
+            "segments": len(self.segments),
+            "parts": self.parts_added,
+            "part_target": round(self.max_part, 3),
+            "last_msn": self.last_msn()
+        }
+
+
+_playlists: Dict[str, LLPlaylist] = {}
+
+
+def open_playlist(cam_id: str, part_target: float = PART_TARGET) -> LLPlaylist:
+    _playlists[cam_id] = LLPlaylist(cam_id, part_target)
+    return _playlists[cam_id]
+
+
+def close_playlist(cam_id: str):
+    _playlists.pop(cam_id, None)
+
+
+def get_playlist(cam_id: str) -> Optional[LLPlaylist]:
+    return _playlists.get(cam_id)
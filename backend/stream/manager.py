@@ -2,7 +2,202 @@ import subprocess
 import os
 import signal
 import time
-from typing import Dict
+import threading
+from typing import Callable, Dict, List, Optional
+from .segments import SegmentStore
+from . import llhls
+
+BACKOFF_MIN = 1.0    # First restart delay after a crash (seconds), doubled per crash...
+BACKOFF_MAX = 30.0   # ...up to this
+STABLE_AFTER = 30.0  # A process that ran this long resets the backoff
+LAG_SPEED = 0.95     # Progress speed below this (after warm-up) = not keeping up with real time
+LAG_WARMUP = 5.0     # Seconds after (re)start before speed is judged
+INGEST_GRACE = 10.0  # Memory store: seconds after start for ffmpeg's first HLS upload to arrive
+
+
+def _parse_number(value: str) -> Optional[float]:
+    # ffmpeg progress values: "25.00", "1534.2kbits/s", "1.01x", "N/A"
+    value = value.strip().rstrip("x")
+    if value.endswith("kbits/s"):
+        value = value[:-7]
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+class SupervisedStream:
+    """
+    One camera's ffmpeg process, watched by a monitor thread.
+
+    The monitor reads ffmpeg's -progress output from stderr (key=value blocks,
+    twice a second) into live stats, and restarts the process with exponential
+    backoff when it exits on its own. on_start(proc) runs for every new process
+    (RTSPProvider attaches its frame reader there); status_callback gets
+    "restarting"/"ok"/"error" like the preview providers' own callbacks.
+    With ingest_url set (memory store), a process that uploads nothing is
+    reported: ffmpeg's failing PUTs are otherwise invisible.
+    """
+    def __init__(self, cam_id: str, cmd: List[str], frames: bool,
+                 on_start: Optional[Callable] = None, status_callback: Optional[Callable] = None,
+                 ingest_url: Optional[str] = None):
+        self.cam_id = cam_id
+        self.ingest_url = ingest_url
+        self.ingest_reported = False
+        self.cmd = cmd
+        self.frames = frames
+        self.on_start = on_start
+        self.status_callback = status_callback
+        self.proc: Optional[subprocess.Popen] = None
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()  # A restart and stop() can't interleave: no orphaned ffmpeg
+        self.thread = None
+        self.restarts = 0
+        self.backoff = BACKOFF_MIN
+        self.started_at = 0.0
+        self.last_exit: Optional[int] = None
+        self.last_error: Optional[str] = None
+        self.lagging = False
+        self.progress: Dict[str, float] = {}
+
+    def start(self) -> subprocess.Popen:
+        self._spawn()
+        self.thread = threading.Thread(target=self._monitor, daemon=True)
+        self.thread.start()
+        return self.proc
+
+    def _spawn(self):
+        self.proc = subprocess.Popen(
+            self.cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE if self.frames else subprocess.DEVNULL,
+            stderr=subprocess.PIPE, # -progress and error lines, read by the monitor
+        )
+        self.started_at = time.monotonic()
+        self.progress = {}
+        self.lagging = False
+        self.ingest_reported = False
+        if self.on_start:
+            self.on_start(self.proc)
+
+    def _monitor(self):
+        while not self.stopped.is_set():
+            self._read_progress(self.proc)
+            code = self.proc.wait()
+            if self.stopped.is_set():
+                break
+            uptime = time.monotonic() - self.started_at
+            if uptime > STABLE_AFTER:
+                self.backoff = BACKOFF_MIN
+            self.last_exit = code
+            msg = f"ffmpeg exited ({code}) after {uptime:.0f}s, restarting in {self.backoff:g}s"
+            if self.last_error:
+                msg += f": {self.last_error}"
+            self._log("ERROR", msg, "preview.ffmpeg_exit")
+            if self.status_callback:
+                self.status_callback(status="restarting", error=msg)
+            if self.stopped.wait(self.backoff):
+                break
+            self.backoff = min(self.backoff * 2, BACKOFF_MAX)
+            error = None
+            with self.lock:
+                if self.stopped.is_set():  # stop() ran after the backoff wait
+                    break
+                try:
+                    self._spawn()
+                    self.restarts += 1
+                except Exception as e:
+                    error = self.last_error = str(e)
+            if error is not None:
+                if self.status_callback:
+                    self.status_callback(status="error", error=f"ffmpeg restart failed: {error}")
+                return
+
+    def _read_progress(self, proc: subprocess.Popen):
+        block = {}
+        reported_ok = False
+        for line in iter(proc.stderr.readline, b""):
+            key, sep, value = line.decode("utf-8", "replace").strip().partition("=")
+            if not sep:
+                if key:
+                    self.last_error = key[-300:]  # -loglevel error: only real problems get here
+                continue
+            if key != "progress":
+                block[key] = value
+                continue
+            # "progress=continue|end" closes a block
+            self._update_progress(block)
+            block = {}
+            if not reported_ok and self.restarts and self.status_callback:
+                self.status_callback(status="ok") # Back after a restart
+                reported_ok = True
+
+    def _update_progress(self, block: Dict[str, str]):
+        stats = {}
+        for key in ("frame", "fps", "bitrate", "speed", "drop_frames", "dup_frames"):
+            if key in block:
+                stats[key] = _parse_number(block[key])
+        self.progress = stats
+
+        self._check_ingest()
+        speed = stats.get("speed")
+        if speed is None or time.monotonic() - self.started_at < LAG_WARMUP:
+            return
+        lagging = speed < LAG_SPEED
+        if lagging != self.lagging:
+            self.lagging = lagging
+            if lagging:
+                self._log("WARN", f"ffmpeg falling behind real time (speed {speed:.2f}x)", "preview.ffmpeg_lag")
+            else:
+                self._log("INFO", f"ffmpeg back to real time (speed {speed:.2f}x)", "preview.ffmpeg_lag")
+
+    def _check_ingest(self):
+        if not self.ingest_url or self.ingest_reported or time.monotonic() - self.started_at < INGEST_GRACE:
+            return
+        self.ingest_reported = True
+        if SegmentStore().has_files(self.cam_id):
+            return
+        msg = (f"No HLS uploads from ffmpeg after {INGEST_GRACE:g}s: is {self.ingest_url} this server? "
+               f"Set settings.hls_ingest_url to its host and port, or hls_store \"disk\"")
+        if self.last_error:
+            msg += f" (ffmpeg: {self.last_error})"
+        self._log("ERROR", msg, "preview.hls_ingest")
+        if self.status_callback:
+            self.status_callback(status="error", error=msg)
+
+    def _log(self, level: str, msg: str, event_type: str):
+        from ..logger import logger
+        logger.log(level, msg, self.cam_id, event_type)
+
+    def is_alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def stop(self):
+        self.stopped.set()
+        with self.lock:
+            proc = self.proc
+        if proc is not None and proc.poll() is None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2.0)
+
+    def get_stats(self) -> dict:
+        return {
+            "running": self.is_alive(),
+            "pid": self.proc.pid if self.proc else None,
+            "uptime": round(time.monotonic() - self.started_at, 1) if self.is_alive() else 0.0,
+            "restarts": self.restarts,
+            "next_backoff": self.backoff,
+            "last_exit": self.last_exit,
+            "last_error": self.last_error,
+            "lagging": self.lagging,
+            **self.progress
+        }
+
 
 class StreamManager:
     _instance = None
@@ -10,65 +205,159 @@ class StreamManager:
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(StreamManager, cls).__new__(cls)
-            cls._instance.processes: Dict[str, subprocess.Popen] = {}
+            cls._instance.streams: Dict[str, SupervisedStream] = {}
+            cls._instance.hls_dir = os.path.join(os.getcwd(), "hls")
+            cls._instance.hls_store = "disk"
+            cls._instance.ingest_url = "http://127.0.0.1:8000"
         return cls._instance
 
-    def start_stream(self, cam_id: str, rtsp_url: str):
-        if cam_id in self.processes:
-            # Check if running
-            if self.processes[cam_id].poll() is None:
-                return  # Already running
-            else:
-                # Zombie/Crashed, cleanup
-                del self.processes[cam_id]
-
-        hls_dir = os.path.join(os.getcwd(), "hls", cam_id)
-        os.makedirs(hls_dir, exist_ok=True)
-        playlist_path = os.path.join(hls_dir, "stream.m3u8")
-
-        # FFmpeg command for Low Latency HLS
-        # -fflags nobuffer: reduce latency
-        # -hls_time 1: 1 second segments
-        # -hls_list_size 3: keep only 3 segments in playlist
-        # -hls_flags delete_segments: clean up old segments
+    def configure(self, hls_dir: Optional[str] = None, hls_store: Optional[str] = None,
+                  ingest_url: Optional[str] = None):
+        """
+        hls_store "memory": ffmpeg PUTs HLS files to this server (ingest_url) and
+        they are served from SegmentStore; "disk": files in hls_dir/<cam_id>.
+        """
+        if hls_dir:
+            self.hls_dir = hls_dir
+        if hls_store in ("memory", "disk"):
+            self.hls_store = hls_store
+        if ingest_url:
+            self.ingest_url = ingest_url.rstrip("/")
+
+    def build_command(self, rtsp_url: str, playlist_path: Optional[str], frame_width: int = 0,
+                      frame_fps: float = 0.0, ll_hls: bool = False) -> List[str]:
+        """
+        ffmpeg arguments for one camera. playlist_path=None skips the HLS output
+        (MJPEG-only preview); frame_width adds the raw frame output on stdout.
+        ll_hls: ~200 ms fMP4 fragments for the LL-HLS playlist (stream/llhls.py).
+        """
         cmd = [
             "ffmpeg",
             "-y",
+            "-loglevel", "error",
+            "-nostats", "-progress", "pipe:2", # key=value progress blocks on stderr for the supervisor
             "-fflags", "nobuffer",
-            "-rtsp_transport", "tcp", # More reliable than udp usually
-            "-i", rtsp_url,
-            "-c:v", "copy", # Copy video stream if possible (fastest) - failing that, re-encode might be needed for browser support if not H264
-            # If codec is not h264, browsers won't play it. For MVP assume H264. 
-            # If we need re-encode: "-c:v", "libx264", "-preset", "ultrafast", "-tune", "zerolatency"
-            "-c:a", "aac", # Audio
-            "-f", "hls",
-            "-hls_time", "1",
-            "-hls_list_size", "3",
-            "-hls_flags", "delete_segments+split_by_time",
-            "-hls_allow_cache", "0",
-            playlist_path
         ]
+        if frame_width:
+            # Decoded frames feed the live preview: no decoder reordering delay,
+            # slice threads instead of frame threads (which add a frame of latency each)
+            cmd += ["-flags", "low_delay", "-thread_type", "slice"]
+        if ll_hls:
+            # Stream probing time (default 5 s) stays in the pipeline as extra latency
+            cmd += ["-analyzeduration", str(int(llhls.PROBE_SECONDS * 1e6))]
+        if rtsp_url.startswith("rtsp"):
+            cmd += ["-rtsp_transport", "tcp"] # More reliable than udp usually
+        cmd += ["-i", rtsp_url]
+        if playlist_path:
+            # FFmpeg command for Low Latency HLS
+            # -hls_time 1: 1 second segments
+            # -hls_list_size 3: keep only 3 segments in playlist
+            # -hls_flags delete_segments: clean up old segments
+            # -hls_start_number_source epoch_us: segment names never repeat across restarts (cacheable)
+            if playlist_path.startswith("http"):
+                # Memory store: files go to our own /hls routes (PUT, DELETE for expired segments)
+                cmd_out = ["-method", "PUT", "-http_persistent", "1"]
+            else:
+                cmd_out = []
+            if ll_hls:
+                # Parts, cut at any frame; llhls groups them into keyframe-aligned segments
+                hls_args = [
+                    "-hls_segment_type", "fmp4",
+                    "-hls_fmp4_init_filename", llhls.INIT_NAME,
+                    "-hls_time", f"{llhls.PART_TARGET:g}",
+                    "-hls_list_size", "10",
+                ]
+            else:
+                hls_args = [
+                    "-hls_time", "1",
+                    "-hls_list_size", "3",
+                    "-hls_allow_cache", "0",
+                ]
+            cmd += [
+                "-map", "0:v:0", "-map", "0:a?",
+                "-c:v", "copy", # Copy video stream if possible (fastest) - failing that, re-encode might be needed for browser support if not H264
+                # If codec is not h264, browsers won't play it. For MVP assume H264. 
+                # If we need re-encode: "-c:v", "libx264", "-preset", "ultrafast", "-tune", "zerolatency"
+                "-c:a", "aac", # Audio
+                "-f", "hls",
+                *hls_args,
+                "-hls_flags", "delete_segments+split_by_time",
+                "-hls_start_number_source", "epoch_us",
+                *cmd_out,
+                playlist_path
+            ]
+        if frame_width:
+            # Second output from the same RTSP session: decoded, downscaled I420 frames
+            # on stdout (YUV4MPEG: a text header with the size, then "FRAME\n" + planes)
+            vf = f"scale={frame_width}:-2"
+            if frame_fps:
+                vf += f",fps={frame_fps:g}"
+            cmd += [
+                "-map", "0:v:0",
+                "-vf", vf,
+                "-pix_fmt", "yuv420p",
+                "-f", "yuv4mpegpipe",
+                "pipe:1"
+            ]
+        return cmd
+
+    def start_stream(self, cam_id: str, rtsp_url: str, frame_width: int = 0, frame_fps: float = 0.0,
+                     hls: bool = True, on_start: Optional[Callable] = None,
+                     status_callback: Optional[Callable] = None,
+                     hls_mode: str = "standard") -> Optional[subprocess.Popen]:
+        """
+        Start ffmpeg for a camera: HLS to hls/<cam_id> or the memory segment store
+        (unless hls=False; hls_mode "ll" for Low-Latency HLS), plus raw frames on
+        the process's stdout if frame_width is set. The process is supervised:
+        restarted with backoff if it dies, on_start(proc) called for each new
+        process. Returns the first process.
+        """
+        stream = self.streams.get(cam_id)
+        if stream is not None:
+            if not stream.stopped.is_set():
+                return stream.proc  # Already running (or restarting)
+            del self.streams[cam_id]
+
+        playlist_path = None
+        ll_hls = hls and hls_mode == "ll"
+        if ll_hls and self.hls_store != "memory":
+            print(f"LL-HLS for {cam_id} needs hls_store \"memory\", using standard HLS")
+            ll_hls = False
+        if hls and self.hls_store == "memory":
+            SegmentStore().clear(cam_id)
+            if ll_hls:
+                llhls.open_playlist(cam_id)
+                playlist_path = f"{self.ingest_url}/hls/{cam_id}/{llhls.SOURCE_PLAYLIST}"
+            else:
+                playlist_path = f"{self.ingest_url}/hls/{cam_id}/stream.m3u8"
+        elif hls:
+            hls_dir = os.path.join(self.hls_dir, cam_id)
+            os.makedirs(hls_dir, exist_ok=True)
+            playlist_path = os.path.join(hls_dir, "stream.m3u8")
+        cmd = self.build_command(rtsp_url, playlist_path, frame_width, frame_fps, ll_hls)
         
         # Start process
         print(f"Starting stream for {cam_id}: {' '.join(cmd)}")
-        proc = subprocess.Popen(
-            cmd,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL # Log to file if needed for debugging
-        )
-        self.processes[cam_id] = proc
+        stream = SupervisedStream(cam_id, cmd, bool(frame_width), on_start, status_callback,
+                                  ingest_url=self.ingest_url if hls and self.hls_store == "memory" else None)
+        proc = stream.start()
+        self.streams[cam_id] = stream
+        return proc
 
     def stop_stream(self, cam_id: str):
-        if cam_id in self.processes:
-            proc = self.processes[cam_id]
-            if proc.poll() is None:
-                proc.terminate()
-                try:
-                    proc.wait(timeout=2)
-                except subprocess.TimeoutExpired:
-                    proc.kill()
-            del self.processes[cam_id]
+        stream = self.streams.pop(cam_id, None)
+        if stream is not None:
+            stream.stop()
+            SegmentStore().clear(cam_id)
+            llhls.close_playlist(cam_id)
 
     def stop_all(self):
-        for cam_id in list(self.processes.keys()):
+        for cam_id in list(self.streams.keys()):
             self.stop_stream(cam_id)
+
+    def get_stats(self, cam_id: Optional[str] = None):
+        """Supervisor + progress stats for one camera (None if not streaming), or all of them."""
+        if cam_id is not None:
+            stream = self.streams.get(cam_id)
+            return stream.get_stats() if stream else None
+        return {cid: stream.get_stats() for cid, stream in list(self.streams.items())}
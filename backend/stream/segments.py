@@ -0,0 +1,89 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
+
+CONTENT_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+    ".m4s": "video/iso.segment",
+    ".mp4": "video/mp4",
+}
+MAX_SEGMENTS = 12  # Per camera; ffmpeg DELETEs old segments itself, this only bounds a missed DELETE
+KEEP = (".m3u8", ".mp4")  # Playlists and fMP4 init segments (EXT-X-MAP) are never evicted: players joining later need them
+
+
+def content_type(name: str) -> str:
+    for ext, ctype in CONTENT_TYPES.items():
+        if name.endswith(ext):
+            return ctype
+    return "application/octet-stream"
+
+
+class Segment(NamedTuple):
+    data: bytes
+    ts: float       # time.time() of the upload
+    etag: str
+    content_type: str
+
+
+class SegmentStore:
+    """
+    HLS playlists and segments in memory instead of on disk.
+
+    ffmpeg uploads them with HTTP PUT (and DELETEs expired segments) to the
+    /hls routes, which serve them from here. Saves a file write, delete,
+    stat and read per segment on flash-storage boxes.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(SegmentStore, cls).__new__(cls)
+            cls._instance.lock = threading.Lock()
+            cls._instance.cameras: Dict[str, "OrderedDict[str, Segment]"] = {}
+            cls._instance.puts = 0
+            cls._instance.deletes = 0
+        return cls._instance
+
+    def put(self, cam_id: str, name: str, data: bytes):
+        seg = Segment(data, time.time(), '"' + hashlib.md5(data).hexdigest() + '"', content_type(name))
+        with self.lock:
+            files = self.cameras.setdefault(cam_id, OrderedDict())
+            files.pop(name, None)
+            files[name] = seg
+            segments = [n for n in files if not n.endswith(KEEP)]
+            for old in segments[:max(0, len(segments) - MAX_SEGMENTS)]:
+                del files[old]
+            self.puts += 1
+
+    def get(self, cam_id: str, name: str) -> Optional[Segment]:
+        with self.lock:
+            return self.cameras.get(cam_id, {}).get(name)
+
+    def has_files(self, cam_id: str) -> bool:
+        with self.lock:
+            return bool(self.cameras.get(cam_id))
+
+    def delete(self, cam_id: str, name: str) -> bool:
+        with self.lock:
+            files = self.cameras.get(cam_id)
+            if files is None or files.pop(name, None) is None:
+                return False
+            self.deletes += 1
+            return True
+
+    def clear(self, cam_id: str):
+        with self.lock:
+            self.cameras.pop(cam_id, None)
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "cameras": len(self.cameras),
+                "files": sum(len(f) for f in self.cameras.values()),
+                "bytes": sum(len(s.data) for f in self.cameras.values() for s in f.values()),
+                "puts": self.puts,
+                "deletes": self.deletes
+            }
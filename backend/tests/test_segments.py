@@ -0,0 +1,18 @@
+from backend.stream import llhls
+from backend.stream.segments import MAX_SEGMENTS, SegmentStore
+
+
+def test_init_segment_survives_eviction():
+    store = SegmentStore()
+    store.clear("cam")
+    store.put("cam", llhls.INIT_NAME, b"init")
+    store.put("cam", "stream.m3u8", b"#EXTM3U")
+    for i in range(MAX_SEGMENTS * 3):  # LL mode: ~5 parts a second
+        store.put("cam", f"parts{i}.m4s", b"part")
+    try:
+        assert store.get("cam", llhls.INIT_NAME).data == b"init"
+        assert store.get("cam", "stream.m3u8") is not None
+        assert store.get("cam", "parts0.m4s") is None
+        assert store.get("cam", f"parts{MAX_SEGMENTS * 3 - 1}.m4s") is not None
+    finally:
+        store.clear("cam")
@@ -0,0 +1,398 @@
+import math
+import time
+import asyncio
+import threading
+import logging
+from typing import AsyncGenerator, Dict, Generator, NamedTuple, Optional
+from .frames import Frame, FrameChannel, StreamCounter
+from .jpeg import JpegEncoder, get_encoder
+from .encode_pool import get_pool
+
+
+def mjpeg_part(jpeg: bytes) -> bytes:
+    """Wrap JPEG bytes as one part of a multipart/x-mixed-replace stream."""
+    return (b'--frame\r\n'
+            b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+
+
+class Rendition(NamedTuple):
+    """Output size / rate / quality of an MJPEG stream. Shared by all clients asking for it."""
+    width: int = 0      # 0 = source width (never upscaled)
+    fps: float = 0.0    # 0 = every source frame
+    quality: int = 70
+
+    @classmethod
+    def normalize(cls, width: int = 0, fps: float = 0.0, quality: int = 70) -> "Rendition":
+        # Clamp so near-identical requests share one encoder
+        width = max(0, min(int(width or 0), 7680))
+        if width:
+            width = max(64, width - width % 2)
+        fps = max(0.0, min(float(fps or 0), 60.0))
+        quality = max(10, min(int(quality or 70), 95))
+        return cls(width, round(fps, 1), quality)
+
+    def label(self) -> str:
+        size = f"{self.width}w" if self.width else "native"
+        rate = f"{self.fps:g}fps" if self.fps else "src"
+        return f"{size}@{rate}/q{self.quality}"
+
+
+class Snapshot(NamedTuple):
+    seq: int
+    ts: float  # Capture time of the frame
+    jpeg: bytes
+    rendition: "Rendition"
+
+
+def raw_layouts(encoder: JpegEncoder):
+    """Raw frame layouts to take unconverted: the encoder's own, or UYVY for pool workers to convert."""
+    return ("uyvy",) if get_pool() is not None else encoder.raw_layouts
+
+
+def encode_jpeg(frame: Frame, rendition: "Rendition", encoder: Optional[JpegEncoder] = None) -> Optional[bytes]:
+    """JPEG for a (held) frame: in a worker process if the encode pool is on, else right here."""
+    pool = get_pool()
+    if pool is not None:
+        jpeg = pool.encode(frame, rendition.width, rendition.quality)
+        if jpeg is not None:
+            return jpeg
+    encoder = encoder or get_encoder()
+    return encoder.encode_frame(frame.data, rendition.width, rendition.quality, frame.layout)
+
+
+class MJPEGBroadcaster:
+    """
+    Encode-once, fan-out MJPEG for a single camera.
+
+    One encoder thread turns each new frame into JPEG bytes (tagged with the
+    source frame's sequence number) and every subscribed viewer gets those
+    same bytes. The encoder only runs while at least one viewer is subscribed.
+    """
+    def __init__(self, id: str, source: FrameChannel, rendition: Rendition = Rendition()):
+        self.id = id
+        self.source = source
+        self.rendition = rendition
+
+        self.cond = threading.Condition()
+        self.seq = 0
+        self.ts = 0.0
+        self.jpeg: Optional[bytes] = None
+        self.part: Optional[bytes] = None  # jpeg wrapped as a multipart chunk, built once
+        self.subscribers = 0
+        self.closed = False
+        self.thread = None
+        self.frames_encoded = 0
+        self.encoder_counter = StreamCounter()
+        self.viewer_counters = set()
+        self.viewer_totals = StreamCounter()
+        self.async_waiters = set()  # (loop, asyncio.Event) per async viewer
+
+    def _ensure_encoder(self):
+        # Caller holds self.cond
+        if self.thread is None and not self.closed:
+            self.thread = threading.Thread(target=self._encode_loop, daemon=True)
+            self.thread.start()
+
+    def _encode_loop(self):
+        encoder = get_encoder()
+        last_seq = self.seq
+        interval = 1.0 / self.rendition.fps if self.rendition.fps else 0.0
+        next_t = 0.0
+        while True:
+            with self.cond:
+                if self.subscribers == 0 or self.closed:
+                    self.thread = None
+                    return
+
+            if interval:
+                # Rate limit: frames arriving before the next slot are skipped
+                delay = next_t - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+            # Block until the capture loop publishes a newer frame.
+            # hold keeps the pooled buffer from being reused while we encode.
+            # Raw frames the encoder (or a pool worker) can take directly are not converted here.
+            frame = self.source.wait(last_seq, timeout=1.0, hold=True, raw=raw_layouts(encoder))
+            if frame is None:
+                continue
+            if frame.data is None:
+                self.source.release(frame)
+                continue
+            last_seq = frame.seq
+            self.encoder_counter.update(frame.seq)
+
+            if interval:
+                # Keep a steady slot grid; restart it if we fell behind
+                now = time.monotonic()
+                next_t = next_t + interval if next_t + interval > now else now + interval
+
+            try:
+                jpeg = encode_jpeg(frame, self.rendition, encoder)
+                if jpeg:
+                    part = mjpeg_part(jpeg)
+                    with self.cond:
+                        self.seq = frame.seq
+                        self.ts = frame.ts
+                        self.jpeg = jpeg
+                        self.part = part
+                        self.frames_encoded += 1
+                        self.cond.notify_all()
+                        self._wake_async()
+            except Exception as e:
+                logging.error(f"MJPEG encode error ({self.id}): {e}")
+            finally:
+                self.source.release(frame)
+
+    def _wake_async(self):
+        # Caller holds self.cond
+        for loop, event in self.async_waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # Loop already closed
+
+    def _add_viewer(self, counter: StreamCounter) -> int:
+        """Register a viewer and return the seq it should start after."""
+        with self.cond:
+            self.subscribers += 1
+            self.viewer_counters.add(counter)
+            # Send the current JPEG right away unless the encoder was idle (stale)
+            last_seq = self.seq if self.thread is None else 0
+            self._ensure_encoder()
+            return last_seq
+
+    def _remove_viewer(self, counter: StreamCounter):
+        with self.cond:
+            self.subscribers -= 1
+            self.viewer_counters.discard(counter)
+            self.viewer_totals.delivered += counter.delivered
+            self.viewer_totals.skipped += counter.skipped
+
+    def subscribe(self) -> Generator[bytes, None, None]:
+        """Yields multipart MJPEG chunks; each encoded frame is sent at most once."""
+        counter = StreamCounter()
+        last_seq = self._add_viewer(counter)
+        try:
+            while True:
+                with self.cond:
+                    self.cond.wait_for(lambda: self.seq > last_seq or self.closed, timeout=1.0)
+                    if self.closed:
+                        return
+                    if self.seq <= last_seq:
+                        continue
+                    last_seq = self.seq
+                    part = self.part
+                counter.update(last_seq)
+                yield part
+        finally:
+            self._remove_viewer(counter)
+
+    async def subscribe_async(self, frames: bool = False) -> AsyncGenerator:
+        """
+        Asyncio version of subscribe(): holds no thread while waiting.
+        Only the newest JPEG is ever sent, so a viewer whose socket is slow
+        skips the frames encoded while it was still sending (no buffering).
+        frames=True yields Snapshot (seq, capture ts, jpeg) instead of multipart chunks.
+        """
+        event = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), event)
+        counter = StreamCounter()
+        with self.cond:
+            self.async_waiters.add(waiter)
+        last_seq = self._add_viewer(counter)
+        try:
+            while True:
+                with self.cond:
+                    closed, seq, part = self.closed, self.seq, self.part
+                    if frames:
+                        part = Snapshot(self.seq, self.ts, self.jpeg, self.rendition)
+                if closed:
+                    return
+                if seq <= last_seq:
+                    try:
+                        await asyncio.wait_for(event.wait(), timeout=1.0)
+                    except asyncio.TimeoutError:
+                        pass
+                    event.clear()
+                    continue
+                last_seq = seq
+                counter.update(seq)
+                yield part
+        finally:
+            with self.cond:
+                self.async_waiters.discard(waiter)
+            self._remove_viewer(counter)
+
+    def latest(self) -> Optional[Snapshot]:
+        """Most recent JPEG this broadcaster encoded (None before the first frame)."""
+        with self.cond:
+            if self.jpeg is None:
+                return None
+            return Snapshot(self.seq, self.ts, self.jpeg, self.rendition)
+
+    def close(self):
+        """Stop the encoder and end all viewer streams."""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+            self._wake_async()
+
+    def get_stats(self) -> dict:
+        with self.cond:
+            delivered = self.viewer_totals.delivered + sum(c.delivered for c in self.viewer_counters)
+            skipped = self.viewer_totals.skipped + sum(c.skipped for c in self.viewer_counters)
+            return {
+                "rendition": self.rendition.label(),
+                "viewers": self.subscribers,
+                "frames_encoded": self.frames_encoded,
+                "seq": self.seq,
+                "encoder": self.encoder_counter.as_dict(),
+                "streams": [c.as_dict() for c in self.viewer_counters],
+                "delivered": delivered,
+                "skipped": skipped
+            }
+
+
+class RenditionPool:
+    """
+    One MJPEGBroadcaster per distinct Rendition of a camera.
+    Each rendition is scaled and encoded once for all of its clients and is
+    dropped when its last viewer disconnects.
+    """
+    def __init__(self, id: str, source: FrameChannel):
+        self.id = id
+        self.source = source
+        self.lock = threading.Lock()
+        self.broadcasters: Dict[Rendition, MJPEGBroadcaster] = {}
+        self.refs: Dict[Rendition, int] = {}
+        self.closed = False
+        # Counters of renditions that were already dropped
+        self.retired = {"frames_encoded": 0, "delivered": 0, "skipped": 0}
+        # Stills encoded for snapshot requests when no matching stream was running
+        self.snapshots: Dict[Rendition, Snapshot] = {}
+        self.snapshot_lock = threading.Lock()
+        self.snapshot_encodes = 0
+
+    def acquire(self, rendition: Rendition) -> Optional[MJPEGBroadcaster]:
+        with self.lock:
+            if self.closed:
+                return None
+            b = self.broadcasters.get(rendition)
+            if b is None:
+                b = MJPEGBroadcaster(self.id, self.source, rendition)
+                self.broadcasters[rendition] = b
+                self.refs[rendition] = 0
+            self.refs[rendition] += 1
+            return b
+
+    def release(self, rendition: Rendition):
+        with self.lock:
+            if rendition not in self.refs:
+                return
+            self.refs[rendition] -= 1
+            if self.refs[rendition] > 0:
+                return
+            del self.refs[rendition]
+            b = self.broadcasters.pop(rendition)
+        b.close()
+        self._retire(b)
+
+    def _retire(self, b: MJPEGBroadcaster):
+        stats = b.get_stats()
+        with self.lock:
+            for k in self.retired:
+                self.retired[k] += stats[k]
+
+    def stream(self, rendition: Rendition = Rendition()) -> Generator[bytes, None, None]:
+        b = self.acquire(rendition)
+        if b is None:
+            return
+        try:
+            yield from b.subscribe()
+        finally:
+            self.release(rendition)
+
+    async def stream_async(self, rendition: Rendition = Rendition(), frames: bool = False) -> AsyncGenerator:
+        b = self.acquire(rendition)
+        if b is None:
+            return
+        try:
+            async for chunk in b.subscribe_async(frames):
+                yield chunk
+        finally:
+            self.release(rendition)
+
+    def snapshot(self, width: int = 0, quality: Optional[int] = None, max_age: float = 0.1,
+                 timeout: float = 2.0) -> Optional[Snapshot]:
+        """
+        Latest still JPEG, at most max_age seconds older than the newest captured frame.
+        Reuses what a running stream already encoded (the same width, or any width if
+        none was asked for: newest frame, widest on a tie); otherwise encodes the
+        latest frame once and caches it for other pollers.
+        """
+        rendition = Rendition.normalize(width, 0, quality or 80)
+        with self.lock:
+            candidates = [b.latest() for r, b in self.broadcasters.items()
+                          if (not rendition.width or r.width == rendition.width)
+                          and (quality is None or r.quality == rendition.quality)]
+        candidates.append(self.snapshots.get(rendition))
+        best = max((c for c in candidates if c is not None),
+                   key=lambda c: (c.seq, c.rendition.width or math.inf), default=None)
+
+        with self.source.cond:
+            newest_ts = self.source.ts  # Just the timestamp: latest() could convert the frame for nothing
+        if best is not None and newest_ts - best.ts <= max_age:
+            return best
+
+        # One encode per frame, however many pollers are waiting for it
+        with self.snapshot_lock:
+            cached = self.snapshots.get(rendition)
+            encoder = get_encoder()
+            raw = raw_layouts(encoder)
+            frame = self.source.latest(hold=True, raw=raw)
+            if frame.data is None:
+                self.source.release(frame)
+                # Provider just started: wait briefly for its first frame
+                frame = self.source.wait(0, timeout=timeout, hold=True, raw=raw)
+                if frame is None:
+                    return best
+            try:
+                if cached is not None and cached.seq >= frame.seq:
+                    return cached
+                jpeg = encode_jpeg(frame, rendition, encoder)
+            finally:
+                self.source.release(frame)
+            if not jpeg:
+                return best
+            snap = Snapshot(frame.seq, frame.ts, jpeg, rendition)
+            if len(self.snapshots) >= 16 and rendition not in self.snapshots:
+                self.snapshots.clear() # Many odd sizes requested; don't hoard stills
+            self.snapshots[rendition] = snap
+            self.snapshot_encodes += 1
+            return snap
+
+    def close(self):
+        """End every rendition's streams (provider stopped)."""
+        with self.lock:
+            self.closed = True
+            broadcasters = list(self.broadcasters.values())
+            self.broadcasters.clear()
+            self.refs.clear()
+        for b in broadcasters:
+            b.close()
+            self._retire(b)
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            broadcasters = list(self.broadcasters.values())
+            totals = dict(self.retired)
+        renditions = [b.get_stats() for b in broadcasters]
+        for r in renditions:
+            for k in totals:
+                totals[k] += r[k]
+        totals["viewers"] = sum(r["viewers"] for r in renditions)
+        totals["snapshot_encodes"] = self.snapshot_encodes
+        totals["jpeg_encoder"] = get_encoder().name
+        totals["renditions"] = renditions
+        return totals
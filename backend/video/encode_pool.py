@@ -0,0 +1,191 @@
+import os
+import time
+import logging
+import threading
+import multiprocessing
+import numpy as np
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+from .frames import Frame
+from . import jpeg
+
+# --- Worker process side ---
+
+_attached: "OrderedDict[str, shared_memory.SharedMemory]" = OrderedDict()
+_attached_bytes = 0
+_retired_seen = 0  # Highest retire id this worker has applied
+MAX_ATTACHED_BYTES = 256 << 20  # Frame buffers a worker keeps mapped (~30 1080p BGRX slots)
+RETIRE_KEEP = 30.0  # Seconds a retired block name is passed along to workers
+
+
+def _init_worker(options: dict):
+    jpeg.configure(options)
+
+
+def _detach(name: str):
+    global _attached_bytes
+    shm = _attached.pop(name, None)
+    if shm is not None:
+        _attached_bytes -= shm.size
+        shm.close()
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    global _attached_bytes
+    shm = _attached.get(name)
+    if shm is None:
+        shm = shared_memory.SharedMemory(name=name)
+        _attached[name] = shm
+        _attached_bytes += shm.size
+        while _attached_bytes > MAX_ATTACHED_BYTES and len(_attached) > 1:
+            _detach(next(iter(_attached)))
+    else:
+        _attached.move_to_end(name)
+    return shm
+
+
+def _forget(retired: Tuple[Tuple[int, str], ...]):
+    # Blocks the server has unlinked: unmap them, or this worker would keep their memory alive
+    global _retired_seen
+    for retire_id, name in retired:
+        if retire_id > _retired_seen:
+            _detach(name)
+            _retired_seen = retire_id
+
+
+def _encode_shared(ref, layout: str, width: int, quality: int,
+                   retired: Tuple[Tuple[int, str], ...] = ()) -> Optional[bytes]:
+    _forget(retired)
+    name, offset, shape, strides, dtype = ref
+    try:
+        shm = _attach(name)
+    except FileNotFoundError:
+        return None  # Buffer was freed (provider stopped); caller encodes locally
+    data = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset, strides=strides)
+    return jpeg.get_encoder().encode_frame(data, width, quality, layout)
+
+
+# --- Server side ---
+
+class EncodePool:
+    """
+    JPEG encoding in worker processes, for many cameras on a multi-core box.
+
+    The capture loops already write frames into pooled buffers; with the pool
+    enabled those buffers live in shared memory, so an encode request is just
+    (shm name, offset, shape, strides) and the worker maps the frame itself.
+    Scaling, colour conversion and encoding all run outside the server's GIL.
+    The caller keeps the frame held until the JPEG comes back.
+    """
+    def __init__(self, workers: int, options: Optional[jpeg.JpegOptions] = None):
+        self.workers = workers
+        self.options = options or jpeg.get_encoder().options
+        self.lock = threading.Lock()
+        self.executor = self._create_executor()
+        self.submitted = 0
+        self.fallbacks = 0  # Frames encoded in-process instead (not shared, worker error, ...)
+        self.restarts = 0
+        self.retire_id = 0
+        self.retired = deque(maxlen=256)  # (retire id, shm name, time): sent along with encode requests
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        # spawn: forking a process full of capture/encoder threads is not safe
+        return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_worker, initargs=(self.options._asdict(),))
+
+    def encode(self, frame: Frame, width: int, quality: int, timeout: float = 5.0) -> Optional[bytes]:
+        """JPEG for a held frame, or None if it can't be done out of process."""
+        ref = frame.pool.share_ref(frame.slot, frame.data) if frame.pool is not None else None
+        if ref is None:
+            self.fallbacks += 1
+            return None
+        executor = self.executor
+        try:
+            result = executor.submit(_encode_shared, ref, frame.layout, width, quality,
+                                     self._recent_retired()).result(timeout=timeout)
+            self.submitted += 1
+        except BrokenProcessPool:
+            logging.error("Encode pool: worker died, restarting pool")
+            self._restart(executor)
+            result = None
+        except Exception as e:
+            logging.error(f"Encode pool error: {e}")
+            result = None
+        if result is None:
+            self.fallbacks += 1
+        return result
+
+    def retire(self, name: str):
+        """A shared block was unlinked (BufferPool._retire); workers drop their mapping of it."""
+        with self.lock:
+            self.retire_id += 1
+            self.retired.append((self.retire_id, name, time.monotonic()))
+
+    def _recent_retired(self) -> Tuple[Tuple[int, str], ...]:
+        with self.lock:
+            cutoff = time.monotonic() - RETIRE_KEEP
+            while self.retired and self.retired[0][2] < cutoff:
+                self.retired.popleft()
+            return tuple((retire_id, name) for retire_id, name, _ in self.retired)
+
+    def _restart(self, broken: ProcessPoolExecutor):
+        with self.lock:
+            if self.executor is not broken:
+                return  # Another thread already did it
+            self.executor = self._create_executor()
+            self.restarts += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "retired_blocks": self.retire_id,
+            "submitted": self.submitted,
+            "fallbacks": self.fallbacks,
+            "restarts": self.restarts
+        }
+
+
+_pool: Optional[EncodePool] = None
+
+
+def effective_workers(requested: int) -> int:
+    """
+    Workers worth starting for settings.encode_workers: at most one per CPU
+    beyond the first, which stays with capture and the server. A pool only
+    pays off with spare cores: on one CPU bench/encode_scaling measured
+    0.86-1.04x (x1) and 0.79-0.92x (x2) of in-process encoding, so 0 there.
+    """
+    cpus = os.cpu_count() or 1
+    workers = max(0, min(requested, cpus - 1))
+    if workers < requested:
+        logging.warning(f"JPEG encode pool: {requested} workers requested, {cpus} CPUs, using {workers}"
+                        + (" (encoding in-process)" if not workers else ""))
+    return workers
+
+
+def start_pool(workers: int) -> Optional[EncodePool]:
+    """Start (or resize) the shared encode pool. workers <= 0 disables it."""
+    global _pool
+    stop_pool()
+    if workers > 0:
+        _pool = EncodePool(workers)
+        logging.info(f"JPEG encode pool: {workers} worker processes")
+    return _pool
+
+
+def stop_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+def get_pool() -> Optional[EncodePool]:
+    return _pool
@@ -0,0 +1,288 @@
+"""
+Shared-memory frame bus: lets other processes (tracking sidecars, recorders)
+read a camera's frames without opening the camera themselves.
+
+Server side, FrameBusPublisher copies each new frame of a provider into a
+small ring of slots in a named shared memory block. Sidecars attach with
+FrameBusReader and get the latest frame as a numpy view, with no copy and no
+socket.
+
+Layout (little-endian):
+    header (64 B): magic "ITFB", version, slots, closed, slot_size, writes, reader_ts
+    slots x [slot header (64 B): lock, seq, ts, width, height, channels, layout]
+    slots x [slot_size bytes of pixel data]
+
+Each slot is guarded by a seqlock. The writer makes lock odd, writes the
+slot, then makes it even again. A reader checks that lock was the same even
+value before and after it looked at the slot. The writer always fills the
+slot after the latest one, so a reader's view of the latest frame stays
+intact for (slots - 1) frame intervals. Use FrameBusReader.valid() to check
+after processing.
+
+This module only needs numpy (cv2 for UYVY frames) so sidecars can import
+it without the server's dependencies.
+"""
+import re
+import time
+import struct
+import logging
+import threading
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+from typing import NamedTuple, Optional
+
+MAGIC = b"ITFB"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIQQd")   # magic, version, slots, closed, slot_size, writes, reader_ts
+SLOT = struct.Struct("<QQdIII8s")     # lock, seq, ts, width, height, channels, layout
+HEADER_SIZE = 64
+SLOT_HEADER_SIZE = 64
+READER_TIMEOUT = 5.0  # A reader counts as active this long after its last read
+
+
+def bus_name(cam_id: str) -> str:
+    """Shared memory name for a camera (short: macOS allows 31 characters)."""
+    return "itfb_" + re.sub(r"[^A-Za-z0-9_-]", "_", cam_id)[:24]
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    # Attach without letting this process's resource tracker unlink the block at exit
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class BusFrame(NamedTuple):
+    seq: int        # Provider frame sequence number
+    ts: float       # Capture time (time.time())
+    layout: str     # "bgr", "bgrx" (4 channels, X unused), "uyvy" or "rgba"
+    data: np.ndarray  # Read-only view into shared memory
+    slot: int
+    lock: int
+
+    def bgr(self) -> np.ndarray:
+        """BGR image. Zero-copy for bgr/bgrx, converted for uyvy/rgba."""
+        if self.layout == "bgr":
+            return self.data
+        if self.layout == "bgrx":
+            return self.data[:, :, :3]
+        import cv2
+        if self.layout == "uyvy":
+            return cv2.cvtColor(self.data, cv2.COLOR_YUV2BGR_UYVY)
+        return cv2.cvtColor(self.data, cv2.COLOR_RGBA2BGR)
+
+
+class FrameBusWriter:
+    """Owns the shared memory block of one camera's bus."""
+    def __init__(self, name: str, slots: int = 4):
+        self.name = name
+        self.slots = slots
+        self.shm: Optional[shared_memory.SharedMemory] = None
+        self.slot_size = 0
+        self.writes = 0
+
+    def _create(self, slot_size: int):
+        self.close()
+        size = HEADER_SIZE + self.slots * (SLOT_HEADER_SIZE + slot_size)
+        try:
+            self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        except FileExistsError:
+            # Left over from a crashed server: take it over
+            stale = shared_memory.SharedMemory(name=self.name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        self.slot_size = slot_size
+        # New blocks are zero-filled: every slot lock is 0 (even, nothing written)
+        HEADER.pack_into(self.shm.buf, 0, MAGIC, VERSION, self.slots, 0, slot_size, self.writes, 0.0)
+
+    def write(self, data: np.ndarray, seq: int, ts: float, layout: str):
+        if self.shm is None or data.nbytes > self.slot_size:
+            self._create(data.nbytes)  # First frame or bigger resolution: new block, readers re-attach
+        buf = self.shm.buf
+        slot = self.writes % self.slots
+        hdr = HEADER_SIZE + slot * SLOT_HEADER_SIZE
+        lock = SLOT.unpack_from(buf, hdr)[0]
+        h, w = data.shape[:2]
+        channels = data.shape[2] if data.ndim == 3 else 1
+
+        struct.pack_into("<Q", buf, hdr, lock + 1)  # Odd: slot being written
+        offset = HEADER_SIZE + self.slots * SLOT_HEADER_SIZE + slot * self.slot_size
+        dst = np.ndarray(data.shape, dtype=np.uint8, buffer=buf, offset=offset)
+        np.copyto(dst, data)
+        del dst
+        SLOT.pack_into(buf, hdr, lock + 2, seq, ts, w, h, channels, layout.encode())
+
+        self.writes += 1
+        struct.pack_into("<Q", buf, 24, self.writes)  # HEADER.writes
+
+    def reader_ts(self) -> float:
+        if self.shm is None:
+            return 0.0
+        return HEADER.unpack_from(self.shm.buf, 0)[6]
+
+    def close(self):
+        if self.shm is None:
+            return
+        struct.pack_into("<I", self.shm.buf, 12, 1)  # HEADER.closed: readers re-attach
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+        self.shm = None
+
+
+class FrameBusPublisher:
+    """
+    Copies every new frame of a FrameChannel into the camera's bus.
+    Frames are written as published (raw UYVY, or BGRX), so the server pays one
+    memcpy per frame; readers convert if they need BGR.
+    """
+    def __init__(self, name: str, source, slots: int = 4):
+        self.name = name
+        self.source = source
+        self.writer = FrameBusWriter(name, slots)
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._publish_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+        self.writer.close()
+
+    def _publish_loop(self):
+        from .jpeg import bgrx_base
+        last_seq = 0
+        while self.running:
+            frame = self.source.wait(last_seq, timeout=0.5, hold=True, raw=("uyvy", "rgba"))
+            if frame is None:
+                continue
+            try:
+                if frame.data is None:
+                    continue
+                last_seq = frame.seq
+                data, layout = frame.data, frame.layout
+                if layout == "bgr":
+                    bgrx = bgrx_base(data)
+                    if bgrx is not None:
+                        data, layout = bgrx, "bgrx"  # Packed copy; readers take the 3-channel view
+                self.writer.write(data, frame.seq, frame.ts, layout)
+            except Exception as e:
+                logging.error(f"Frame bus error ({self.name}): {e}")
+            finally:
+                self.source.release(frame)
+
+    def has_readers(self) -> bool:
+        return time.time() - self.writer.reader_ts() < READER_TIMEOUT
+
+    def get_stats(self) -> dict:
+        return {"name": self.name, "frames": self.writer.writes, "readers": self.has_readers()}
+
+
+class FrameBusReader:
+    """
+    Sidecar side. Attaches to a camera's bus by camera id:
+
+        bus = FrameBusReader("cam1")
+        frame = bus.wait(timeout=1.0)
+        img = frame.bgr()
+        ...
+        if not bus.valid(frame):  # Overwritten while we worked on it
+            ...
+
+    Raises FileNotFoundError if the camera is not publishing (preview not running
+    or frame_bus disabled).
+    """
+    def __init__(self, cam_id: str):
+        self.name = bus_name(cam_id)
+        self.shm: Optional[shared_memory.SharedMemory] = None
+        self.stale = []  # Replaced blocks we still have frame views into
+        self._attach()
+
+    def _attach(self):
+        self.close()
+        shm = _attach(self.name)
+        magic, version, slots, closed, slot_size, _, _ = HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            shm.close()
+            raise ValueError(f"{self.name} is not a version {VERSION} frame bus")
+        self.shm, self.slots, self.slot_size = shm, slots, slot_size
+
+    def _check(self):
+        # Writer replaced the block (restart / resolution change): follow it
+        if self.shm is None or HEADER.unpack_from(self.shm.buf, 0)[3]:
+            self._attach()
+
+    def latest(self) -> Optional[BusFrame]:
+        """Newest frame as a zero-copy view, or None if nothing was written yet."""
+        self._check()
+        buf = self.shm.buf
+        struct.pack_into("<d", buf, 32, time.time())  # HEADER.reader_ts: keeps the preview alive
+        for _ in range(100):
+            writes = HEADER.unpack_from(buf, 0)[5]
+            if writes == 0:
+                return None
+            slot = (writes - 1) % self.slots
+            hdr = HEADER_SIZE + slot * SLOT_HEADER_SIZE
+            lock, seq, ts, w, h, channels, layout = SLOT.unpack_from(buf, hdr)
+            if lock & 1:
+                continue  # Being written (writer lapped us), try the new latest
+            offset = HEADER_SIZE + self.slots * SLOT_HEADER_SIZE + slot * self.slot_size
+            shape = (h, w, channels) if channels > 1 else (h, w)
+            data = np.ndarray(shape, dtype=np.uint8, buffer=buf, offset=offset)
+            data.flags.writeable = False
+            if SLOT.unpack_from(buf, hdr)[0] == lock:
+                return BusFrame(seq, ts, layout.rstrip(b"\0").decode(), data, slot, lock)
+        return None
+
+    def wait(self, after_seq: int = 0, timeout: float = 1.0, poll: float = 0.002) -> Optional[BusFrame]:
+        """Block (polling) until a frame newer than after_seq is available. None on timeout."""
+        deadline = time.monotonic() + timeout
+        while True:
+            frame = self.latest()
+            if frame is not None and frame.seq > after_seq:
+                return frame
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(poll)
+
+    def valid(self, frame: BusFrame) -> bool:
+        """True if frame's slot was not overwritten since it was read."""
+        if self.shm is None:
+            return False
+        return SLOT.unpack_from(self.shm.buf, HEADER_SIZE + frame.slot * SLOT_HEADER_SIZE)[0] == frame.lock
+
+    def copy(self, frame: BusFrame) -> Optional[np.ndarray]:
+        """Private copy of frame.data, or None if it was overwritten meanwhile."""
+        data = frame.data.copy()
+        return data if self.valid(frame) else None
+
+    def close(self):
+        if self.shm is not None:
+            try:
+                self.shm.close()
+            except BufferError:
+                self.stale.append(self.shm)  # Caller still holds frame views into it
+            self.shm = None
+        self.stale = [shm for shm in self.stale if not self._try_close(shm)]
+
+    @staticmethod
+    def _try_close(shm) -> bool:
+        try:
+            shm.close()
+            return True
+        except BufferError:
+            return False
@@ -0,0 +1,315 @@
+import time
+import threading
+import numpy as np
+from multiprocessing import shared_memory
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+
+class BufferPool:
+    """
+    Reusable frame buffers. get() never hands out the latest slot or a slot
+    somebody holds, so a held buffer stays stable without a defensive copy.
+
+    With shared=True every buffer lives in its own shared memory block, so a
+    held frame can be handed to another process (see share_ref()) by name
+    instead of being pickled.
+    """
+    def __init__(self, slots: int = 3, max_slots: int = 8, shared: bool = False):
+        self.lock = threading.Lock()
+        self.max_slots = max_slots
+        self.shared = shared
+        self.buffers: List[Optional[np.ndarray]] = [None] * slots
+        self.shms: List[Optional[shared_memory.SharedMemory]] = [None] * slots
+        self.retired: List[shared_memory.SharedMemory] = []  # Unlinked, still mapped by a live array
+        self.holds: List[int] = [0] * slots
+        self.latest = -1
+        self.allocations = 0  # Buffer (re)allocations, should stop growing after the first frames
+
+    def _allocate(self, slot: int, shape: Tuple[int, ...], dtype) -> np.ndarray:
+        # Caller holds self.lock
+        self.allocations += 1
+        if slot == len(self.buffers):
+            self.buffers.append(None)
+            self.shms.append(None)
+            self.holds.append(0)
+        if not self.shared:
+            self.buffers[slot] = np.empty(shape, dtype=dtype)
+            return self.buffers[slot]
+
+        self._retire(slot)
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self.shms[slot] = shm
+        self.buffers[slot] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        return self.buffers[slot]
+
+    def _retire(self, slot: int):
+        # Caller holds self.lock. Unlink now; unmap once no array uses the block any more.
+        shm = self.shms[slot]
+        self.shms[slot] = None
+        self.buffers[slot] = None
+        if shm is not None:
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+            self.retired.append(shm)
+            from .encode_pool import get_pool
+            pool = get_pool()
+            if pool is not None:
+                pool.retire(shm.name)  # Workers map blocks by name; let them unmap this one too
+        still_mapped = []
+        for old in self.retired:
+            try:
+                old.close()
+            except BufferError:
+                still_mapped.append(old)  # A reader still has a view of it
+        self.retired = still_mapped
+
+    def get(self, shape: Tuple[int, ...], dtype=np.uint8) -> Tuple[int, Optional[np.ndarray]]:
+        """Returns (slot, array), or (-1, None) if every slot is held."""
+        with self.lock:
+            n = len(self.buffers)
+            for i in range(1, n + 1):
+                slot = (self.latest + i) % n
+                if slot == self.latest or self.holds[slot]:
+                    continue
+                buf = self.buffers[slot]
+                if buf is None or buf.shape != tuple(shape) or buf.dtype != dtype:
+                    # First use or resolution change
+                    buf = self._allocate(slot, shape, dtype)
+                return slot, buf
+
+            if n < self.max_slots:
+                # Readers are holding everything; grow instead of overwriting a held frame
+                return n, self._allocate(n, shape, dtype)
+            return -1, None
+
+    def set_latest(self, slot: int):
+        with self.lock:
+            self.latest = slot
+
+    def hold(self, slot: int):
+        if slot < 0:
+            return
+        with self.lock:
+            self.holds[slot] += 1
+
+    def release(self, slot: int):
+        if slot < 0:
+            return
+        with self.lock:
+            if self.holds[slot] > 0:
+                self.holds[slot] -= 1
+
+    def share_ref(self, slot: int, data: np.ndarray) -> Optional[Tuple[str, int, Tuple[int, ...], Tuple[int, ...], str]]:
+        """
+        (shm name, byte offset, shape, strides, dtype) locating data, a view of a
+        held shared slot, for another process. None if the slot is not shared.
+        """
+        if slot < 0:
+            return None
+        with self.lock:
+            shm = self.shms[slot] if slot < len(self.shms) else None
+            base = self.buffers[slot] if slot < len(self.buffers) else None
+            if shm is None or base is None:
+                return None
+            offset = data.__array_interface__["data"][0] - base.__array_interface__["data"][0]
+            if offset < 0 or offset >= base.nbytes:
+                return None  # Not a view of this slot (stale frame after a reallocation)
+            return shm.name, offset, data.shape, data.strides, data.dtype.str
+
+    def free(self):
+        """Release shared memory blocks (provider stopped). Buffers are reallocated on demand."""
+        with self.lock:
+            for slot in range(len(self.shms)):
+                self._retire(slot)
+
+
+class Frame(NamedTuple):
+    seq: int
+    ts: float  # Capture time (time.time())
+    data: Optional[np.ndarray]
+    slot: int = -1  # Pool slot backing data (-1 = not pooled)
+    pool: Optional[BufferPool] = None
+    layout: str = "bgr"  # "bgr", or a raw layout (e.g. "uyvy") when taken with raw=
+
+
+def _readonly(data: np.ndarray) -> np.ndarray:
+    # Readers share pooled buffers; a read-only view stops anyone scribbling on them
+    view = data.view()
+    view.flags.writeable = False
+    return view
+
+
+class FrameChannel:
+    """
+    Latest-frame slot published by a capture loop.
+    Each frame gets a sequence number; consumers block in wait() until a
+    newer frame arrives instead of polling.
+
+    Capture loops can also write into a small pool of preallocated buffers
+    (buffer() / publish(slot=...)) instead of allocating per frame. The
+    writer never reuses the latest slot or a slot a reader holds, so a
+    frame taken with hold=True stays stable until release() without a copy.
+
+    A frame can be published raw with a convert function. It is then only
+    converted when a consumer asks for it, once per sequence number: the
+    result is cached and shared by every consumer of that frame. Consumers
+    that can use the raw layout themselves (e.g. a JPEG encoder working on
+    YUV planes) pass raw=(layouts...) and skip the conversion entirely.
+
+    shared=True puts both pools in shared memory (for the encoder process pool).
+    """
+    def __init__(self, slots: int = 3, max_slots: int = 8, shared: bool = False):
+        self.cond = threading.Condition()
+        self.seq = 0
+        self.ts = 0.0
+        self.data: Optional[np.ndarray] = None
+        self.slot = -1
+        self.closed = False
+
+        self.pool = BufferPool(slots, max_slots, shared)       # Published (ready or raw) frames
+        self.converted = BufferPool(slots, max_slots, shared)  # Lazily converted frames
+        self.convert: Optional[Callable] = None
+        self.out_shape: Optional[Tuple[int, ...]] = None
+        self.raw_layout: Optional[str] = None
+        self.convert_lock = threading.Lock()
+        self.cache: Optional[Frame] = None
+        self.conversions = 0
+
+    @property
+    def allocations(self) -> int:
+        return self.pool.allocations + self.converted.allocations
+
+    def buffer(self, shape: Tuple[int, ...], dtype=np.uint8) -> Tuple[int, Optional[np.ndarray]]:
+        """
+        Writer side: a free preallocated buffer for the next frame.
+        Returns (slot, array), or (-1, None) if every slot is held (frame should be dropped).
+        """
+        return self.pool.get(shape, dtype)
+
+    def publish(self, data: np.ndarray, ts: Optional[float] = None, slot: int = -1,
+                convert: Optional[Callable[[np.ndarray, Optional[np.ndarray]], np.ndarray]] = None,
+                out_shape: Optional[Tuple[int, ...]] = None, raw_layout: Optional[str] = None) -> int:
+        """
+        Publish a frame. With convert, data is the raw frame and consumers get
+        convert(data, out) instead, where out is a pooled array of out_shape.
+        raw_layout names the raw format for consumers that accept it as is.
+        """
+        if slot >= 0:
+            data = _readonly(data)
+        with self.cond:
+            self.seq += 1
+            self.ts = ts if ts is not None else time.time()
+            self.data = data
+            self.slot = slot
+            self.convert = convert
+            self.out_shape = out_shape
+            self.raw_layout = raw_layout if convert is not None else None
+            self.pool.set_latest(slot)
+            self.cond.notify_all()
+            return self.seq
+
+    def _take(self, hold: bool, raw: Tuple[str, ...] = ()) -> Frame:
+        """Caller holds self.cond; returns the current frame, converting it if needed."""
+        if self.convert is None or self.raw_layout in raw:
+            if hold:
+                self.pool.hold(self.slot)
+            layout = self.raw_layout if self.convert is not None else "bgr"
+            return Frame(self.seq, self.ts, self.data, self.slot, self.pool, layout)
+
+        # Lazy frame: keep the raw slot stable while converting outside the condition lock
+        pending = (self.seq, self.ts, self.data, self.convert, self.out_shape)
+        raw_slot = self.slot
+        self.pool.hold(raw_slot)
+        self.cond.release()
+        try:
+            return self._materialize(*pending, hold=hold)
+        finally:
+            self.cond.acquire()
+            self.pool.release(raw_slot)
+
+    def _materialize(self, seq, ts, raw, convert, out_shape, hold: bool) -> Frame:
+        with self.convert_lock:
+            frame = self.cache
+            if frame is None or frame.seq != seq:
+                out_slot, out = self.converted.get(out_shape) if out_shape else (-1, None)
+                data = convert(raw, out)
+                if out_slot >= 0:
+                    data = _readonly(data)
+                frame = Frame(seq, ts, data, out_slot, self.converted)
+                self.conversions += 1
+                if self.cache is None or seq > self.cache.seq:
+                    # Cached slot is "latest" so the pool will not reuse it
+                    self.cache = frame
+                    self.converted.set_latest(out_slot)
+            if hold:
+                self.converted.hold(frame.slot)
+            return frame
+
+    def latest(self, hold: bool = False, raw: Tuple[str, ...] = ()) -> Frame:
+        with self.cond:
+            return self._take(hold, raw)
+
+    def wait(self, after_seq: int, timeout: float = 1.0, hold: bool = False,
+             raw: Tuple[str, ...] = ()) -> Optional[Frame]:
+        """Block until a frame newer than after_seq exists. None on timeout/close."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq > after_seq or self.closed, timeout=timeout)
+            if self.closed or self.seq <= after_seq:
+                return None
+            return self._take(hold, raw)
+
+    def release(self, frame: Optional[Frame]):
+        """Give back a frame taken with hold=True."""
+        if frame is None or frame.pool is None:
+            return
+        frame.pool.release(frame.slot)
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+            self.data = None
+            self.slot = -1
+            self.convert = None
+        with self.convert_lock:
+            self.cache = None
+        self.pool.free()
+        self.converted.free()
+
+    def reopen(self):
+        # Keep seq monotonic across restarts so consumers never see a duplicate
+        with self.cond:
+            self.closed = False
+            self.data = None
+            self.slot = -1
+            self.convert = None
+            self.raw_layout = None
+
+
+class FrameBatch(NamedTuple):
+    """Same-size frames of several cameras, stacked for batched inference."""
+    frames: np.ndarray  # (N, H, W, 3) uint8 BGR; rows with valid=False are zero
+    ts: np.ndarray      # (N,) capture time of each row (0 if invalid)
+    seq: np.ndarray     # (N,) provider sequence number of each row (0 if invalid)
+    valid: np.ndarray   # (N,) bool
+    ref_ts: float       # Time the rows were aligned to
+
+
+class StreamCounter:
+    """Counts frames a consumer delivered vs. skipped (sequence gaps)."""
+    def __init__(self):
+        self.delivered = 0
+        self.skipped = 0
+        self.last_seq = 0
+
+    def update(self, seq: int):
+        if self.last_seq and seq > self.last_seq + 1:
+            self.skipped += seq - self.last_seq - 1
+        self.delivered += 1
+        self.last_seq = seq
+
+    def as_dict(self) -> dict:
+        return {"delivered": self.delivered, "skipped": self.skipped}
@@ -0,0 +1,207 @@
+import cv2
+import bisect
+import logging
+import threading
+import numpy as np
+from collections import deque
+from typing import List, NamedTuple, Optional, Tuple
+from .frames import FrameChannel
+from .jpeg import bgrx_base, get_encoder, scale_to_width
+
+
+class HistoryOptions(NamedTuple):
+    """Per-camera frame history (config preview.history)."""
+    seconds: float = 10.0      # Keep at most this much video...
+    max_frames: int = 0        # ...and at most this many frames (0 = no frame limit)
+    max_mb: float = 64.0       # Hard memory cap for stored frame data
+    format: str = "jpeg"       # "jpeg" (smallest) or "raw" (YUV: exact pixels, ~1.5-2 bytes/pixel)
+    quality: int = 80          # JPEG quality for format "jpeg"
+    width: int = 0             # Downscale stored frames (0 = native)
+    fps: float = 0.0           # Record at most this rate (0 = every frame)
+
+    @classmethod
+    def from_dict(cls, d: Optional[dict]) -> Optional["HistoryOptions"]:
+        if not d:
+            return None
+        opts = cls(**{k: v for k, v in d.items() if k in cls._fields})
+        if opts.format not in ("jpeg", "raw"):
+            logging.warning(f"History: unknown format {opts.format}, using jpeg")
+            opts = opts._replace(format="jpeg")
+        return opts
+
+
+class HistoryFrame(NamedTuple):
+    """A stored frame. data is JPEG bytes or a packed YUV buffer, see layout."""
+    seq: int
+    ts: float       # Capture time (time.time())
+    layout: str     # "jpeg", "i420" or "uyvy"
+    shape: Tuple[int, int]  # (height, width) of the image
+    data: bytes
+
+    def bgr(self) -> np.ndarray:
+        """Decoded BGR image (a new array)."""
+        h, w = self.shape
+        buf = np.frombuffer(self.data, dtype=np.uint8)
+        if self.layout == "jpeg":
+            return cv2.imdecode(buf, cv2.IMREAD_COLOR)
+        if self.layout == "i420":
+            return cv2.cvtColor(buf.reshape(h * 3 // 2, w), cv2.COLOR_YUV2BGR_I420)
+        return cv2.cvtColor(buf.reshape(h, w, 2), cv2.COLOR_YUV2BGR_UYVY)
+
+    def jpeg(self, width: int = 0, quality: int = 80) -> Optional[bytes]:
+        """JPEG of this frame; the stored bytes themselves when no resize is needed."""
+        if self.layout == "jpeg" and (not width or width >= self.shape[1]):
+            return self.data
+        if self.layout == "uyvy":
+            return get_encoder().encode_frame(np.frombuffer(self.data, dtype=np.uint8).reshape(*self.shape, 2),
+                                              width, quality, "uyvy")
+        return get_encoder().encode_frame(self.bgr(), width, quality)
+
+
+class FrameHistory:
+    """
+    Bounded ring of a camera's recent frames, for trackers that fall behind
+    and instant replay.
+
+    A recorder thread follows the provider's FrameChannel and stores each
+    frame compactly: JPEG (about 20x smaller than BGR) or raw YUV. Raw NDI UYVY
+    frames are kept as they are. BGR frames are packed to I420. The oldest
+    frames are dropped once the buffer is over its time, frame count or memory
+    limit. The memory cap is hard: it is checked on every insert.
+    """
+    def __init__(self, id: str, source: FrameChannel, options: HistoryOptions = HistoryOptions()):
+        self.id = id
+        self.source = source
+        self.options = options
+        self.max_bytes = int(options.max_mb * 1024 * 1024)
+        self.lock = threading.Lock()
+        self.frames: deque = deque()
+        self.times: deque = deque()  # Capture ts per stored frame (sorted), for bisect
+        self.bytes = 0
+        self.recorded = 0
+        self.dropped = 0  # Frames evicted because of the memory cap (before their time was up)
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._record_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+        with self.lock:
+            self.frames.clear()
+            self.times.clear()
+            self.bytes = 0
+
+    def _record_loop(self):
+        opts = self.options
+        interval = 1.0 / opts.fps if opts.fps else 0.0
+        last_seq, last_t = 0, 0.0
+        while self.running:
+            encoder = get_encoder()
+            raw = ("uyvy",) if opts.format == "raw" or "uyvy" in encoder.raw_layouts else ()
+            frame = self.source.wait(last_seq, timeout=0.5, hold=True, raw=raw)
+            if frame is None:
+                continue
+            try:
+                if frame.data is None:
+                    continue
+                last_seq = frame.seq
+                if interval and frame.ts - last_t < interval:
+                    continue
+                last_t = frame.ts
+                entry = self._pack(frame.seq, frame.ts, frame.data, frame.layout)
+                if entry is not None:
+                    self._append(entry)
+            except Exception as e:
+                logging.error(f"History record error ({self.id}): {e}")
+            finally:
+                self.source.release(frame)
+
+    def _pack(self, seq: int, ts: float, data: np.ndarray, layout: str) -> Optional[HistoryFrame]:
+        opts = self.options
+        if opts.format == "jpeg":
+            jpeg = get_encoder().encode_frame(data, opts.width, opts.quality, layout)
+            if not jpeg:
+                return None
+            h, w = data.shape[:2]
+            if opts.width and opts.width < w:
+                w, h = opts.width, max(2, int(round(h * opts.width / w)) & ~1)
+            return HistoryFrame(seq, ts, "jpeg", (h, w), jpeg)
+
+        if layout == "uyvy" and not opts.width:
+            return HistoryFrame(seq, ts, "uyvy", data.shape[:2], data.tobytes())
+        if layout == "uyvy":
+            data = cv2.cvtColor(data, cv2.COLOR_YUV2BGR_UYVY)
+        bgrx = bgrx_base(data)
+        src = scale_to_width(bgrx if bgrx is not None else data, opts.width)
+        h, w = src.shape[:2]
+        if h % 2 or w % 2:
+            src = src[:h & ~1, :w & ~1]
+            h, w = h & ~1, w & ~1
+        code = cv2.COLOR_BGRA2YUV_I420 if src.shape[2] == 4 else cv2.COLOR_BGR2YUV_I420
+        return HistoryFrame(seq, ts, "i420", (h, w), cv2.cvtColor(src, code).tobytes())
+
+    def _append(self, entry: HistoryFrame):
+        opts = self.options
+        with self.lock:
+            self.frames.append(entry)
+            self.times.append(entry.ts)
+            self.bytes += len(entry.data)
+            self.recorded += 1
+            oldest_ts = entry.ts - opts.seconds
+            while self.frames:
+                over_cap = self.bytes > self.max_bytes
+                if not (over_cap or self.frames[0].ts < oldest_ts
+                        or (opts.max_frames and len(self.frames) > opts.max_frames)):
+                    break
+                old = self.frames.popleft()
+                self.times.popleft()
+                self.bytes -= len(old.data)
+                if over_cap and old.ts >= oldest_ts:
+                    self.dropped += 1
+
+    def get_frame_at(self, ts: float) -> Optional[HistoryFrame]:
+        """Stored frame captured closest to ts (None if the history is empty)."""
+        with self.lock:
+            if not self.frames:
+                return None
+            i = bisect.bisect_left(self.times, ts)
+            if i == len(self.frames):
+                return self.frames[-1]
+            if i > 0 and ts - self.times[i - 1] <= self.times[i] - ts:
+                return self.frames[i - 1]
+            return self.frames[i]
+
+    def get_frames(self, since_seq: int = 0, limit: int = 0) -> List[HistoryFrame]:
+        """Stored frames newer than since_seq, oldest first (at most limit, the oldest ones)."""
+        with self.lock:
+            out = [f for f in self.frames if f.seq > since_seq]
+        return out[:limit] if limit else out
+
+    def get_range(self, start_ts: float, end_ts: float) -> List[HistoryFrame]:
+        """Stored frames captured in [start_ts, end_ts], oldest first."""
+        with self.lock:
+            i = bisect.bisect_left(self.times, start_ts)
+            j = bisect.bisect_right(self.times, end_ts)
+            return [self.frames[k] for k in range(i, j)]
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            span = self.frames[-1].ts - self.frames[0].ts if self.frames else 0.0
+            return {
+                "format": self.options.format,
+                "frames": len(self.frames),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "seconds": round(span, 2),
+                "recorded": self.recorded,
+                "dropped": self.dropped
+            }
@@ -0,0 +1,205 @@
+import cv2
+import logging
+import numpy as np
+from abc import ABC, abstractmethod
+from typing import NamedTuple, Optional, Tuple
+
+# Chroma subsampling name -> (horizontal, vertical) chroma divisor
+SUBSAMPLING = {
+    "444": (1, 1),
+    "422": (2, 1),
+    "420": (2, 2),
+}
+
+
+class JpegOptions(NamedTuple):
+    """Server-wide JPEG encoder settings (config "settings" -> "jpeg")."""
+    backend: str = "auto"       # "auto" (turbojpeg if installed), "opencv" or "turbojpeg"
+    subsampling: str = "420"    # "444", "422" or "420"
+    fast_dct: bool = True       # Integer fast DCT; slightly lower quality, noticeably faster
+    yuv_direct: bool = True     # Encode UYVY frames from their YUV planes (no BGR conversion)
+
+    @classmethod
+    def from_dict(cls, d: Optional[dict]) -> "JpegOptions":
+        d = d or {}
+        opts = cls(**{k: v for k, v in d.items() if k in cls._fields})
+        if opts.subsampling not in SUBSAMPLING:
+            logging.warning(f"JPEG: unknown subsampling {opts.subsampling}, using 420")
+            opts = opts._replace(subsampling="420")
+        return opts
+
+
+def scale_to_width(frame: np.ndarray, width: int) -> np.ndarray:
+    """Downscale keeping aspect ratio. No-op if width is 0 or not smaller than the frame."""
+    h, w = frame.shape[:2]
+    if not width or width >= w:
+        return frame
+    height = max(2, int(round(h * width / w)) & ~1)
+    return cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+
+
+def scaled_size(w: int, h: int, width: int) -> Tuple[int, int]:
+    if not width or width >= w:
+        return w, h
+    return width, max(2, int(round(h * width / w)) & ~1)
+
+
+def uyvy_to_planar(raw: np.ndarray, width: int = 0, subsampling: str = "420") -> Tuple[np.ndarray, int, int]:
+    """
+    Packed UYVY (h, w, 2) -> one contiguous Y/U/V planar buffer (libjpeg-turbo's
+    "unified" YUV layout, rows padded to 4), optionally downscaled to width.
+    Deinterleaving and scaling the planes is much cheaper than a full
+    UYVY -> BGR conversion followed by the encoder's own BGR -> YUV pass.
+    Returns (buffer, out_w, out_h).
+    """
+    h, w = raw.shape[:2]
+    out_w, out_h = scaled_size(w, h, width)
+    sx, sy = SUBSAMPLING[subsampling]
+    cw, ch = -(-out_w // sx), -(-out_h // sy)
+    y_stride, c_stride = -(-out_w // 4) * 4, -(-cw // 4) * 4
+
+    buf = np.empty(y_stride * out_h + 2 * c_stride * ch, dtype=np.uint8)
+    y_plane = buf[:y_stride * out_h].reshape(out_h, y_stride)[:, :out_w]
+    c_size = c_stride * ch
+    u_plane = buf[y_stride * out_h:y_stride * out_h + c_size].reshape(ch, c_stride)[:, :cw]
+    v_plane = buf[y_stride * out_h + c_size:].reshape(ch, c_stride)[:, :cw]
+
+    # UYVY byte order per pixel pair: U0 Y0 V0 Y1
+    src_y = raw[:, :, 1]
+    src_u = raw[:, 0::2, 0]
+    src_v = raw[:, 1::2, 0]
+    for src, dst in ((src_y, y_plane), (src_u, u_plane), (src_v, v_plane)):
+        if src.shape == dst.shape:
+            np.copyto(dst, src)
+        else:
+            cv2.resize(src, (dst.shape[1], dst.shape[0]), dst=dst, interpolation=cv2.INTER_AREA)
+    return buf, out_w, out_h
+
+
+def bgrx_base(img: np.ndarray) -> Optional[np.ndarray]:
+    """The whole (h, w, 4) buffer behind a 3-channel view of BGRX data, else None."""
+    h, w = img.shape[:2]
+    if img.ndim != 3 or img.shape[2] != 3 or img.strides[1] != 4 or img.strides[0] != w * 4:
+        return None
+    return np.lib.stride_tricks.as_strided(img, shape=(h, w, 4), strides=(w * 4, 4, 1), writeable=False)
+
+
+class JpegEncoder(ABC):
+    """
+    Encoder backend. encode() takes a BGR frame; raw YUV frames go through encode_frame().
+    Backends listing raw_layouts also implement encode_raw(raw, layout, width, quality).
+    """
+    name = "base"
+    raw_layouts: Tuple[str, ...] = ()  # Raw layouts encode_raw() accepts (see FrameChannel raw=)
+
+    def __init__(self, options: JpegOptions = JpegOptions()):
+        self.options = options
+
+    @abstractmethod
+    def encode(self, bgr: np.ndarray, quality: int) -> Optional[bytes]:
+        pass
+
+    def encode_frame(self, data: np.ndarray, width: int, quality: int, layout: str = "bgr") -> Optional[bytes]:
+        """Scale to width (0 = native) and encode. layout is the Frame's layout."""
+        if layout != "bgr":
+            if layout in self.raw_layouts:
+                return self.encode_raw(data, layout, width, quality)
+            if layout != "uyvy":
+                raise ValueError(f"Cannot encode {layout} frames")
+            data = cv2.cvtColor(data, cv2.COLOR_YUV2BGR_UYVY)
+        bgrx = bgrx_base(data)
+        if bgrx is not None and width and width < data.shape[1]:
+            # Resizing the packed 4-channel buffer is far cheaper than the strided 3-channel view
+            return self.encode(scale_to_width(bgrx, width)[:, :, :3], quality)
+        return self.encode(scale_to_width(data, width), quality)
+
+
+class OpenCVEncoder(JpegEncoder):
+    """cv2.imencode. OpenCV exposes no DCT choice, so fast_dct is ignored."""
+    name = "opencv"
+
+    def __init__(self, options: JpegOptions = JpegOptions()):
+        super().__init__(options)
+        self.params = []
+        # Older OpenCV builds have no sampling factor flag (always 4:2:0)
+        sampling = getattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR", None)
+        factor = {
+            "444": getattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR_444", None),
+            "422": getattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR_422", None),
+            "420": getattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR_420", None),
+        }[options.subsampling]
+        if sampling is not None and factor is not None:
+            self.params += [int(sampling), int(factor)]
+
+    def encode(self, bgr: np.ndarray, quality: int) -> Optional[bytes]:
+        bgrx = bgrx_base(bgr)
+        if bgrx is not None:
+            # imencode is ~3x slower on a strided BGRX view than on packed BGR; repack first
+            bgr = cv2.cvtColor(bgrx, cv2.COLOR_BGRA2BGR)
+        ret, buffer = cv2.imencode('.jpg', bgr, [int(cv2.IMWRITE_JPEG_QUALITY), quality] + self.params)
+        return buffer.tobytes() if ret else None
+
+
+class TurboJPEGEncoder(JpegEncoder):
+    """libjpeg-turbo through PyTurboJPEG (optional: pip install PyTurboJPEG + libturbojpeg)."""
+    name = "turbojpeg"
+
+    def __init__(self, options: JpegOptions = JpegOptions()):
+        super().__init__(options)
+        import turbojpeg  # ImportError / OSError if the binding or the library is missing
+        self.tj = turbojpeg
+        self.jpeg = turbojpeg.TurboJPEG()
+        self.subsample = {"444": turbojpeg.TJSAMP_444, "422": turbojpeg.TJSAMP_422,
+                          "420": turbojpeg.TJSAMP_420}[options.subsampling]
+        self.flags = turbojpeg.TJFLAG_FASTDCT if options.fast_dct else 0
+        if options.yuv_direct and hasattr(self.jpeg, "encode_from_yuv"):
+            self.raw_layouts = ("uyvy",)
+
+    def encode(self, bgr: np.ndarray, quality: int) -> Optional[bytes]:
+        pixel_format = self.tj.TJPF_BGR
+        bgrx = bgrx_base(bgr)
+        if bgrx is not None:
+            # 3-channel view of a BGRX buffer (NDI): hand the whole buffer over, no repack
+            bgr, pixel_format = bgrx, self.tj.TJPF_BGRX
+        return self.jpeg.encode(bgr, quality=quality, pixel_format=pixel_format,
+                                jpeg_subsample=self.subsample, flags=self.flags)
+
+    def encode_raw(self, raw: np.ndarray, layout: str, width: int, quality: int) -> Optional[bytes]:
+        buf, w, h = uyvy_to_planar(raw, width, self.options.subsampling)
+        return self.jpeg.encode_from_yuv(buf, h, w, quality=quality,
+                                         jpeg_subsample=self.subsample, flags=self.flags)
+
+
+ENCODERS = {
+    "opencv": OpenCVEncoder,
+    "turbojpeg": TurboJPEGEncoder,
+}
+
+_encoder: Optional[JpegEncoder] = None
+
+
+def create_encoder(options: JpegOptions = JpegOptions()) -> JpegEncoder:
+    """Encoder for options.backend; "auto" prefers turbojpeg and falls back to OpenCV."""
+    backend = options.backend if options.backend in ENCODERS or options.backend == "auto" else "auto"
+    if backend in ("auto", "turbojpeg"):
+        try:
+            return TurboJPEGEncoder(options)
+        except (ImportError, OSError, RuntimeError) as e:
+            if backend == "turbojpeg":
+                logging.warning(f"JPEG: turbojpeg unavailable ({e}), using OpenCV")
+    return OpenCVEncoder(options)
+
+
+def configure(options: Optional[dict] = None) -> JpegEncoder:
+    """Set the encoder used by every MJPEG stream and snapshot (call at startup)."""
+    global _encoder
+    _encoder = create_encoder(JpegOptions.from_dict(options))
+    logging.info(f"JPEG encoder: {_encoder.name} ({_encoder.options})")
+    return _encoder
+
+
+def get_encoder() -> JpegEncoder:
+    global _encoder
+    if _encoder is None:
+        _encoder = create_encoder()
+    return _encoder
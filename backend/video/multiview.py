@@ -0,0 +1,151 @@
+import re
+import cv2
+import time
+import threading
+import logging
+import numpy as np
+from typing import Callable, Dict, List, Tuple
+from .frames import FrameChannel
+from .broadcaster import RenditionPool
+
+
+def parse_layout(layout: str) -> Tuple[int, int]:
+    """'3x2' -> (cols, rows). Raises ValueError on anything else."""
+    m = re.fullmatch(r"([1-4])x([1-4])", layout or "")
+    if not m:
+        raise ValueError(f"Invalid layout: {layout}")
+    return int(m.group(1)), int(m.group(2))
+
+
+def fit_rect(src_w: int, src_h: int, box_w: int, box_h: int) -> Tuple[int, int, int, int]:
+    """Letterboxed (x, y, w, h) of a src_w x src_h image inside a box, aspect preserved."""
+    scale = min(box_w / src_w, box_h / src_h)
+    w = max(2, int(src_w * scale))
+    h = max(2, int(src_h * scale))
+    return (box_w - w) // 2, (box_h - h) // 2, w, h
+
+
+class MultiviewCompositor:
+    """
+    Server-side mosaic of several cameras, published as one frame source.
+
+    A compositor thread resizes each camera's latest frame straight into its
+    tile of a preallocated canvas (cv2.resize with dst = canvas slice, no
+    temporaries), only for tiles whose source frame changed. The canvas is
+    then published to its own FrameChannel, so the usual RenditionPool
+    encodes it once for any number of viewers.
+    """
+    def __init__(self, id: str, layout: str, cam_ids: List[str],
+                 get_provider: Callable[[str], object], width: int = 1280, fps: float = 15.0,
+                 shared_frames: bool = False):
+        self.id = id
+        self.cols, self.rows = parse_layout(layout)
+        self.cam_ids = cam_ids[:self.cols * self.rows]
+        self.get_provider = get_provider
+        self.fps = fps
+
+        self.tile_w = max(32, width // self.cols) & ~1
+        self.tile_h = (self.tile_w * 9 // 16) & ~1
+        self.canvas = np.zeros((self.tile_h * self.rows, self.tile_w * self.cols, 3), dtype=np.uint8)
+        self.tile_state: Dict[int, Tuple[object, int]] = {} # tile -> (source channel, seq drawn)
+        self.rects: Dict[int, Tuple[int, int, int, int, int, int]] = {} # tile -> letterbox + source size
+
+        self.frames = FrameChannel(shared=shared_frames)
+        self.renditions = RenditionPool(id, self.frames)
+        self.running = False
+        self.thread = None
+        self.composites = 0
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        for i in range(len(self.cam_ids)):
+            self._draw_no_signal(i)
+        self.thread = threading.Thread(target=self._composite_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.renditions.close()
+        self.frames.close()
+        if self.thread:
+            self.thread.join(timeout=2.0)
+
+    def _tile(self, i: int) -> np.ndarray:
+        col, row = i % self.cols, i // self.cols
+        return self.canvas[row * self.tile_h:(row + 1) * self.tile_h, col * self.tile_w:(col + 1) * self.tile_w]
+
+    def _draw_no_signal(self, i: int):
+        tile = self._tile(i)
+        tile[:] = 0
+        cv2.putText(tile, f"{self.cam_ids[i]}: NO SIGNAL", (10, self.tile_h // 2),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (128, 128, 128), 1, cv2.LINE_AA)
+        self.tile_state.pop(i, None)
+
+    def _draw_tile(self, i: int, cam_id: str) -> bool:
+        """Resize the camera's newest frame into its tile. True if the canvas changed."""
+        provider = self.get_provider(cam_id)
+        channel = getattr(provider, "frames", None) if provider else None
+        if channel is None:
+            if i in self.tile_state:
+                self._draw_no_signal(i)
+                return True
+            return False
+
+        prev_channel, prev_seq = self.tile_state.get(i, (None, 0))
+        if channel is prev_channel and channel.seq <= prev_seq:
+            return False # Nothing new for this tile
+
+        frame = channel.latest(hold=True)
+        try:
+            if frame.data is None:
+                return False
+            src_h, src_w = frame.data.shape[:2]
+            rect = self.rects.get(i)
+            if rect is None or rect[4:] != (src_w, src_h):
+                # First frame or source resolution changed: clear letterbox bars
+                self._tile(i)[:] = 0
+                rect = fit_rect(src_w, src_h, self.tile_w, self.tile_h) + (src_w, src_h)
+                self.rects[i] = rect
+            x, y, w, h = rect[:4]
+            cv2.resize(frame.data, (w, h), dst=self._tile(i)[y:y + h, x:x + w], interpolation=cv2.INTER_AREA)
+            self.tile_state[i] = (channel, frame.seq)
+            return True
+        finally:
+            channel.release(frame)
+
+    def _composite_loop(self):
+        interval = 1.0 / self.fps if self.fps else 1.0 / 15
+        next_t = time.monotonic()
+        while self.running:
+            changed = False
+            for i, cam_id in enumerate(self.cam_ids):
+                try:
+                    changed |= self._draw_tile(i, cam_id)
+                except Exception as e:
+                    logging.error(f"Multiview tile error ({cam_id}): {e}")
+
+            if changed:
+                # Publish a stable copy; the working canvas keeps being updated in place
+                slot, out = self.frames.buffer(self.canvas.shape)
+                if out is not None:
+                    np.copyto(out, self.canvas)
+                    self.frames.publish(out, slot=slot)
+                    self.composites += 1
+
+            next_t += interval
+            delay = next_t - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_t = time.monotonic()
+
+    def is_running(self) -> bool:
+        return self.running
+
+    def get_stats(self) -> dict:
+        stats = self.renditions.get_stats()
+        stats["composites"] = self.composites
+        stats["cameras"] = self.cam_ids
+        return stats
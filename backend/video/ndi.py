@@ -3,19 +3,84 @@ import time
 import threading
 import logging
 import numpy as np
-from typing import Optional, Generator
-from .preview import PreviewProvider
+from typing import Optional, Tuple
+from .preview import FrameProvider
+from .broadcaster import RenditionPool
+from .frames import FrameChannel
+from .framebus import FrameBusPublisher, bus_name
+from .history import FrameHistory, HistoryOptions
 
-class NDIProvider(PreviewProvider):
-    def __init__(self, source_name: str, id: str, status_callback=None):
+# Config value -> NDIlib constant name
+NDI_BANDWIDTHS = {
+    "highest": "RECV_BANDWIDTH_HIGHEST",
+    "lowest": "RECV_BANDWIDTH_LOWEST",  # Proxy stream (~640x360)
+}
+NDI_COLOR_FORMATS = {
+    "bgrx_bgra": "RECV_COLOR_FORMAT_BGRX_BGRA",
+    "uyvy_bgra": "RECV_COLOR_FORMAT_UYVY_BGRA",
+    "rgbx_rgba": "RECV_COLOR_FORMAT_RGBX_RGBA",
+    "uyvy_rgba": "RECV_COLOR_FORMAT_UYVY_RGBA",
+    "fastest": "RECV_COLOR_FORMAT_FASTEST",
+    "best": "RECV_COLOR_FORMAT_BEST",
+}
+
+
+def frame_layout(data: np.ndarray, xres: int, yres: int, layout: Optional[str] = None) -> Optional[str]:
+    """Buffer layout from FourCC if known, else guessed from the buffer size."""
+    if layout is None:
+        if data.size == xres * yres * 2:
+            layout = "uyvy"
+        elif data.size == xres * yres * 4:
+            layout = "bgra"
+    return layout
+
+
+def output_shape(layout: str, xres: int, yres: int) -> Tuple[int, int, int]:
+    # BGRA is stored whole (4 channels) and exposed as a 3-channel view
+    return (yres, xres, 4) if layout == "bgra" else (yres, xres, 3)
+
+
+def frame_to_bgr(data: np.ndarray, xres: int, yres: int, layout: Optional[str] = None,
+                 out: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+    """
+    Turn an NDI video buffer into a BGR image.
+    BGRX/BGRA is returned as a zero-cost 3-channel view (no colorspace conversion);
+    only UYVY and RGB(X/A) need cvtColor. layout falls back to a size guess.
+    With out (shaped by output_shape()) the result is written straight into it,
+    so data can be the receiver's own buffer and nothing is allocated.
+    """
+    layout = frame_layout(data, xres, yres, layout)
+
+    if layout == "uyvy":
+        return cv2.cvtColor(data.reshape((yres, xres, 2)), cv2.COLOR_YUV2BGR_UYVY, dst=out)
+    if layout == "bgra":
+        src = data.reshape((yres, xres, 4))
+        if out is None:
+            return src[:, :, :3]
+        np.copyto(out, src)
+        return out[:, :, :3]
+    if layout == "rgba":
+        return cv2.cvtColor(data.reshape((yres, xres, 4)), cv2.COLOR_RGBA2BGR, dst=out)
+    return None
+
+
+class NDIProvider(FrameProvider):
+    def __init__(self, source_name: str, id: str, status_callback=None,
+                 bandwidth: str = "highest", color_format: str = "bgrx_bgra", shared_frames: bool = False,
+                 frame_bus: bool = False, history: Optional[HistoryOptions] = None):
         self.source_name = source_name
         self.id = id
+        self.bandwidth = bandwidth
+        self.color_format = color_format
         self.recv = None
         self.running = False
         self.thread = None
-        self.latest_frame: Optional[np.ndarray] = None
-        self.lock = threading.Lock()
+        self.frames = FrameChannel(shared=shared_frames) # shared: frames readable by encoder processes
         self.status_callback = status_callback
+        self.renditions = RenditionPool(id, self.frames)
+        # Shared-memory copy of every frame for sidecar processes (see framebus.py)
+        self.bus = FrameBusPublisher(bus_name(id), self.frames) if frame_bus else None
+        self.history = FrameHistory(id, self.frames, history) if history else None
 
     def start(self):
         if self.running:
@@ -28,13 +93,21 @@ class NDIProvider(PreviewProvider):
                 if self.status_callback: self.status_callback(status="error", error="NDI init failed")
                 return
 
-            self.recv = ndi.recv_create_v3()
+            # Receiver settings: BGRX lets the NDI decoder write BGR directly, so
+            # the capture loop does no colorspace conversion of its own.
+            recv_create = ndi.RecvCreateV3()
+            recv_create.bandwidth = getattr(ndi, NDI_BANDWIDTHS.get(self.bandwidth, "RECV_BANDWIDTH_HIGHEST"))
+            recv_create.color_format = getattr(ndi, NDI_COLOR_FORMATS.get(self.color_format, "RECV_COLOR_FORMAT_BGRX_BGRA"))
+            self.recv = ndi.recv_create_v3(recv_create)
             if self.recv is None:
                 logging.error("Could not create NDI receiver")
                 if self.status_callback: self.status_callback(status="error", error="NDI recv create failed")
                 return
 
             self.running = True
+            self.frames.reopen()
+            if self.renditions.closed:
+                self.renditions = RenditionPool(self.id, self.frames)
             
             # Connect to source
             source_t = ndi.Source()
@@ -44,6 +117,10 @@ class NDIProvider(PreviewProvider):
             # Start capture loop
             self.thread = threading.Thread(target=self._capture_loop, daemon=True)
             self.thread.start()
+            if self.bus:
+                self.bus.start()
+            if self.history:
+                self.history.start()
             logging.info(f"Started NDI Source: {self.source_name}")
 
         except ImportError:
@@ -52,8 +129,14 @@ class NDIProvider(PreviewProvider):
 
     def stop(self):
         self.running = False
+        self.renditions.close()
+        self.frames.close()
         if self.thread:
             self.thread.join(timeout=2.0)
+        if self.bus:
+            self.bus.stop()
+        if self.history:
+            self.history.stop()
         
         if self.recv:
             import NDIlib as ndi
@@ -62,35 +145,29 @@ class NDIProvider(PreviewProvider):
 
     def _capture_loop(self):
         import NDIlib as ndi
+        # FourCC -> buffer layout (names missing from older ndi-python builds are skipped)
+        layouts = {}
+        for name, layout in [("UYVY", "uyvy"), ("BGRA", "bgra"), ("BGRX", "bgra"), ("RGBA", "rgba"), ("RGBX", "rgba")]:
+            fourcc = getattr(ndi, f"FOURCC_VIDEO_TYPE_{name}", None)
+            if fourcc is not None:
+                layouts[fourcc] = layout
+
         while self.running:
             try:
                 t, v, a, m = ndi.recv_capture_v2(self.recv, 1000)
                 if t == ndi.FRAME_TYPE_VIDEO:
-                    # Convert to numpy
-                    frame = np.copy(v.data)
+                    # Copy out of the NDI buffer into a reused pool buffer (no per-frame
+                    # allocation). Color conversion is deferred until a consumer asks
+                    # for the frame, so an unwatched camera only pays for this copy.
+                    frame = v.data
                     frame_ok = False
                     
                     try:
-                        expected_rgba = v.xres * v.yres * 4
-                        expected_uyvy = v.xres * v.yres * 2
-                        
-                        processed_frame = None
-                        
-                        if frame.size == expected_uyvy:
-                            # UYVY (16bpp)
-                            frame = frame.reshape((v.yres, v.xres, 2))
-                            processed_frame = cv2.cvtColor(frame, cv2.COLOR_YUV2BGR_UYVY)
-                        elif frame.size == expected_rgba:
-                            # BGRA (32bpp)
-                            frame = frame.reshape((v.yres, v.xres, 4))
-                            processed_frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
-                        else:
+                        layout = frame_layout(frame, v.xres, v.yres, layouts.get(getattr(v, "FourCC", None)))
+                        if layout is None:
                             logging.warning(f"NDI: Unknown frame size {frame.size} for {v.xres}x{v.yres}")
-                            
-                        if processed_frame is not None:
-                            with self.lock:
-                                self.latest_frame = processed_frame
-                            frame_ok = True
+                        else:
+                            frame_ok = self._publish_raw(frame, v.xres, v.yres, layout)
                             
                     except Exception as e:
                         logging.error(f"NDI Decode Error: {e}")
@@ -112,30 +189,38 @@ class NDIProvider(PreviewProvider):
                 if self.status_callback: self.status_callback(status="error", error=f"Capture: {e}")
                 time.sleep(1)
 
-    def get_frame(self) -> Optional[np.ndarray]:
-        with self.lock:
-            if self.latest_frame is not None:
-                return self.latest_frame.copy()
-        return None
+    def _publish_raw(self, data: np.ndarray, xres: int, yres: int, layout: str) -> bool:
+        if layout == "bgra":
+            # Already BGR(X): the copy *is* the frame, exposed as a 3-channel view
+            slot, out = self.frames.buffer(output_shape(layout, xres, yres))
+            if out is None:
+                return False
+            self.frames.publish(frame_to_bgr(data, xres, yres, layout, out=out), slot=slot)
+            return True
+
+        raw_shape = (yres, xres, 2 if layout == "uyvy" else 4)
+        slot, raw = self.frames.buffer(raw_shape)
+        if raw is None:
+            return False
+        np.copyto(raw, data.reshape(raw_shape))
+        self.frames.publish(
+            raw, slot=slot,
+            convert=lambda r, out: frame_to_bgr(r, xres, yres, layout, out=out),
+            out_shape=output_shape(layout, xres, yres),
+            raw_layout=layout
+        )
+        return True
 
     def get_stream_url(self) -> str:
         # MJPEG endpoint
         return f"/api/video/{self.id}/mjpeg"
 
-    def is_running(self) -> bool:
-        return self.running
-
-    def generate_mjpeg(self) -> Generator[bytes, None, None]:
-        """Yields MJPEG frames for streaming response."""
-        while self.running:
-            with self.lock:
-                frame = self.latest_frame
-            
-            if frame is not None:
-                # Encode as JPEG
-                ret, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 70])
-                if ret:
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
-            
-            time.sleep(0.033)
+    def get_stats(self) -> dict:
+        stats = self.renditions.get_stats()
+        stats["captured"] = self.frames.seq
+        stats["conversions"] = self.frames.conversions
+        if self.bus:
+            stats["frame_bus"] = self.bus.get_stats()
+        if self.history:
+            stats["history"] = self.history.get_stats()
+        return stats
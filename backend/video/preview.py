@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import AsyncGenerator, Generator, List, Optional
 import numpy as np
+from .broadcaster import Rendition
 
 class PreviewProvider(ABC):
     @abstractmethod
@@ -18,6 +19,14 @@ class PreviewProvider(ABC):
         """Return the latest frame as a numpy array (BGR). For Phase 2 CV."""
         pass
 
+    def get_frame_at(self, ts: float):
+        """Recorded frame closest to capture time ts (HistoryFrame), if frame history is enabled."""
+        return None
+
+    def get_frames(self, since_seq: int = 0) -> List:
+        """Recorded frames newer than since_seq, oldest first (empty without frame history)."""
+        return []
+
     @abstractmethod
     def get_stream_url(self) -> str:
         """Return the URL that the frontend should use to play this stream."""
@@ -27,3 +36,62 @@ class PreviewProvider(ABC):
     def is_running(self) -> bool:
         """Check if source is active."""
         pass
+
+
+class FrameProvider(PreviewProvider):
+    """
+    Provider that publishes decoded frames to self.frames (FrameChannel) and
+    serves MJPEG/snapshots from self.renditions (RenditionPool); self.history
+    is a FrameHistory or None. Subclasses capture; everything else is here.
+    """
+    history = None
+
+    def has_frames(self) -> bool:
+        """Whether frames are being produced (RTSP in HLS-only mode never has any)."""
+        return self.running
+
+    def get_frame(self) -> Optional[np.ndarray]:
+        # Caller gets its own copy (it may draw on it); hold keeps the slot stable meanwhile
+        frame = self.frames.latest(hold=True)
+        try:
+            if frame.data is not None:
+                return frame.data.copy()
+            return None
+        finally:
+            self.frames.release(frame)
+
+    def wait_frame(self, after_seq: int = 0, timeout: float = 1.0, hold: bool = False):
+        """
+        Block until a frame newer than after_seq is captured. Returns Frame or None.
+        Frame.data is a read-only shared buffer; with hold=True it stays valid
+        (no copy needed) until frames.release(frame).
+        """
+        return self.frames.wait(after_seq, timeout, hold=hold)
+
+    def get_frame_at(self, ts: float):
+        return self.history.get_frame_at(ts) if self.history else None
+
+    def get_frames(self, since_seq: int = 0):
+        return self.history.get_frames(since_seq) if self.history else []
+
+    def is_running(self) -> bool:
+        return self.running
+
+    def generate_mjpeg(self, rendition: Rendition = Rendition()) -> Generator[bytes, None, None]:
+        """Yields MJPEG frames for streaming response (shared encoder per rendition)."""
+        if not self.has_frames():
+            return
+        yield from self.renditions.stream(rendition)
+
+    async def generate_mjpeg_async(self, rendition: Rendition = Rendition()) -> AsyncGenerator[bytes, None]:
+        """Async MJPEG stream for the endpoint; no threadpool worker per viewer."""
+        if not self.has_frames():
+            return
+        async for chunk in self.renditions.stream_async(rendition):
+            yield chunk
+
+    def snapshot(self, width: int = 0, quality: Optional[int] = None, max_age: float = 0.1):
+        """Latest still JPEG (Snapshot or None); reuses a running stream's encode when possible."""
+        if not self.has_frames():
+            return None
+        return self.renditions.snapshot(width, quality, max_age)
@@ -1,10 +1,20 @@
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 from .preview import PreviewProvider
 from .ndi import NDIProvider
 from .rtsp import RTSPProvider
 from .discovery import NDIDiscovery
+from .multiview import MultiviewCompositor
+from . import encode_pool
+from .history import HistoryOptions
+from .frames import FrameBatch
+from .multiview import fit_rect
 
 import threading
+import time
+import cv2
+import numpy as np
+
+DEFAULT_IDLE_TIMEOUT = 60.0 # seconds without consumers before a provider is stopped
 
 class PreviewManager:
     _instance = None
@@ -16,6 +26,15 @@ class PreviewManager:
             cls._instance.providers: Dict[str, PreviewProvider] = {}
             cls._instance.states: Dict[str, Dict] = {} # cam_id -> {status, last_seen, last_error}
             cls._instance.discovery = NDIDiscovery()
+            # Consumer tracking / idle reaping
+            cls._instance.consumers: Dict[str, int] = {} # cam_id -> active viewers/consumers
+            cls._instance.last_used: Dict[str, float] = {} # cam_id -> monotonic ts of last consumer activity
+            cls._instance.warm_standby = set() # cam_ids never reaped
+            cls._instance.idle_timeout = DEFAULT_IDLE_TIMEOUT
+            cls._instance.reaper = None
+            cls._instance.multiviews: Dict[tuple, MultiviewCompositor] = {}
+            cls._instance.multiview_refs: Dict[tuple, int] = {}
+            cls._instance.batch_buffers = threading.local() # Per-thread reusable get_frame_batch() arrays
         return cls._instance
 
     def _init_state(self, cam_id):
@@ -23,14 +42,17 @@ class PreviewManager:
             self.states[cam_id] = {
                 "status": "offline",
                 "last_seen": None,
-                "last_error": None
+                "last_error": None,
+                "starts": 0,
+                "stops": 0,
+                "reaped": 0
             }
 
     def update_state(self, cam_id, status=None, error=None, activity=False):
         """
         Thread-safe state update.
         activity=True updates last_seen to now.
-        status: starting | ok | restarting | offline | error
+        status: starting | ok | restarting | idle | offline | error
         """
         from datetime import datetime
         with self._lock:
@@ -45,21 +67,268 @@ class PreviewManager:
             if activity:
                 s["last_seen"] = datetime.now().isoformat()
                 # If we see activity, implied status is OK if distinct from starting
-                if s["status"] not in ["starting", "restarting"]:
+                if s["status"] not in ["starting", "restarting", "idle"]:
                      s["status"] = "ok"
 
     def get_state(self, cam_id):
          with self._lock:
-             return self.states.get(cam_id, {
+             state = self.states.get(cam_id, {
                 "status": "offline",
                 "last_seen": None,
                 "last_error": None
              }).copy()
+             state["consumers"] = self.consumers.get(cam_id, 0)
+             state["warm_standby"] = cam_id in self.warm_standby
+             return state
 
     def get_provider(self, cam_id: str) -> Optional[PreviewProvider]:
         with self._lock:
             return self.providers.get(cam_id)
 
+    @staticmethod
+    def stream_url_for(config: Dict) -> str:
+        """URL the frontend should play, even if the provider is not running (lazy start)."""
+        cam_id = config.get("id")
+        preview_cfg = config.get("preview", {})
+        if preview_cfg.get("type", "rtsp") == "ndi":
+            return f"/api/video/{cam_id}/mjpeg" if preview_cfg.get("ndi_source") else ""
+        if not preview_cfg.get("rtsp_url"):
+            return ""
+        if preview_cfg.get("rtsp_mode", "hls") in ("mjpeg", "both"):
+            return f"/api/video/{cam_id}/mjpeg"  # Decoded frames, low latency
+        return f"/hls/{cam_id}/stream.m3u8"
+
+    # --- Consumer tracking / idle reaping ---
+
+    def acquire(self, cam_id: str):
+        """Register an active consumer (viewer, tracker, ...). Pair with release()."""
+        with self._lock:
+            self.consumers[cam_id] = self.consumers.get(cam_id, 0) + 1
+            self.last_used[cam_id] = time.monotonic()
+
+    def release(self, cam_id: str):
+        with self._lock:
+            n = self.consumers.get(cam_id, 0) - 1
+            if n > 0:
+                self.consumers[cam_id] = n
+            else:
+                self.consumers.pop(cam_id, None)
+            self.last_used[cam_id] = time.monotonic()
+
+    def touch(self, cam_id: str):
+        """Mark activity from consumers we can't refcount (e.g. HLS segment fetches)."""
+        with self._lock:
+            self.last_used[cam_id] = time.monotonic()
+
+    def get_consumers(self, cam_id: str) -> int:
+        with self._lock:
+            return self.consumers.get(cam_id, 0)
+
+    def configure(self, idle_timeout: Optional[float] = None, encode_workers: Optional[int] = None):
+        """
+        encode_workers > 0 moves JPEG encoding to that many worker processes
+        (frames are shared with them through shared memory), capped at one
+        less than the CPU count (see encode_pool.effective_workers). Applies
+        to providers started afterwards.
+        """
+        if idle_timeout is not None:
+            self.idle_timeout = float(idle_timeout)
+        if encode_workers is not None:
+            encode_pool.start_pool(encode_pool.effective_workers(int(encode_workers)))
+
+    def _shared_frames(self) -> bool:
+        return encode_pool.get_pool() is not None
+
+    def _ensure_reaper(self):
+        # Caller holds self._lock
+        if self.reaper is None:
+            self.reaper = threading.Thread(target=self._reap_loop, daemon=True)
+            self.reaper.start()
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(max(1.0, min(self.idle_timeout / 4, 10.0)))
+            try:
+                self.reap_idle()
+            except Exception as e:
+                print(f"Preview reaper error: {e}")
+
+    def reap_idle(self) -> int:
+        """Stop providers that had no consumers for idle_timeout. Warm standby is kept."""
+        from ..logger import logger
+        if self.idle_timeout <= 0:
+            return 0 # Reaping disabled
+        now = time.monotonic()
+        victims = []
+        with self._lock:
+            for cam_id in list(self.providers.keys()):
+                if cam_id in self.warm_standby or self.consumers.get(cam_id, 0) > 0:
+                    continue
+                bus = getattr(self.providers[cam_id], "bus", None)
+                if bus is not None and bus.has_readers():
+                    continue # Sidecars are reading the frame bus
+                if now - self.last_used.get(cam_id, now) > self.idle_timeout:
+                    victims.append((cam_id, self.providers.pop(cam_id)))
+
+        for cam_id, provider in victims:
+            try:
+                provider.stop()
+            except Exception as e:
+                print(f"Error stopping idle provider {cam_id}: {e}")
+            with self._lock:
+                self._init_state(cam_id)
+                self.states[cam_id]["stops"] += 1
+                self.states[cam_id]["reaped"] += 1
+            self.update_state(cam_id, status="idle")
+            logger.log("INFO", "Preview stopped (idle)", cam_id, "preview.idle")
+        return len(victims)
+
+    # --- Server-side multiview ---
+
+    def acquire_multiview(self, layout: str, cam_ids: list, width: int = 1280, fps: float = 15.0,
+                          config_lookup=None) -> MultiviewCompositor:
+        """
+        Shared compositor for a layout + camera list (one per distinct request, refcounted).
+        Its cameras count as consumers while it runs. Raises ValueError on a bad layout.
+        """
+        key = (layout, tuple(cam_ids), width, fps)
+        created = False
+        with self._lock:
+            mv = self.multiviews.get(key)
+            if mv is None:
+                mv = MultiviewCompositor(f"multiview:{layout}:{','.join(cam_ids)}", layout, list(cam_ids),
+                                         self.get_provider, width, fps, shared_frames=self._shared_frames())
+                self.multiviews[key] = mv
+                self.multiview_refs[key] = 0
+                created = True
+            self.multiview_refs[key] += 1
+
+        if created:
+            for cam_id in mv.cam_ids:
+                self.acquire(cam_id)
+                if config_lookup and self.get_provider(cam_id) is None:
+                    conf = config_lookup(cam_id)
+                    if conf:
+                        self.create_provider(conf)
+            mv.start()
+        return mv
+
+    def release_multiview(self, mv: MultiviewCompositor):
+        with self._lock:
+            key = next((k for k, v in self.multiviews.items() if v is mv), None)
+            if key is None:
+                return
+            self.multiview_refs[key] -= 1
+            if self.multiview_refs[key] > 0:
+                return
+            del self.multiviews[key]
+            del self.multiview_refs[key]
+        mv.stop()
+        for cam_id in mv.cam_ids:
+            self.release(cam_id)
+
+    # --- Batched frame access (Phase 2 inference) ---
+
+    def get_frame_batch(self, cam_ids: List[str], size: Tuple[int, int], at: Optional[float] = None,
+                        max_skew: float = 0.0, keep_aspect: bool = False) -> FrameBatch:
+        """
+        Latest frames of several cameras, resized into one (N, H, W, 3) array.
+
+        size is (width, height). Each row is the camera's frame closest to a
+        common reference time: `at` if given, else the oldest of the cameras'
+        latest capture times. Cameras with frame history can return an older
+        frame to match it; the others return their latest frame. A row is
+        invalid (zero-filled) if the camera has no frame or, with max_skew > 0,
+        its frame is more than max_skew seconds from the reference time.
+        keep_aspect letterboxes instead of stretching.
+
+        The arrays are preallocated and reused by the next call from the same
+        thread with the same N and size; copy them to keep them longer.
+        Frames are resized straight from the providers' shared buffers, with no
+        per-camera get_frame() copy.
+        """
+        w, h = size
+        n = len(cam_ids)
+        key = (n, h, w)
+        cache = getattr(self.batch_buffers, "cache", None)
+        if cache is None:
+            cache = self.batch_buffers.cache = {}
+        if key not in cache:
+            cache[key] = FrameBatch(np.zeros((n, h, w, 3), dtype=np.uint8), np.zeros(n), np.zeros(n, dtype=np.int64),
+                                    np.zeros(n, dtype=bool), 0.0)
+        out = cache[key]
+        out.valid[:] = False
+        out.ts[:] = 0
+        out.seq[:] = 0
+
+        providers = [self.get_provider(cam_id) for cam_id in cam_ids]
+        if at is None:
+            latest = [p.frames.ts for p in providers if p is not None and getattr(p, "frames", None) is not None
+                      and p.frames.seq > 0]
+            at = min(latest) if latest else time.time()
+
+        for i, provider in enumerate(providers):
+            try:
+                ok = self._fill_batch_row(out, i, provider, at, max_skew, keep_aspect)
+            except Exception as e:
+                print(f"Frame batch error ({cam_ids[i]}): {e}")
+                ok = False
+            if not ok:
+                out.frames[i] = 0
+        return out._replace(ref_ts=at)
+
+    @staticmethod
+    def _fill_batch_row(out: FrameBatch, i: int, provider, at: float, max_skew: float, keep_aspect: bool) -> bool:
+        if provider is None or not provider.is_running():
+            return False
+        channel = getattr(provider, "frames", None)
+        held = None
+        if channel is not None:
+            held = channel.latest(hold=True)
+            seq, ts, data = held.seq, held.ts, held.data
+            if data is not None and ts > at:
+                # Newer than the reference time: a recorded frame may be closer
+                past = provider.get_frame_at(at)
+                if past is not None and abs(past.ts - at) < ts - at:
+                    channel.release(held)
+                    held = None
+                    seq, ts, data = past.seq, past.ts, past.bgr()
+        else:
+            data = provider.get_frame() # No shared frames (copy)
+            seq, ts = 0, time.time()
+
+        try:
+            if data is None or (max_skew and abs(ts - at) > max_skew):
+                return False
+            row = out.frames[i]
+            h, w = row.shape[:2]
+            if keep_aspect:
+                x, y, fw, fh = fit_rect(data.shape[1], data.shape[0], w, h)
+                row[:] = 0
+                cv2.resize(data, (fw, fh), dst=row[y:y + fh, x:x + fw], interpolation=cv2.INTER_AREA)
+            else:
+                cv2.resize(data, (w, h), dst=row, interpolation=cv2.INTER_AREA)
+            out.ts[i], out.seq[i], out.valid[i] = ts, seq, True
+            return True
+        finally:
+            if held is not None:
+                channel.release(held)
+
+    def get_lifecycle_stats(self) -> Dict:
+        """Totals for /api/health."""
+        with self._lock:
+            return {
+                "running": len(self.providers),
+                "consumers": sum(self.consumers.values()),
+                "warm_standby": len(self.warm_standby),
+                "starts": sum(s.get("starts", 0) for s in self.states.values()),
+                "stops": sum(s.get("stops", 0) for s in self.states.values()),
+                "reaped": sum(s.get("reaped", 0) for s in self.states.values()),
+                "multiviews": len(self.multiviews),
+                "idle_timeout": self.idle_timeout,
+                "encode_pool": encode_pool.get_pool().get_stats() if encode_pool.get_pool() else None
+            }
+
     def create_provider(self, config: Dict) -> Optional[PreviewProvider]:
         cam_id = config.get("id")
         preview_cfg = config.get("preview", {})
@@ -79,6 +348,11 @@ class PreviewManager:
                     del self.providers[cam_id]
 
         self.update_state(cam_id, status="starting")
+        with self._lock:
+            if preview_cfg.get("warm_standby"):
+                self.warm_standby.add(cam_id)
+            else:
+                self.warm_standby.discard(cam_id)
         
         provider = None
         try:
@@ -90,15 +364,34 @@ class PreviewManager:
                 source_name = preview_cfg.get("ndi_source")
                 if source_name:
                     # Pass callback to NDI Provider
-                    provider = NDIProvider(source_name, cam_id, status_callback=_status_cb)
+                    provider = NDIProvider(
+                        source_name, cam_id, status_callback=_status_cb,
+                        bandwidth=preview_cfg.get("ndi_bandwidth", "highest"),
+                        color_format=preview_cfg.get("ndi_color_format", "bgrx_bgra"),
+                        shared_frames=self._shared_frames(),
+                        frame_bus=bool(preview_cfg.get("frame_bus")),
+                        history=HistoryOptions.from_dict(preview_cfg.get("history"))
+                    )
             else:
                 url = preview_cfg.get("rtsp_url")
                 if url:
-                    provider = RTSPProvider(url, cam_id)
+                    provider = RTSPProvider(
+                        url, cam_id, status_callback=_status_cb,
+                        frame_width=int(preview_cfg.get("rtsp_frame_width", 0) or 0),
+                        frame_fps=float(preview_cfg.get("rtsp_frame_fps", 0) or 0),
+                        frame_bus=bool(preview_cfg.get("frame_bus")),
+                        history=HistoryOptions.from_dict(preview_cfg.get("history")),
+                        mode=preview_cfg.get("rtsp_mode", "hls"),
+                        hls_mode=preview_cfg.get("hls_mode", "standard")
+                    )
             
             if provider:
                 with self._lock:
                    self.providers[cam_id] = provider
+                   self.last_used[cam_id] = time.monotonic() # Grace period before first reap
+                   self._init_state(cam_id)
+                   self.states[cam_id]["starts"] += 1
+                   self._ensure_reaper()
                 
                 # Start in background to avoid blocking startup
                 import threading
@@ -132,6 +425,7 @@ class PreviewManager:
         
         with self._lock:
             if cam_id in self.providers:
+                self.states[cam_id]["stops"] += 1
                 try:
                     self.providers[cam_id].stop()
                     logger.log("INFO", "Preview stopped for restart", cam_id, "preview.restart")
@@ -151,7 +445,9 @@ class PreviewManager:
     def remove_provider(self, cam_id: str):
         self.update_state(cam_id, status="offline")
         with self._lock:
+            self.warm_standby.discard(cam_id)
             if cam_id in self.providers:
+                self.states[cam_id]["stops"] += 1
                 try:
                     self.providers[cam_id].stop()
                 except Exception: pass
@@ -164,6 +460,12 @@ class PreviewManager:
                 try: p.stop()
                 except: pass
             self.providers.clear()
+            for mv in self.multiviews.values():
+                try: mv.stop()
+                except: pass
+            self.multiviews.clear()
+            self.multiview_refs.clear()
+            encode_pool.stop_pool()
             self.states.clear() # Reset states? Or mark offline?
             # Mark offline
             # self.states = {} # Simple clear for shutdown
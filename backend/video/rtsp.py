@@ -1,32 +1,179 @@
-from .preview import PreviewProvider
+from .preview import FrameProvider
 from typing import Optional
+import cv2
+import threading
+import logging
 import numpy as np
 from ..stream.manager import StreamManager
+from ..stream import llhls
+from .frames import FrameChannel
+from .broadcaster import RenditionPool
+from .framebus import FrameBusPublisher, bus_name
+from .history import FrameHistory, HistoryOptions
 
-class RTSPProvider(PreviewProvider):
-    def __init__(self, rtsp_url: str, id: str):
+
+def read_exact(pipe, buf: np.ndarray) -> bool:
+    """Fill buf from pipe. False on EOF."""
+    view = memoryview(buf).cast("B")
+    n = 0
+    while n < len(view):
+        r = pipe.readinto(view[n:])
+        if not r:
+            return False
+        n += r
+    return True
+
+
+def i420_to_bgr(raw: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    return cv2.cvtColor(raw, cv2.COLOR_YUV2BGR_I420, dst=out)
+
+
+# Preview modes: what the browser plays
+RTSP_MODES = ("hls", "mjpeg", "both")
+MJPEG_FRAME_WIDTH = 1280 # Decoded width for MJPEG mode if rtsp_frame_width is 0
+CV_FRAME_WIDTH = 640 # ...and for frame bus/history in HLS mode
+
+
+class RTSPProvider(FrameProvider):
+    """
+    RTSP camera through a single ffmpeg process (StreamManager): HLS for the
+    browser and, with frame_width set, decoded downscaled frames on a pipe,
+    both from one RTSP session and one decode. The frames feed a FrameChannel
+    like NDI, so get_frame(), the frame bus and frame history work for RTSP too.
+
+    mode "mjpeg" plays those decoded frames through the same MJPEG fan-out as
+    NDI (a few hundred ms behind live instead of seconds of HLS buffering);
+    "both" also keeps writing HLS, "hls" is the classic preview.
+    """
+    def __init__(self, rtsp_url: str, id: str, status_callback=None, frame_width: int = 0,
+                 frame_fps: float = 0.0, frame_bus: bool = False, history: Optional[HistoryOptions] = None,
+                 mode: str = "hls", hls_mode: str = "standard"):
         self.rtsp_url = rtsp_url
         self.id = id
+        self.mode = mode if mode in RTSP_MODES else "hls"
+        self.hls_mode = hls_mode
+        if not frame_width:
+            # Only decode when something consumes the frames
+            if self.mode != "hls":
+                frame_width = MJPEG_FRAME_WIDTH
+            elif frame_bus or history:
+                frame_width = CV_FRAME_WIDTH
         self.stream_manager = StreamManager()
         self.running = False
+        self.status_callback = status_callback
+        self.frame_width = frame_width & ~1
+        self.frame_fps = frame_fps
+        self.frames = FrameChannel()
+        self.renditions = RenditionPool(id, self.frames)
+        self.reader = None
+        self.bus = FrameBusPublisher(bus_name(id), self.frames) if frame_bus and frame_width else None
+        self.history = FrameHistory(id, self.frames, history) if history and frame_width else None
 
     def start(self):
         if not self.running:
-            self.stream_manager.start_stream(self.id, self.rtsp_url)
+            if self.frame_width:
+                self.frames.reopen()
+                if self.renditions.closed:
+                    self.renditions = RenditionPool(self.id, self.frames)
             self.running = True
+            try:
+                # Supervised: ffmpeg is restarted if it dies, _on_ffmpeg_start attaches to each new process
+                self.stream_manager.start_stream(self.id, self.rtsp_url, self.frame_width, self.frame_fps,
+                                                 hls=self.mode != "mjpeg", on_start=self._on_ffmpeg_start,
+                                                 status_callback=self.status_callback, hls_mode=self.hls_mode)
+            except Exception:
+                self.running = False
+                raise
+            if self.bus:
+                self.bus.start()
+            if self.history:
+                self.history.start()
 
     def stop(self):
         if self.running:
-            self.stream_manager.stop_stream(self.id)
             self.running = False
+            self.stream_manager.stop_stream(self.id) # Closes the pipe, reader sees EOF
+            self.renditions.close()
+            self.frames.close()
+            if self.reader:
+                self.reader.join(timeout=2.0)
+                self.reader = None
+            if self.bus:
+                self.bus.stop()
+            if self.history:
+                self.history.stop()
+
+    def _on_ffmpeg_start(self, proc):
+        if self.frame_width and proc.stdout is not None:
+            # The previous reader (if any) has seen EOF on the dead process's pipe
+            self.reader = threading.Thread(target=self._read_frames, args=(proc,), daemon=True)
+            self.reader.start()
+
+    def _read_frames(self, proc):
+        try:
+            self._pump_frames(proc.stdout)
+        except Exception as e:
+            logging.error(f"RTSP {self.id}: frame reader failed: {e}")
+        finally:
+            if self.running and proc.poll() is None:
+                # Nobody drains stdout any more and ffmpeg would block on it (stalling HLS too):
+                # kill it, the supervisor restarts it with a fresh reader
+                proc.kill()
+
+    def _pump_frames(self, pipe):
+        header = pipe.readline()
+        if not header.startswith(b"YUV4MPEG2"):
+            logging.error(f"RTSP {self.id}: no frames from ffmpeg")
+            return
+        # "YUV4MPEG2 W640 H360 F30:1 Ip A1:1 C420jpeg ..."
+        params = {p[:1]: p[1:] for p in header.split()[1:]}
+        w, h = int(params[b"W"]), int(params[b"H"])
+        shape = (h * 3 // 2, w)  # I420: Y plane, then quarter-size U and V planes
+        out_shape = (h, w, 3)
+        scratch = None
+        logging.info(f"RTSP {self.id}: receiving {w}x{h} frames from ffmpeg")
+
+        while self.running:
+            if not pipe.readline().startswith(b"FRAME"):
+                break # ffmpeg exited
+            slot, buf = self.frames.buffer(shape)
+            if buf is None:
+                # Every buffer is held by a reader: still drain the pipe (ffmpeg must never
+                # block on us, it is writing HLS too) but drop the frame
+                if scratch is None:
+                    scratch = np.empty(shape, dtype=np.uint8)
+                if not read_exact(pipe, scratch):
+                    break
+                continue
+            if not read_exact(pipe, buf):
+                break
+            # Converted to BGR only if a consumer asks for it
+            self.frames.publish(buf, slot=slot, convert=i420_to_bgr, out_shape=out_shape, raw_layout="i420")
+            if self.status_callback:
+                self.status_callback(status="ok", activity=True)
+
+        if self.running:
+            logging.warning(f"RTSP {self.id}: frame pipe closed")
 
-    def get_frame(self) -> Optional[np.ndarray]:
-        # Phase 2: Add OpenCV capture for RTSP if needed for tracking
-        # For now, just None or implement sidecar opencv cap
-        return None 
+    def has_frames(self) -> bool:
+        return self.running and bool(self.frame_width)
 
     def get_stream_url(self) -> str:
+        if self.mode != "hls":
+            return f"/api/video/{self.id}/mjpeg"
         return f"/hls/{self.id}/stream.m3u8"
 
-    def is_running(self) -> bool:
-        return self.running
+    def get_stats(self) -> dict:
+        stats = self.renditions.get_stats()
+        stats["captured"] = self.frames.seq
+        stats["conversions"] = self.frames.conversions
+        stats["mode"] = self.mode
+        stats["ffmpeg"] = self.stream_manager.get_stats(self.id)
+        playlist = llhls.get_playlist(self.id)
+        if playlist:
+            stats["ll_hls"] = playlist.get_stats()
+        if self.bus:
+            stats["frame_bus"] = self.bus.get_stats()
+        if self.history:
+            stats["history"] = self.history.get_stats()
+        return stats
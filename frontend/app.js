@@ -10,6 +10,9 @@ const ADD_BTN = document.querySelector('#add-camera-form button[type="submit"]')
 let selectedCamId = null;
 let cameras = [];
 let hlsInstances = {};
+let wsPlayers = {};
+// Tile transport for MJPEG-capable previews: 'ws' (WebSocket, one frame in flight) or 'mjpeg'
+const VIDEO_TRANSPORT = localStorage.getItem('videoTransport') || 'ws';
 let logsInterval = null;
 
 // ... (Top constants)
@@ -73,7 +76,7 @@ function updateGlobalHealth(data) {
         el.innerText = "System: Degraded";
         el.style.color = '#eab308'; // Yellow
     }
-    el.title = `Preview: ${data.preview_error} errors, Control: ${data.control_error} errors`;
+    el.title = `Preview: ${data.preview_error} errors, ${data.preview_idle || 0} idle, Control: ${data.control_error} errors`;
 }
 
 // ... (Update Status Indicators)
@@ -97,6 +100,7 @@ function updateStatusIndicators() {
         if (pStat === 'ok') pColor = '#10b981';
         else if (pStat === 'starting') pColor = '#eab308'; // yellow
         else if (pStat === 'restarting') pColor = '#3b82f6'; // blue
+        else if (pStat === 'idle') pColor = '#6b7280'; // gray (stopped, no viewers)
 
         badgeContainer.innerHTML = `
             <div title="Control: ${cStat}" style="width:10px; height:10px; border-radius:50%; background:${cColor}; border:1px solid #fff;"></div>
@@ -172,10 +176,15 @@ async function restartPreview(camId) {
 
         // Find image and force refresh using timestamp
         const img = document.querySelector(`.video-cell[data-id="${camId}"] .video-player`);
-        if (img && img.tagName === 'IMG') {
+        if (img && img.tagName === 'IMG' && img.dataset.transport === 'ws') {
+            // New socket to the restarted provider
+            const old = wsPlayers[camId];
+            if (old) old.close();
+            wsPlayers[camId] = startWsPlayer(camId, img, old ? old.mjpegUrl : `/api/video/${camId}/mjpeg`);
+        } else if (img && img.tagName === 'IMG') {
             // Reset src to force reload
             const src = img.src.split('?')[0];
-            img.src = src + '?t=' + Date.now();
+            img.src = src + '?' + tileRenditionParams() + 't=' + Date.now();
         }
 
         // Force poll
@@ -274,9 +283,13 @@ async function saveCamera(formData) {
         password: formData.password,
         control_protocol: 'onvif',
         preview: {
+            // Keep options the form doesn't edit (warm_standby, frame_bus)
+            ...((cameras.find(c => c.id === formData.id) || {}).preview || {}),
             type: formData.video_source_type,
             ndi_source: formData.ndi_source_name || null,
-            rtsp_url: formData.rtsp_url || null
+            rtsp_url: formData.rtsp_url || null,
+            ndi_bandwidth: formData.ndi_bandwidth || 'highest',
+            ndi_color_format: formData.ndi_color_format || 'bgrx_bgra'
         }
     };
 
@@ -307,8 +320,83 @@ async function deleteCamera(id) {
     await fetchCameras();
 }
 
+// PTZ control channel (/ws/ptz): compact commands with sequence numbers, each acked
+// with the camera's latency. While moving we send heartbeats; if they stop (tab frozen,
+// network gone) or the socket drops, the server stops the camera. POST is the fallback.
+const PTZ_HEARTBEAT_MS = 150;
+const ptzChannel = { ws: null, camId: null, seq: 0, sent: {}, heartbeat: null };
+
+function connectPtzChannel(camId) {
+    if (ptzChannel.camId === camId && ptzChannel.ws) return;
+    closePtzChannel();
+    ptzChannel.camId = camId;
+    const proto = location.protocol === 'https:' ? 'wss:' : 'ws:';
+    const ws = new WebSocket(`${proto}//${location.host}/ws/ptz/${camId}`);
+    ws.onmessage = (e) => {
+        // "a <seq> <ok> <camera ms>"
+        const [type, seq, ok, ms] = e.data.split(' ');
+        if (type !== 'a') return;
+        const t0 = ptzChannel.sent[seq];
+        delete ptzChannel.sent[seq];
+        if (t0 !== undefined) {
+            PTZ_CONTROLS.dataset.latencyMs = ms;
+            PTZ_CONTROLS.title = `PTZ: camera ${ms} ms, round trip ${Math.round(performance.now() - t0)} ms`;
+        }
+        if (ok !== '1') console.error("PTZ failed", seq);
+    };
+    ws.onclose = () => {
+        if (ptzChannel.ws !== ws) return;
+        ptzChannel.ws = null;
+        ptzChannel.sent = {};
+        setPtzHeartbeat(false);
+        setTimeout(() => { if (ptzChannel.camId === camId && !ptzChannel.ws) connectPtzChannel(camId); }, 2000);
+    };
+    ptzChannel.ws = ws;
+}
+
+function closePtzChannel() {
+    const ws = ptzChannel.ws;
+    ptzChannel.ws = null;
+    ptzChannel.camId = null;
+    ptzChannel.sent = {};
+    setPtzHeartbeat(false);
+    if (ws) ws.close();
+}
+
+function setPtzHeartbeat(on) {
+    if (on && !ptzChannel.heartbeat) {
+        ptzChannel.heartbeat = setInterval(() => {
+            if (ptzChannel.ws && ptzChannel.ws.readyState === WebSocket.OPEN) ptzChannel.ws.send('h');
+        }, PTZ_HEARTBEAT_MS);
+    } else if (!on && ptzChannel.heartbeat) {
+        clearInterval(ptzChannel.heartbeat);
+        ptzChannel.heartbeat = null;
+    }
+}
+
+// Returns false when the channel isn't usable (caller POSTs instead)
+function sendPtzCommand(action, params) {
+    const ws = ptzChannel.ws;
+    if (!ws || ws.readyState !== WebSocket.OPEN || ptzChannel.camId !== selectedCamId) return false;
+    const seq = ++ptzChannel.seq;
+    if (action === 'stop') {
+        ws.send(`s ${seq}`);
+        setPtzHeartbeat(false);
+    } else {
+        const pan = action === 'zoom' ? 0 : (params.pan || 0);
+        const tilt = action === 'zoom' ? 0 : (params.tilt || 0);
+        const zoom = params.zoom || 0;
+        const speed = params.speed ?? 0.5;
+        ws.send(`m ${seq} ${pan} ${tilt} ${zoom} ${speed}`);
+        setPtzHeartbeat(speed !== 0 && (pan !== 0 || tilt !== 0 || zoom !== 0));
+    }
+    ptzChannel.sent[seq] = performance.now();
+    return true;
+}
+
 async function ptzAction(action, params = {}) {
     if (!selectedCamId) return;
+    if (sendPtzCommand(action, params)) return;
     try {
         await fetch(`${API_BASE}/cameras/${selectedCamId}/ptz`, {
             method: 'POST',
@@ -361,8 +449,75 @@ async function scanNDI() {
     }
 }
 
+// Pick a shared rendition width for grid tiles. Buckets (not exact pixels)
+// so that every client with a similar window shares one server-side encoder.
+const TILE_WIDTHS = [480, 640, 960, 1280, 1920];
+function tileRenditionParams() {
+    const tilePx = (VIDEO_GRID.clientWidth / 2) * (window.devicePixelRatio || 1);
+    const w = TILE_WIDTHS.find(b => b >= tilePx) || 0; // 0 = native
+    return w ? `w=${w}&` : '';
+}
+
+// WebSocket tile player: binary messages are a 16-byte header
+// (uint64 seq + float64 capture time, little-endian) followed by a JPEG.
+// Each frame is acked once decoded, so the server never queues frames for us.
+// If a connect fails (no WebSocket support on the server, proxy drops the
+// upgrade) the tile falls back to the plain MJPEG stream at mjpegUrl.
+function startWsPlayer(camId, img, mjpegUrl) {
+    const player = { ws: null, closed: false, url: null, mjpegUrl };
+    const connect = () => {
+        if (player.closed) return;
+        const proto = location.protocol === 'https:' ? 'wss:' : 'ws:';
+        const ws = new WebSocket(`${proto}//${location.host}/ws/video/${camId}?${tileRenditionParams()}`);
+        let opened = false;
+        ws.binaryType = 'arraybuffer';
+        ws.onopen = () => { opened = true; };
+        ws.onmessage = (e) => {
+            const view = new DataView(e.data);
+            const seq = Number(view.getBigUint64(0, true));
+            const ts = view.getFloat64(8, true);
+            const blob = new Blob([new Uint8Array(e.data, 16)], { type: 'image/jpeg' });
+            const prev = player.url;
+            player.url = URL.createObjectURL(blob);
+            img.onload = () => {
+                if (prev) URL.revokeObjectURL(prev);
+                img.dataset.seq = seq;
+                img.dataset.lagMs = Math.round(Date.now() - ts * 1000);
+                if (ws.readyState === WebSocket.OPEN) ws.send('ack');
+            };
+            img.onerror = () => {
+                // Undecodable frame: ack anyway, or the server never sends the next one
+                if (prev) URL.revokeObjectURL(prev);
+                if (ws.readyState === WebSocket.OPEN) ws.send('ack');
+            };
+            img.src = player.url;
+        };
+        ws.onclose = () => {
+            if (player.closed) return;
+            if (!opened) {
+                console.warn(`WebSocket video failed for ${camId}, falling back to MJPEG`);
+                player.close();
+                delete img.dataset.transport;
+                img.src = `${mjpegUrl}${mjpegUrl.includes('?') ? '&' : '?'}${tileRenditionParams()}t=${Date.now()}`;
+                return;
+            }
+            setTimeout(connect, 2000);
+        };
+        player.ws = ws;
+    };
+    player.close = () => {
+        player.closed = true;
+        if (player.ws) player.ws.close();
+        if (player.url) URL.revokeObjectURL(player.url);
+    };
+    connect();
+    return player;
+}
+
 // --- Rendering ---
 function renderGrid() {
+    Object.values(wsPlayers).forEach(p => p.close());
+    wsPlayers = {};
     VIDEO_GRID.innerHTML = '';
     const slots = [0, 1, 2, 3];
 
@@ -446,8 +601,13 @@ function renderGrid() {
             } else if (url.includes('mjpeg')) {
                 playerEl = document.createElement('img');
                 playerEl.className = 'video-player';
-                // Always append timestamp to prevent caching old streams
-                playerEl.src = `${url}${url.includes('?') ? '&' : '?'}t=${Date.now()}`;
+                if (VIDEO_TRANSPORT === 'ws' && url.startsWith('/api/video/')) {
+                    playerEl.dataset.transport = 'ws';
+                    wsPlayers[cam.id] = startWsPlayer(cam.id, playerEl, url);
+                } else {
+                    // Always append timestamp to prevent caching old streams
+                    playerEl.src = `${url}${url.includes('?') ? '&' : '?'}${tileRenditionParams()}t=${Date.now()}`;
+                }
                 playerEl.style.objectFit = 'contain';
                 playerEl.onerror = () => {
                     // Handle broken MJPEG
@@ -506,7 +666,7 @@ function updateStatusIndicators() {
 
         // Preview Status
         const pStat = cam.preview_status || 'offline';
-        const pColor = pStat === 'ok' ? '#10b981' : (pStat === 'starting' ? '#eab308' : '#ef4444');
+        const pColor = pStat === 'ok' ? '#10b981' : (pStat === 'starting' ? '#eab308' : (pStat === 'idle' ? '#6b7280' : '#ef4444'));
 
         badgeContainer.innerHTML = `
             <div title="Control: ${cStat}" style="width:10px; height:10px; border-radius:50%; background:${cColor}; border:1px solid #fff;"></div>
@@ -520,6 +680,7 @@ function selectCamera(cam) {
     SELECTED_CAM_NAME.innerText = cam.name + (cam.capabilities?.presets ? "" : " (No Presets)");
     highlightCamera(cam.id);
     updateControlsUI();
+    connectPtzChannel(cam.id);
     fetchPresets(cam.id);
 }
 
@@ -549,6 +710,7 @@ function updateControlsUI() {
         PTZ_CONTROLS.style.opacity = '0.5';
         PTZ_CONTROLS.style.pointerEvents = 'none';
         SELECTED_CAM_NAME.innerText = "Select a Camera";
+        closePtzChannel();
     }
 }
 
@@ -627,6 +789,9 @@ function openEditModal(cam) {
             }
             select.value = cam.active_preview_source;
         }
+        const pCfg = cam.preview || {};
+        document.getElementById('ndi-bandwidth-select').value = pCfg.ndi_bandwidth || 'highest';
+        document.getElementById('ndi-color-select').value = pCfg.ndi_color_format || 'bgrx_bgra';
     } else {
         document.getElementById('rtsp-fields').style.display = 'block';
         document.getElementById('ndi-fields').style.display = 'none';
@@ -645,7 +810,12 @@ function openEditModal(cam) {
     }
 
     // Initial Render of stats/restart
+    // Still thumbnail (served from the already-encoded stream frame, cheap to poll)
+    const thumb = cam.stream_url && cam.stream_url.includes('mjpeg')
+        ? `<img src="${API_BASE}/video/${cam.id}/snapshot.jpg?w=320&max_age_ms=2000" style="width:100%; border-radius:4px; margin-bottom:10px; background:#000;" alt="">`
+        : '';
     extras.innerHTML = `
+        ${thumb}
         <div id="modal-stats" style="margin-bottom:10px;"></div>
         <div style="margin-bottom:15px; text-align:right;">
              <button type="button" id="restart-preview-btn" style="background:#f59e0b; color:black; border:none; padding:4px 8px; border-radius:4px; cursor:pointer;">Restart Preview</button>